@@ -0,0 +1,263 @@
+"""Waits for pods and jobs with the watch API of the kubernetes client.
+
+The experiment scripts used to poll `kubectl get ... -o jsonpath` every few
+seconds, one process per check. A Waiter keeps a single watch connection per wait
+instead and gets every change pushed by the API server, so the scripts see a pod
+become ready or a job complete as soon as it happens. Changes are delivered as
+PhaseEvents: kind, name, phase and the time (time.time()) the change arrived.
+
+Pod phases: Pending, Running, Ready (running with the Ready condition), Succeeded,
+Failed, Terminating (deletion requested), Deleted.
+Job phases: Pending, Active, Complete, Failed, Deleted.
+
+It can also be run on its own, part3/monitor_jobs.sh uses it to log the job
+timestamps and part3_experiment.sh to wait for all jobs:
+
+    python3 k8s_waiter.py monitor-jobs --log job_timestamps.txt parsec-dedup parsec-vips
+    python3 k8s_waiter.py wait-jobs --timeout 7200 parsec-dedup parsec-vips
+
+Scripts in the part directories add the repository root to sys.path to import it.
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional
+
+from kubernetes import client, config, watch
+from kubernetes.client.rest import ApiException
+
+NAMESPACE = "default"
+# longest single watch request, the watch is reopened after it
+WATCH_SECONDS = 300
+
+DELETED = "Deleted"
+POD_DONE = ("Succeeded", "Failed", DELETED)
+JOB_DONE = ("Complete", "Failed", DELETED)
+
+
+@dataclass
+class PhaseEvent:
+    kind: str  # "pod" or "job"
+    name: str
+    phase: str
+    timestamp: float  # time.time() when the change arrived
+    obj: Any = None  # the V1Pod / V1Job of the change
+
+
+def pod_phase(pod) -> str:
+    if pod.metadata.deletion_timestamp is not None:
+        return "Terminating"
+    phase = pod.status.phase or "Pending"
+    conditions = pod.status.conditions or []
+    if phase == "Running" and any(c.type == "Ready" and c.status == "True" for c in conditions):
+        return "Ready"
+    return phase
+
+
+def job_phase(job) -> str:
+    for condition in job.status.conditions or []:
+        if condition.status == "True" and condition.type in ("Complete", "Failed"):
+            return condition.type
+    if job.status.active:
+        return "Active"
+    return "Pending"
+
+
+class Waiter:
+    def __init__(self, namespace: str = NAMESPACE, api_client: Optional[client.ApiClient] = None):
+        if api_client is None:
+            config.load_kube_config()
+            api_client = client.ApiClient()
+        self.namespace = namespace
+        self.core = client.CoreV1Api(api_client)
+        self.batch = client.BatchV1Api(api_client)
+
+    def _watch(
+        self, kind, list_function, phase_function, name, label_selector, timeout,
+        resource_version=None,
+    ) -> Iterator[PhaseEvent]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        selectors = {}
+        if name is not None:
+            selectors["field_selector"] = f"metadata.name={name}"
+        if label_selector is not None:
+            selectors["label_selector"] = label_selector
+
+        phases = {}
+        while deadline is None or time.monotonic() < deadline:
+            seconds = WATCH_SECONDS
+            if deadline is not None:
+                seconds = max(1, min(seconds, int(deadline - time.monotonic())))
+            stream = watch.Watch()
+            try:
+                # without a resource version the server starts with an ADDED event for
+                # every existing object, so the current state is delivered first. With
+                # one only the changes after that version are delivered
+                for change in stream.stream(
+                    list_function,
+                    namespace=self.namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=seconds,
+                    **selectors,
+                ):
+                    obj = change["object"]
+                    resource_version = obj.metadata.resource_version
+                    if change["type"] == "DELETED":
+                        phase = DELETED
+                    else:
+                        phase = phase_function(obj)
+                    if phases.get(obj.metadata.name) != phase:
+                        phases[obj.metadata.name] = phase
+                        yield PhaseEvent(kind, obj.metadata.name, phase, time.time(), obj)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+            except ApiException as e:
+                if e.status != 410:
+                    raise
+                # the resource version is too old, start over with the current state
+                resource_version = None
+            finally:
+                stream.stop()
+
+    def watch_pods(
+        self, name=None, label_selector=None, timeout=None, resource_version=None
+    ) -> Iterator[PhaseEvent]:
+        """Yield the phase changes of the selected pods until timeout (None: forever).
+
+        With a resource_version (of a previous read) only the changes after it are yielded.
+        """
+        return self._watch(
+            "pod", self.core.list_namespaced_pod, pod_phase, name, label_selector, timeout,
+            resource_version,
+        )
+
+    def watch_jobs(
+        self, name=None, label_selector=None, timeout=None, resource_version=None
+    ) -> Iterator[PhaseEvent]:
+        """Yield the phase changes of the selected jobs until timeout (None: forever).
+
+        With a resource_version (of a previous read) only the changes after it are yielded.
+        """
+        return self._watch(
+            "job", self.batch.list_namespaced_job, job_phase, name, label_selector, timeout,
+            resource_version,
+        )
+
+    def wait_for_pod(
+        self, name, phases: Iterable[str], timeout=300, resource_version=None
+    ) -> Optional[PhaseEvent]:
+        """The first event of pod name with one of the phases, None after timeout."""
+        phases = set(phases)
+        for event in self.watch_pods(name=name, timeout=timeout, resource_version=resource_version):
+            if event.phase in phases:
+                return event
+        return None
+
+    def wait_for_pod_ready(self, name, timeout=300) -> Optional[PhaseEvent]:
+        """The Ready event of pod name, or the event that shows it never gets ready."""
+        return self.wait_for_pod(name, ("Ready",) + POD_DONE, timeout)
+
+    def wait_for_pod_deleted(self, name, timeout=300) -> bool:
+        try:
+            pod = self.core.read_namespaced_pod(name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            raise
+        # watch from the version read, a deletion in between is then still delivered
+        return (
+            self.wait_for_pod(name, (DELETED,), timeout, pod.metadata.resource_version)
+            is not None
+        )
+
+    def wait_for_job(self, name, timeout=1800) -> Optional[PhaseEvent]:
+        """The Complete, Failed or Deleted event of job name, None after timeout."""
+        for event in self.watch_jobs(name=name, timeout=timeout):
+            if event.phase in JOB_DONE:
+                return event
+        return None
+
+    def wait_for_job_deleted(self, name, timeout=300) -> bool:
+        try:
+            job = self.batch.read_namespaced_job(name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            raise
+        # watch from the version read, a deletion in between is then still delivered
+        for event in self.watch_jobs(
+            name=name, timeout=timeout, resource_version=job.metadata.resource_version
+        ):
+            if event.phase == DELETED:
+                return True
+        return False
+
+    def wait_for_jobs(self, names: Iterable[str], timeout=None, on_event=None) -> dict:
+        """Wait until all jobs are done, returns the last event of every job.
+
+        on_event is called with every phase change of the jobs.
+        """
+        names = set(names)
+        last = {}
+        for event in self.watch_jobs(timeout=timeout):
+            if event.name not in names:
+                continue
+            last[event.name] = event
+            if on_event is not None:
+                on_event(event)
+            if all(name in last and last[name].phase in JOB_DONE for name in names):
+                break
+        return last
+
+
+def _format_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def monitor_jobs(waiter: Waiter, names, log_file):
+    """Append "job_name, STARTED|COMPLETED|FAILED, timestamp" lines like monitor_jobs.sh did."""
+    logged = set()
+
+    def log_event(event):
+        status = {"Active": "STARTED", "Complete": "COMPLETED", "Failed": "FAILED"}.get(event.phase)
+        if status is None or (event.name, status) in logged:
+            return
+        if status != "STARTED" and (event.name, "STARTED") not in logged:
+            # the job finished between two updates, it still started
+            log_event(PhaseEvent(event.kind, event.name, "Active", event.timestamp))
+        logged.add((event.name, status))
+        with open(log_file, "a") as f:
+            f.write(f"{event.name}, {status}, {_format_timestamp(event.timestamp)}\n")
+
+    waiter.wait_for_jobs(names, on_event=log_event)
+    with open(log_file, "a") as f:
+        f.write("All jobs have completed. Monitoring finished.\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wait for Kubernetes jobs with the watch API")
+    parser.add_argument("--namespace", default=NAMESPACE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    monitor = subparsers.add_parser("monitor-jobs", help="Log when the jobs start and complete")
+    monitor.add_argument("--log", required=True, help="File the job timestamps are appended to")
+    monitor.add_argument("jobs", nargs="+")
+    wait = subparsers.add_parser("wait-jobs", help="Exit once all jobs completed (1 on timeout)")
+    wait.add_argument("--timeout", type=float, default=None)
+    wait.add_argument("jobs", nargs="+")
+    args = parser.parse_args()
+
+    waiter = Waiter(args.namespace)
+    if args.command == "monitor-jobs":
+        monitor_jobs(waiter, args.jobs, args.log)
+    else:
+        last = waiter.wait_for_jobs(args.jobs, timeout=args.timeout)
+        done = [name for name in args.jobs if name in last and last[name].phase == "Complete"]
+        print(f"{len(done)}/{len(args.jobs)} jobs completed")
+        sys.exit(0 if len(done) == len(args.jobs) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Shared reader for mcperf output.
+
+Handles both formats used in this project:
+ - part1/part3: a "#type ..." header and one "read" row per measurement, with or
+   without the ts_start/ts_end columns at the end
+ - part4 dynamic load: a header with "Total number of intervals = N (...)" and
+   "Timestamp start:/end:" lines, the rows have no timestamps. ts_start/ts_end are
+   filled in from the header (start + i * interval length)
+
+Every file is returned as a DataFrame with typed columns (latencies in us):
+avg std min p5 p10 p50 p67 p75 p80 p85 p90 p95 p99 p999 p9999 qps target
+ts_start ts_end (ms since epoch, -1 if the file has no timing information)
+
+iter_mcperf yields the rows one at a time from any iterable of lines (a file,
+sys.stdin while mcperf is still running, a followed file), for consumers that
+must not hold a whole run in memory. parse_mcperf collects them into the DataFrame.
+
+The parsed columns are cached next to the text file in a hidden file named after
+the content hash (.<name>.<hash>.parquet, or .npz if pyarrow is not installed),
+so plotting the same run again skips the text parsing. Files below
+CACHE_MIN_BYTES are always parsed, for them parsing is faster than loading a cache.
+
+Scripts in the part directories add the repository root to sys.path to import it.
+"""
+
+import glob
+import hashlib
+import os
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+STAT_COLUMNS = [
+    "avg",
+    "std",
+    "min",
+    "p5",
+    "p10",
+    "p50",
+    "p67",
+    "p75",
+    "p80",
+    "p85",
+    "p90",
+    "p95",
+    "p99",
+    "p999",
+    "p9999",
+    "qps",
+    "target",
+]
+TIME_COLUMNS = ["ts_start", "ts_end"]
+COLUMNS = STAT_COLUMNS + TIME_COLUMNS
+# bump when the parsed columns change, old caches are then ignored
+PARSER_VERSION = 2
+CACHE_MIN_BYTES = 1 << 20
+
+try:
+    import pyarrow  # noqa: F401
+
+    CACHE_SUFFIX = ".parquet"
+except ImportError:
+    CACHE_SUFFIX = ".npz"
+
+
+class McperfRow(NamedTuple):
+    """One measurement, latencies in us, timestamps in ms since epoch (-1 if unknown)."""
+
+    ts_start: int
+    ts_end: int
+    stats: tuple  # floats in STAT_COLUMNS order
+
+
+def iter_mcperf(lines: Iterable[str]) -> Iterator[McperfRow]:
+    """Parse mcperf output line by line, in constant memory.
+
+    Stops at a second run appended to the same file (part4) and at the cpu usage
+    summary after the measurements (part1). Rows cut off by a killed mcperf
+    (fewer columns than the header) are skipped.
+    """
+    width = len(STAT_COLUMNS)
+    intervals = None
+    timestamp_start = None
+    timestamp_end = None
+    index = 0
+    for line in lines:
+        if line.startswith("read"):
+            fields = line.split()[1:]
+            if len(fields) < width:
+                continue
+            try:
+                stats = tuple(float(v) for v in fields[: len(STAT_COLUMNS)])
+                if len(fields) >= len(COLUMNS):
+                    ts_start = int(fields[len(STAT_COLUMNS)])
+                    ts_end = int(fields[len(STAT_COLUMNS) + 1])
+                elif intervals and timestamp_start is not None and timestamp_end is not None:
+                    delta_ms = (timestamp_end - timestamp_start) / intervals
+                    ts_start = int(timestamp_start + index * delta_ms)
+                    ts_end = int(timestamp_start + (index + 1) * delta_ms)
+                else:
+                    ts_start = ts_end = -1
+            except ValueError:
+                continue
+            index += 1
+            yield McperfRow(ts_start, ts_end, stats)
+        elif line.startswith("#type"):
+            # a header without the target column still needs all STAT_COLUMNS
+            width = max(len(line.split()) - 1, len(STAT_COLUMNS))
+        elif line.startswith("Total number of intervals"):
+            if intervals is not None:
+                return
+            intervals = int(line.split("=")[1].split()[0])
+        elif line.startswith("Timestamp start:"):
+            timestamp_start = int(line.split(":")[1])
+        elif line.startswith("Timestamp end:"):
+            timestamp_end = int(line.split(":")[1])
+        elif line.startswith("Warning"):
+            return
+
+
+def _content_hash(path):
+    digest = hashlib.blake2b(str(PARSER_VERSION).encode(), digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(path, digest):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.{digest}{CACHE_SUFFIX}")
+
+
+def parse_mcperf(path):
+    """Parse an mcperf output file without using the cache."""
+    with open(path, "r") as f:
+        rows = list(iter_mcperf(f))
+    df = pd.DataFrame(
+        np.array([row.stats for row in rows], dtype=np.float64).reshape(len(rows), len(STAT_COLUMNS)),
+        columns=STAT_COLUMNS,
+    )
+    df["ts_start"] = np.array([row.ts_start for row in rows], dtype=np.int64)
+    df["ts_end"] = np.array([row.ts_end for row in rows], dtype=np.int64)
+    return df
+
+
+def _read_cache(cache_path):
+    if CACHE_SUFFIX == ".parquet":
+        return pd.read_parquet(cache_path)
+    with np.load(cache_path) as data:
+        return pd.DataFrame({column: data[column] for column in COLUMNS})
+
+
+def _write_cache(path, cache_path, df):
+    directory, name = os.path.split(os.path.abspath(path))
+    # caches of older versions of the file
+    for old in glob.glob(os.path.join(glob.escape(directory), f".{glob.escape(name)}.*{CACHE_SUFFIX}")):
+        os.remove(old)
+    # write to a temporary file first so a concurrent reader never sees half a cache
+    tmp_path = cache_path + ".tmp"
+    if CACHE_SUFFIX == ".parquet":
+        df.to_parquet(tmp_path, index=False)
+    else:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **{column: df[column].to_numpy() for column in COLUMNS})
+    os.replace(tmp_path, cache_path)
+
+
+def read_mcperf(path, cache=True):
+    """Read an mcperf output file, from the cache if the content did not change."""
+    if not cache or os.path.getsize(path) < CACHE_MIN_BYTES:
+        return parse_mcperf(path)
+    cache_path = _cache_path(path, _content_hash(path))
+    if os.path.exists(cache_path):
+        try:
+            return _read_cache(cache_path)
+        except Exception as e:
+            print(f"Ignoring broken mcperf cache {cache_path}: {e}")
+    df = parse_mcperf(path)
+    try:
+        _write_cache(path, cache_path, df)
+    except OSError as e:
+        # read-only log directories still work, just without the cache
+        print(f"Could not write mcperf cache {cache_path}: {e}")
+    return df
@@ -0,0 +1,145 @@
+"""Node lookup and SSH connections for the part 1 VMs."""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+ZONE = "europe-west1-b"
+SSH_KEY_FILE = os.path.expanduser("~/.ssh/cloud-computing")
+SSH_USER = "ubuntu"
+# how long an idle control connection stays open
+CONTROL_PERSIST = "30m"
+
+
+@dataclass
+class Node:
+    """A cluster node as listed once by the NodeRegistry."""
+
+    name: str
+    role: Optional[str]  # cca-project-nodetype label
+    internal_ip: Optional[str]
+    external_ip: Optional[str]
+
+
+class NodeRegistry:
+    """Lists the cluster nodes once and answers all lookups from that list."""
+
+    def __init__(self, core_api):
+        self.core_api = core_api
+        self._nodes = None
+
+    def refresh(self):
+        nodes = []
+        for item in self.core_api.list_node().items:
+            addresses = {a.type: a.address for a in item.status.addresses or []}
+            nodes.append(
+                Node(
+                    name=item.metadata.name,
+                    role=(item.metadata.labels or {}).get("cca-project-nodetype"),
+                    internal_ip=addresses.get("InternalIP"),
+                    external_ip=addresses.get("ExternalIP"),
+                )
+            )
+        self._nodes = nodes
+
+    @property
+    def nodes(self):
+        if self._nodes is None:
+            self.refresh()
+        return self._nodes
+
+    def find(self, node_name_prefix: str) -> Node:
+        """The first node whose name starts with the given prefix."""
+        for node in self.nodes:
+            if node.name.startswith(node_name_prefix):
+                return node
+        raise ValueError(f"Node with prefix {node_name_prefix} not found")
+
+
+class SshConnections:
+    """One multiplexed SSH connection (ControlMaster) per VM for all commands.
+
+    The first connection to a node goes through gcloud compute ssh, which makes sure
+    the key is in the project metadata and the host key is known, and leaves a
+    control connection behind. Every later command and copy is a plain ssh / scp
+    that runs over that connection without a new handshake. If the control
+    connection is gone, ssh opens a new one by itself.
+    """
+
+    def __init__(self, zone: str = ZONE, key_file: str = SSH_KEY_FILE, user: str = SSH_USER):
+        self.zone = zone
+        self.key_file = key_file
+        self.user = user
+        # unix socket paths are limited to ~100 characters, keep them short
+        self._control_dir = tempfile.mkdtemp(prefix="ssh-")
+        self._connected = set()
+
+    def _control_path(self, node: Node) -> str:
+        return os.path.join(self._control_dir, node.name)
+
+    def _options(self, node: Node) -> list:
+        options = [
+            "ControlMaster=auto",
+            f"ControlPath={self._control_path(node)}",
+            f"ControlPersist={CONTROL_PERSIST}",
+            f"IdentityFile={self.key_file}",
+            "StrictHostKeyChecking=no",
+            "LogLevel=ERROR",
+        ]
+        return [f"-o{option}" for option in options]
+
+    def _connect(self, node: Node):
+        if node.name in self._connected:
+            return
+        print(f"Opening SSH control connection to {node.name}")
+        ssh_flags = [f"--ssh-flag={option}" for option in self._options(node)]
+        # the control connection keeps running in the background and holds on to the
+        # output, so it must not be a pipe we read until the end
+        subprocess.run(
+            [
+                "gcloud",
+                "compute",
+                "ssh",
+                f"--ssh-key-file={self.key_file}",
+                f"{self.user}@{node.name}",
+                "--zone",
+                self.zone,
+                *ssh_flags,
+                "--command",
+                "true",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        self._connected.add(node.name)
+
+    def _host(self, node: Node) -> str:
+        return f"{self.user}@{node.external_ip or node.name}"
+
+    def command_prefix(self, node: Node) -> list:
+        """ssh command that runs the shell command appended to it on the node."""
+        self._connect(node)
+        return ["ssh", *self._options(node), self._host(node)]
+
+    def command(self, node: Node, remote_command: str) -> list:
+        return self.command_prefix(node) + [remote_command]
+
+    def copy_command(self, node: Node, local_path: str, remote_path: str = "~/") -> list:
+        self._connect(node)
+        return ["scp", *self._options(node), local_path, f"{self._host(node)}:{remote_path}"]
+
+    def close(self):
+        """Stop all control connections."""
+        for name in self._connected:
+            control_path = os.path.join(self._control_dir, name)
+            subprocess.run(
+                ["ssh", f"-oControlPath={control_path}", "-O", "exit", name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        self._connected.clear()
+        shutil.rmtree(self._control_dir, ignore_errors=True)
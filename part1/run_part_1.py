@@ -3,10 +3,17 @@
 import enum
 import os
 import subprocess
+import sys
 import argparse
-import time
 from kubernetes import client, config
 
+# stabilization.py and k8s_waiter.py are in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from k8s_waiter import Waiter
+from stabilization import CpuSampler, wait_until_stable
+
+from cluster import NodeRegistry, SshConnections
+
 MCPERF_CLIENT_CMD = "cd memcache-perf && ./mcperf -T 8 -A"
 MCPERF_LOAD_DATA_CMD = "cd memcache-perf && ./mcperf -s {MEMCACHED_IP} --loadonly"
 MCPERF_BENCHMARK_CMD_TEMPLATE = "cd memcache-perf && ./mcperf -s {MEMCACHED_IP} -a {INTERNAL_AGENT_IP} --noload -T 8 -C 8 -D 4 -Q 1000 -c 8 -t 5 -w 2 --scan 5000:80000:5000"
@@ -17,6 +24,12 @@ ZONE = "europe-west1-b"
 # Get the absolute path to the install script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 INSTALL_SCRIPT_PATH = os.path.join(SCRIPT_DIR, "install_mcperf.sh")
+SETTLE_LOG_PATH = os.path.join("logs", "settle_times.csv")
+
+# Longest waits, the memcached node usually settles earlier
+INTERFERENCE_START_WAIT = 10
+INTERFERENCE_STOP_WAIT = 10
+BENCHMARK_COOLDOWN_WAIT = 60
 
 
 class InterferencePattern(enum.Enum):
@@ -42,27 +55,24 @@ class Mode(enum.Enum):
 # Initialize Kubernetes client
 config.load_kube_config()
 kubernetes_client = client.CoreV1Api()
+waiter = Waiter(api_client=kubernetes_client.api_client)
+# nodes are listed once, commands reuse one SSH connection per VM
+nodes = NodeRegistry(kubernetes_client)
+ssh = SshConnections(ZONE)
 
 
 def install_mcperf(node_name_prefix: str):
     """Install and configure mcperf with the given name prefix."""
     # Find the node with the given prefix
-    found_node = None
-    for node in kubernetes_client.list_node().items:
-        if node.metadata.name.startswith(node_name_prefix):
-            found_node = node
-            break
-    if not found_node:
-        raise ValueError(f"Node with prefix {node_name_prefix} not found")
+    found_node = nodes.find(node_name_prefix)
 
     if not os.path.exists(INSTALL_SCRIPT_PATH):
         raise FileNotFoundError(f"Install script not found at {INSTALL_SCRIPT_PATH}")
 
-    print(f"Copying mcperf-install script to {found_node.metadata.name}")
+    print(f"Copying mcperf-install script to {found_node.name}")
     # Copy the install script to the VM
     process = subprocess.Popen(
-        f"gcloud compute scp --ssh-key-file=~/.ssh/cloud-computing {INSTALL_SCRIPT_PATH} ubuntu@{found_node.metadata.name}:~/ --zone {ZONE}",
-        shell=True,
+        ssh.copy_command(found_node, INSTALL_SCRIPT_PATH),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -76,10 +86,9 @@ def install_mcperf(node_name_prefix: str):
         print(f"Error copying script: {process.stderr.read()}")
 
     # Make the script executable and run it
-    print(f"Running mcperf-install script on {found_node.metadata.name}")
+    print(f"Running mcperf-install script on {found_node.name}")
     process = subprocess.Popen(
-        f"gcloud compute ssh --ssh-key-file=~/.ssh/cloud-computing ubuntu@{found_node.metadata.name} --zone {ZONE} --command 'chmod +x ~/install_mcperf.sh && ~/install_mcperf.sh'",
-        shell=True,
+        ssh.command(found_node, "chmod +x ~/install_mcperf.sh && ~/install_mcperf.sh"),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -91,26 +100,19 @@ def install_mcperf(node_name_prefix: str):
     process.wait()
     if process.returncode != 0:
         print(f"Error running script: {process.stderr.read()}")
-    print(f"Finished running mcperf-install script on {found_node.metadata.name}")
+    print(f"Finished running mcperf-install script on {found_node.name}")
 
 
 def run_memcached_client(node_name_prefix: str):
     """Start the memcached client on the given node."""
     # get the node name
-    found_node = None
-    for node in kubernetes_client.list_node().items:
-        if node.metadata.name.startswith(node_name_prefix):
-            found_node = node
-            break
-    if not found_node:
-        raise ValueError(f"Node with prefix {node_name_prefix} not found")
+    found_node = nodes.find(node_name_prefix)
 
-    print(f"Running memcached client on {found_node.metadata.name}")
+    print(f"Running memcached client on {found_node.name}")
 
     command = MCPERF_CLIENT_CMD
     process = subprocess.Popen(
-        f"gcloud compute ssh --ssh-key-file=~/.ssh/cloud-computing ubuntu@{found_node.metadata.name} --zone {ZONE} --command '{command}'",
-        shell=True,
+        ssh.command(found_node, command),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -122,7 +124,7 @@ def run_memcached_client(node_name_prefix: str):
     process.wait()
     if process.returncode != 0:
         print(f"Error running script: {process.stderr.read()}")
-    print(f"\n\nFinished running memcached client on {found_node.metadata.name}")
+    print(f"\n\nFinished running memcached client on {found_node.name}")
 
 
 def load_memcached_data(node_name_prefix: str, memcached_ip: str):
@@ -130,19 +132,12 @@ def load_memcached_data(node_name_prefix: str, memcached_ip: str):
     print(f"Loading memcached data on {node_name_prefix}")
 
     # get the node name
-    found_node = kubernetes_client.list_node()
-    for node in found_node.items:
-        if node.metadata.name.startswith(node_name_prefix):
-            found_node = node
-            break
-    if not found_node:
-        raise ValueError(f"Node with prefix {node_name_prefix} not found")
+    found_node = nodes.find(node_name_prefix)
 
     command = MCPERF_LOAD_DATA_CMD.format(MEMCACHED_IP=memcached_ip)
 
     process = subprocess.Popen(
-        f"gcloud compute ssh --ssh-key-file=~/.ssh/cloud-computing ubuntu@{found_node.metadata.name} --zone {ZONE} --command '{command}'",
-        shell=True,
+        ssh.command(found_node, command),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -154,7 +149,7 @@ def load_memcached_data(node_name_prefix: str, memcached_ip: str):
     process.wait()
     if process.returncode != 0:
         print(f"Error running script: {process.stderr.read()}")
-    print(f"Finished loading memcached data on {found_node.metadata.name}")
+    print(f"Finished loading memcached data on {found_node.name}")
 
 
 def run_memcached_benchmark(
@@ -162,15 +157,9 @@ def run_memcached_benchmark(
 ):
     """Run the memcached benchmark on the given node."""
     # get the node name
-    found_node = None
-    for node in kubernetes_client.list_node().items:
-        if node.metadata.name.startswith(node_name_prefix):
-            found_node = node
-            break
-    if not found_node:
-        raise ValueError(f"Node with prefix {node_name_prefix} not found")
+    found_node = nodes.find(node_name_prefix)
 
-    print(f"Running memcached benchmark on {found_node.metadata.name}")
+    print(f"Running memcached benchmark on {found_node.name}")
     # create log file and directory if it doesn't exist
     os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
@@ -180,8 +169,7 @@ def run_memcached_benchmark(
 
     # Run the benchmark and capture output
     process = subprocess.Popen(
-        f"gcloud compute ssh --ssh-key-file=~/.ssh/cloud-computing ubuntu@{found_node.metadata.name} --zone {ZONE} --command '{command}'",
-        shell=True,
+        ssh.command(found_node, command),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -213,20 +201,21 @@ def run_memcached_benchmark(
         with open(output_file, "a") as f:
             f.write(f"\nError output:\n{error_output}")
 
-    print(f"\n\nFinished running memcached benchmark on {found_node.metadata.name}")
+    print(f"\n\nFinished running memcached benchmark on {found_node.name}")
     print(f"Results have been saved to {output_file}")
 
 
 def get_internal_agent_ip():
     """Get the internal agent IP address on the client-agent node."""
-    nodes = kubernetes_client.list_node()
-    for node in nodes.items:
-        if node.metadata.name.startswith("client-agent"):
-            return node.status.addresses[0].address
-    raise ValueError("Client-agent node not found")
+    try:
+        return nodes.find("client-agent").internal_ip
+    except ValueError:
+        raise ValueError("Client-agent node not found") from None
 
 
-def start_interference(interference_pattern: InterferencePattern):
+def start_interference(
+    interference_pattern: InterferencePattern, sampler: CpuSampler = None
+):
     """Start the interference on the given node."""
     if interference_pattern == InterferencePattern.NONE:
         return
@@ -255,32 +244,24 @@ def start_interference(interference_pattern: InterferencePattern):
             ["kubectl", "create", "-f", "../interference/ibench-membw.yaml"], check=True
         )
     print(f"Waiting for pod to start")
-    # spin while pod is starting
-    while True:
-        pods = subprocess.run(
-            [
-                "kubectl",
-                "get",
-                "pods",
-                "-o",
-                "jsonpath={.items[?(@.metadata.name=='ibench-"
-                + interference_pattern.value
-                + "')].status.phase}",
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        if pods.stdout == "Running":
+    # the watch reports every phase change of the pod until it runs
+    for event in waiter.watch_pods(name=f"ibench-{interference_pattern.value}"):
+        if event.phase in ("Running", "Ready"):
             break
-        print(f"Pod status: {pods.stdout}")
-        time.sleep(1)
+        print(f"Pod status: {event.phase}")
     print(f"Pod started with {interference_pattern} interference")
-    time.sleep(10)
-    print("Waiting for 10 seconds before starting benchmark")
+    print(f"Waiting up to {INTERFERENCE_START_WAIT} seconds before starting benchmark")
+    wait_until_stable(
+        sampler,
+        f"{interference_pattern.value} interference start",
+        INTERFERENCE_START_WAIT,
+        log_file=SETTLE_LOG_PATH,
+    )
 
 
-def stop_interference(interference_pattern: InterferencePattern):
+def stop_interference(
+    interference_pattern: InterferencePattern, sampler: CpuSampler = None
+):
     """Stop the interference on the given node."""
     if interference_pattern == InterferencePattern.NONE:
         return
@@ -309,30 +290,15 @@ def stop_interference(interference_pattern: InterferencePattern):
             ["kubectl", "delete", "-f", "../interference/ibench-membw.yaml"], check=True
         )
     print(f"Waiting for pod to stop")
-    # spin while pod is stopping
-    while True:
-        pods = subprocess.run(
-            [
-                "kubectl",
-                "get",
-                "pods",
-                "-o",
-                "jsonpath={.items[?(@.metadata.name=='ibench-"
-                + interference_pattern.value
-                + "')].status.phase}",
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        if pods.stdout == "Terminating":
-            print(f"Pod status: {pods.stdout}")
-            time.sleep(1)
-        else:
-            break
+    waiter.wait_for_pod_deleted(f"ibench-{interference_pattern.value}", timeout=None)
     print(f"Pod stopped with {interference_pattern.value} interference")
-    print(f"Waiting for 10 seconds before starting next benchmark")
-    time.sleep(10)
+    print(f"Waiting up to {INTERFERENCE_STOP_WAIT} seconds before starting next benchmark")
+    wait_until_stable(
+        sampler,
+        f"{interference_pattern.value} interference stop",
+        INTERFERENCE_STOP_WAIT,
+        log_file=SETTLE_LOG_PATH,
+    )
 
 
 def parse_mode(mode_str: str) -> Mode:
@@ -367,6 +333,11 @@ def main():
         help="IP address of memcached server",
         default="100.96.3.2",
     )
+    parser.add_argument(
+        "--fixed-waits",
+        action="store_true",
+        help="Always wait the full time after interference changes and between benchmarks",
+    )
     args = parser.parse_args()
 
     try:
@@ -388,24 +359,41 @@ def main():
             run_memcached_client("client-agent")
 
         elif mode == Mode.BENCHMARK:
-            for interference_pattern in InterferencePattern:
-                start_interference(interference_pattern)
-                for i in range(0, 3):
-                    run_memcached_benchmark(
-                        "client-measure",
-                        memcached_ip,
-                        internal_agent_ip,
-                        f"logs/benchmark_results_{interference_pattern.value}_{i}.txt",
-                    )
-                    print("waiting 60 seconds before next benchmark")
-                    time.sleep(60)
-                stop_interference(interference_pattern)
+            # CPU utilisation of the memcached node decides when the waits are over
+            sampler = None
+            if not args.fixed_waits:
+                sampler = CpuSampler(ssh.command_prefix(nodes.find("memcache-server")))
+            try:
+                for interference_pattern in InterferencePattern:
+                    start_interference(interference_pattern, sampler)
+                    for i in range(0, 3):
+                        run_memcached_benchmark(
+                            "client-measure",
+                            memcached_ip,
+                            internal_agent_ip,
+                            f"logs/benchmark_results_{interference_pattern.value}_{i}.txt",
+                        )
+                        print(
+                            f"waiting up to {BENCHMARK_COOLDOWN_WAIT} seconds before next benchmark"
+                        )
+                        wait_until_stable(
+                            sampler,
+                            f"{interference_pattern.value} cooldown",
+                            BENCHMARK_COOLDOWN_WAIT,
+                            log_file=SETTLE_LOG_PATH,
+                        )
+                    stop_interference(interference_pattern, sampler)
+            finally:
+                if sampler is not None:
+                    sampler.close()
             print(
                 f"\nFinished memcached benchmark with {interference_pattern.value} interference\n\n"
             )
 
     except Exception as e:
         print(f"Error: {str(e)}")
+    finally:
+        ssh.close()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
 import os
+import sys
 import glob
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
+# mcperf_log.py is in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mcperf_log import read_mcperf, STAT_COLUMNS
+
 # Configuration types
 config_types = ["none", "cpu", "l1d", "l1i", "l2", "llc", "membw"]
 num_runs = 3  # Number of runs per configuration
@@ -19,43 +24,13 @@ markers = ["o", "s", "^", "D", "*", "x", "+"]
 def parse_benchmark_file(file_path):
     data = []
     try:
-        with open(file_path, "r") as f:
-            lines = f.readlines()
-            # Skip the header line
-            for line in lines[1:]:
-                if line.startswith("read"):
-                    parts = line.split()
-                    if len(parts) >= 17:  # Make sure we have enough columns
-                        row = {
-                            "type": parts[0],
-                            "avg": float(parts[1]),
-                            "std": float(parts[2]),
-                            "min": float(parts[3]),
-                            "p5": float(parts[4]),
-                            "p10": float(parts[5]),
-                            "p50": float(parts[6]),
-                            "p67": float(parts[7]),
-                            "p75": float(parts[8]),
-                            "p80": float(parts[9]),
-                            "p85": float(parts[10]),
-                            "p90": float(parts[11]),
-                            "p95": float(parts[12]),
-                            "p99": float(parts[13]),
-                            "p999": float(parts[14]),
-                            "p9999": float(parts[15]),
-                            "actual_qps": float(parts[16]),
-                            "target_qps": float(parts[17]),
-                            "config": os.path.basename(file_path).split("_")[
-                                2
-                            ],  # Extract config from filename
-                            "run": int(
-                                os.path.basename(file_path).split("_")[3].split(".")[0]
-                            ),  # Extract run number
-                        }
-                        data.append(row)
-                # Stop processing at the warning line
-                if line.startswith("Warning"):
-                    break
+        df = read_mcperf(file_path)[STAT_COLUMNS]
+        df = df.rename(columns={"qps": "actual_qps", "target": "target_qps"})
+        df.insert(0, "type", "read")
+        # Extract config and run number from filename
+        df["config"] = os.path.basename(file_path).split("_")[2]
+        df["run"] = int(os.path.basename(file_path).split("_")[3].split(".")[0])
+        data = df.to_dict("records")
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
     return data
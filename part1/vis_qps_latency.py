@@ -1,9 +1,14 @@
 import os
+import sys
 import glob
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
+# mcperf_log.py is in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mcperf_log import read_mcperf
+
 # Define the configuration types we're analyzing
 config_types = ["none", "cpu", "l1d", "l1i", "l2", "llc", "membw"]
 num_runs = 3  # Number of runs per configuration
@@ -37,29 +42,21 @@ def parse_benchmark_file(file_path):
     """
     data = []
     try:
-        with open(file_path, "r") as f:
-            lines = f.readlines()
-            for line in lines[1:]:
-                if line.startswith("read"):
-                    parts = line.split()
-                    if len(parts) >= 17:
-                        row = {
-                            # 95th percentile latency - our key metric of interest
-                            "p95": float(parts[12]) / 1000.0,  # Convert μs to ms
-                            # Actual QPS achieved
-                            "actual_qps": float(parts[16]),
-                            # Target QPS that was requested
-                            "target_qps": float(parts[17]),
-                            # Extract configuration type from filename
-                            "config": os.path.basename(file_path).split("_")[2],
-                            # Extract run number from filename
-                            "run": int(
-                                os.path.basename(file_path).split("_")[3].split(".")[0]
-                            ),
-                        }
-                        data.append(row)
-                if line.startswith("Warning"):
-                    break
+        df = read_mcperf(file_path)
+        data = pd.DataFrame(
+            {
+                # 95th percentile latency - our key metric of interest
+                "p95": df["p95"] / 1000.0,  # Convert μs to ms
+                # Actual QPS achieved
+                "actual_qps": df["qps"],
+                # Target QPS that was requested
+                "target_qps": df["target"],
+                # Extract configuration type from filename
+                "config": os.path.basename(file_path).split("_")[2],
+                # Extract run number from filename
+                "run": int(os.path.basename(file_path).split("_")[3].split(".")[0]),
+            }
+        ).to_dict("records")
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
     return data
@@ -7,27 +7,43 @@ and collects execution times.
 """
 
 import os
-import time
+import sys
 import subprocess
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 import argparse
 
+# stabilization.py and k8s_waiter.py are in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from k8s_waiter import Waiter
+from stabilization import CpuSampler, gcloud_ssh_command, wait_until_stable
+
 # Configuration
 WORKLOADS = ["blackscholes", "canneal", "dedup", "ferret", "freqmine", "radix", "vips"]
 INTERFERENCE_TYPES = ["none", "cpu", "l1d", "l1i", "l2", "llc", "membw"]
 REPETITIONS = 3
-STABILIZATION_WAIT = 120  # Wait time for interference to stabilize
-COOLDOWN_WAIT = 60  # Wait time between runs
+STABILIZATION_WAIT = 120  # Longest wait for interference to stabilize
+COOLDOWN_WAIT = 60  # Longest wait between runs
 
 # Fixed output directory (no timestamp)
 OUTPUT_DIR = Path("part2/parsec_results")
 RESULTS_CSV = OUTPUT_DIR / "all_results.csv"
+SETTLE_CSV = OUTPUT_DIR / "settle_times.csv"
 
 # Create output directory
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Watches pods and jobs, created on first use so importing needs no kubeconfig
+_waiter = None
+
+
+def get_waiter():
+    global _waiter
+    if _waiter is None:
+        _waiter = Waiter()
+    return _waiter
+
 
 # Utility functions
 def run_cmd(cmd):
@@ -42,49 +58,29 @@ def run_cmd(cmd):
 def wait_for_pod_ready(pod_name, timeout=300):
     """Wait until pod is in Ready state with timeout."""
     print(f"Waiting for pod {pod_name} to be ready...")
-    start_time = time.time()
-    while (time.time() - start_time) < timeout:
-        status = run_cmd(f"kubectl get pod {pod_name} -o jsonpath='{{.status.phase}}'")
-        if status == "Running":
-            ready = run_cmd(
-                f"kubectl get pod {pod_name} -o jsonpath='{{..status.conditions[?(@.type==\"Ready\")].status}}'"
-            )
-            if ready == "True":
-                print(f"Pod {pod_name} is ready!")
-                return True
-        print(
-            f"Pod status: {status}, waiting 5s... (timeout in {int(timeout - (time.time() - start_time))}s)"
-        )
-        time.sleep(5)
-    print(f"ERROR: Pod {pod_name} not ready after {timeout}s")
-    return False
+    event = get_waiter().wait_for_pod_ready(pod_name, timeout)
+    if event is None:
+        print(f"ERROR: Pod {pod_name} not ready after {timeout}s")
+        return False
+    if event.phase != "Ready":
+        print(f"ERROR: Pod {pod_name} is {event.phase}")
+        return False
+    print(f"Pod {pod_name} is ready at {datetime.fromtimestamp(event.timestamp)}!")
+    return True
 
 
 def wait_for_job_completion(job_name, timeout=1800):
     """Wait until job has completed with timeout."""
     print(f"Waiting for job {job_name} to complete...")
-    start_time = time.time()
-    while (time.time() - start_time) < timeout:
-        status = run_cmd(
-            f"kubectl get job {job_name} -o jsonpath='{{.status.succeeded}}'"
-        )
-        if status == "1":
-            print(f"Job {job_name} completed successfully!")
-            return True
-
-        # Check if the job failed
-        failed = run_cmd(f"kubectl get job {job_name} -o jsonpath='{{.status.failed}}'")
-        if failed and int(failed) > 0:
-            print(f"Job {job_name} failed!")
-            return False
-
-        print(
-            f"Job still running, waiting 5s... (timeout in {int(timeout - (time.time() - start_time))}s)"
-        )
-        time.sleep(5)
-
-    print(f"ERROR: Job {job_name} did not complete after {timeout}s")
-    return False
+    event = get_waiter().wait_for_job(job_name, timeout)
+    if event is None:
+        print(f"ERROR: Job {job_name} did not complete after {timeout}s")
+        return False
+    if event.phase != "Complete":
+        print(f"Job {job_name} {event.phase.lower()}!")
+        return False
+    print(f"Job {job_name} completed successfully at {datetime.fromtimestamp(event.timestamp)}!")
+    return True
 
 
 def extract_execution_time(log_content):
@@ -135,21 +131,11 @@ def apply_interference(interference_type):
 
     # Wait for pod to be created (may take a moment)
     print("Waiting for pod to be created...")
-    for attempt in range(1, 13):  # Try for up to 60 seconds
-        time.sleep(5)
-        # List all pods to debug
-        all_pods = run_cmd("kubectl get pods")
-        print(f"Current pods:\n{all_pods}")
-
-        # Look for the pod by name instead of label
-        pod_name = f"ibench-{interference_type}"
-        pod_exists = run_cmd(f"kubectl get pod {pod_name}")
-
-        if pod_exists and "not found" not in pod_exists:
-            print(f"Found interference pod: {pod_name}")
-            return pod_name
-
-        print(f"Attempt {attempt}/12: Pod not found yet, waiting...")
+    pod_name = f"ibench-{interference_type}"
+    # the first event of the watch is the pod as soon as it exists
+    for event in get_waiter().watch_pods(name=pod_name, timeout=60):
+        print(f"Found interference pod: {pod_name} ({event.phase})")
+        return pod_name
 
     print(f"ERROR: Interference pod for {interference_type} not found after 60 seconds")
     return None
@@ -194,6 +180,11 @@ def parse_arguments():
         default=3,
         help="Number of repetitions for test mode (default: 1)",
     )
+    parser.add_argument(
+        "--fixed-waits",
+        action="store_true",
+        help="Always wait the full stabilization and cooldown time",
+    )
     return parser.parse_args()
 
 
@@ -215,6 +206,15 @@ def main():
         )
         return
 
+    # CPU utilisation of the parsec node decides when the waits are over
+    sampler = None
+    if not args.fixed_waits:
+        parsec_node = run_cmd(
+            "kubectl get nodes -l cca-project-nodetype=parsec -o jsonpath='{.items[0].metadata.name}'"
+        )
+        sampler = CpuSampler(gcloud_ssh_command(parsec_node))
+        print(f"Waiting until {parsec_node} is steady, settle times go to {SETTLE_CSV}")
+
     # For test mode, override workloads and interference types
     if args.test:
         print(
@@ -263,9 +263,14 @@ def main():
                         if wait_for_pod_ready(ibench_pod_name):
                             # Wait for interference to stabilize
                             print(
-                                f"Waiting {STABILIZATION_WAIT}s for interference to stabilize..."
+                                f"Waiting up to {STABILIZATION_WAIT}s for interference to stabilize..."
+                            )
+                            wait_until_stable(
+                                sampler,
+                                f"{interference} interference",
+                                STABILIZATION_WAIT,
+                                log_file=SETTLE_CSV,
                             )
-                            time.sleep(STABILIZATION_WAIT)
                         else:
                             print(
                                 "WARNING: Interference pod never became ready, continuing anyway..."
@@ -324,9 +329,11 @@ def main():
                     run_cmd(f"kubectl delete pod {ibench_pod_name}")
 
                 # Cooldown period
-                print(f"Cooldown period: waiting {COOLDOWN_WAIT}s...")
-                time.sleep(COOLDOWN_WAIT)
+                print(f"Cooldown period: waiting up to {COOLDOWN_WAIT}s...")
+                wait_until_stable(sampler, "cooldown", COOLDOWN_WAIT, log_file=SETTLE_CSV)
 
+    if sampler is not None:
+        sampler.close()
     print("\nAll experiments completed!")
     print(f"Results saved to {RESULTS_CSV}")
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Local kubectl stand-in for trying run_matrix.py without a cluster.
+
+Implements only the commands run_matrix.py uses. The cluster state is kept in a
+JSON file (KUBECTL_STANDIN_STATE, default /tmp/kubectl_standin.json):
+
+- get nodes -l <label> -o name        KUBECTL_STANDIN_NODES nodes (default 3)
+- create -f -                         JSON pod or job manifest on stdin
+- get pod|job|pods ... -o json        pods are ready after 0.2s, jobs succeed after
+                                      KUBECTL_STANDIN_JOB_SECONDS (default 1)
+- logs <pod>                          a PARSEC style "real" line
+- delete pod|job <name>
+"""
+
+import fcntl
+import json
+import os
+import sys
+import time
+import zlib
+
+STATE_FILE = os.environ.get("KUBECTL_STANDIN_STATE", "/tmp/kubectl_standin.json")
+NODES = int(os.environ.get("KUBECTL_STANDIN_NODES", "3"))
+JOB_SECONDS = float(os.environ.get("KUBECTL_STANDIN_JOB_SECONDS", "1"))
+POD_READY_SECONDS = 0.2
+
+
+def fail(message):
+    print(f"Error from server (NotFound): {message}", file=sys.stderr)
+    sys.exit(1)
+
+
+def pod_status(created):
+    ready = time.time() - created >= POD_READY_SECONDS
+    return {
+        "phase": "Running" if ready else "Pending",
+        "conditions": [{"type": "Ready", "status": "True" if ready else "False"}],
+    }
+
+
+def job_status(created):
+    if time.time() - created >= JOB_SECONDS:
+        return {"succeeded": 1}
+    return {"active": 1}
+
+
+def handle(args, state):
+    if args[:2] == ["get", "nodes"]:
+        for i in range(NODES):
+            print(f"node/parsec-node-{i}")
+    elif args[:3] == ["create", "-f", "-"]:
+        manifest = json.loads(sys.stdin.read())
+        kind = manifest["kind"].lower()
+        name = manifest["metadata"]["name"]
+        if name in state[kind]:
+            print(f'Error from server (AlreadyExists): {kind}s "{name}" already exists', file=sys.stderr)
+            sys.exit(1)
+        state[kind][name] = time.time()
+        print(f"{kind}/{name} created")
+    elif args[:2] == ["get", "pod"]:
+        if args[2] not in state["pod"]:
+            fail(f'pods "{args[2]}" not found')
+        print(json.dumps({"metadata": {"name": args[2]}, "status": pod_status(state["pod"][args[2]])}))
+    elif args[:2] == ["get", "job"]:
+        if args[2] not in state["job"]:
+            fail(f'jobs.batch "{args[2]}" not found')
+        print(json.dumps({"metadata": {"name": args[2]}, "status": job_status(state["job"][args[2]])}))
+    elif args[:3] == ["get", "pods", "-l"]:
+        job_name = args[3].split("=", 1)[1]
+        items = []
+        if job_name in state["job"]:
+            items.append({"metadata": {"name": f"{job_name}-abcde"}})
+        print(json.dumps({"items": items}))
+    elif args[0] == "logs":
+        # deterministic but different per workload
+        seconds = 1 + zlib.crc32(args[1].encode()) % 1000 / 100
+        print(f"[PARSEC] Done.\n\nreal\t0m{seconds:.3f}s\nuser\t0m0.000s\nsys\t0m0.000s")
+    elif args[0] == "delete":
+        state[args[1]].pop(args[2], None)
+    else:
+        fail(f"unsupported command: {' '.join(args)}")
+
+
+def main():
+    with open(STATE_FILE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        content = f.read()
+        state = json.loads(content) if content else {"pod": {}, "job": {}}
+        try:
+            handle(sys.argv[1:], state)
+        finally:
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+PARSEC Interference Matrix Runner
+
+Runs the same experiment matrix as gen_logs_interference.py (workload x interference
+x repetition), but in parallel on all nodes labelled cca-project-nodetype=parsec:
+
+- Every node takes one interference type at a time, starts the ibench pod on that
+  node once and runs all pending workload/repetition cells of that type on it
+  before removing the pod again. The stabilization wait is paid once per type
+  and node instead of once per run.
+- The stabilization and cooldown times are upper bounds, a node continues as soon
+  as its CPU utilisation is steady (see stabilization.py, --fixed-waits turns this
+  off). The settle times are written to settle_times.csv next to the results.
+- Pods and jobs get the node name as suffix and are pinned to their node with
+  kubernetes.io/hostname, so the nodes do not interfere with each other.
+- Cells that already have a row in all_results.csv are skipped, an interrupted
+  matrix continues where it stopped.
+
+The kubectl command can be replaced, e.g. by the local stand-in to try the runner
+without a cluster:
+
+    python part2/task1/run_matrix.py --kubectl "python part2/task1/kubectl_standin.py" \
+        --stabilization 0 --cooldown 0 --poll 0.2 --results /tmp/all_results.csv
+"""
+
+import argparse
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from gen_logs_interference import (
+    COOLDOWN_WAIT,
+    INTERFERENCE_TYPES,
+    REPETITIONS,
+    RESULTS_CSV,
+    STABILIZATION_WAIT,
+    WORKLOADS,
+    extract_execution_time,
+)
+from stabilization import CpuSampler, gcloud_ssh_command, wait_until_stable
+
+INTERFERENCE_DIR = Path("interference")
+PARSEC_DIR = Path("parsec-benchmarks/part2a")
+NODE_LABEL = "cca-project-nodetype=parsec"
+
+
+class Kubectl:
+    """Thin wrapper around the kubectl command line, the command can be replaced."""
+
+    def __init__(self, command="kubectl"):
+        self.command = shlex.split(command)
+
+    def run(self, *args, input=None):
+        result = subprocess.run(
+            self.command + list(args), input=input, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"Command failed: kubectl {' '.join(args)}")
+            print(f"Error: {result.stderr.strip()}")
+            return None
+        return result.stdout
+
+    def get_json(self, *args):
+        output = self.run("get", *args, "-o", "json")
+        if not output:
+            return None
+        return json.loads(output)
+
+    def create(self, manifest):
+        return self.run("create", "-f", "-", input=json.dumps(manifest)) is not None
+
+    def delete(self, kind, name, wait=False):
+        self.run("delete", kind, name, "--ignore-not-found", f"--wait={str(wait).lower()}")
+
+    def recreate(self, manifest):
+        """Create a pod or job, removing a leftover of an interrupted run first."""
+        self.delete(manifest["kind"].lower(), manifest["metadata"]["name"], wait=True)
+        return self.create(manifest)
+
+    def nodes(self, label):
+        output = self.run("get", "nodes", "-l", label, "-o", "name")
+        if not output:
+            return []
+        return [line.split("/", 1)[1] for line in output.split() if "/" in line]
+
+
+def pin_to_node(manifest, node, name):
+    """Rename a pod or job manifest and pin it to a single node."""
+    manifest = json.loads(json.dumps(manifest))
+    manifest["metadata"]["name"] = name
+    manifest["metadata"].setdefault("labels", {})["name"] = name
+    pod_spec = manifest["spec"]
+    if manifest["kind"] == "Job":
+        pod_spec = manifest["spec"]["template"]["spec"]
+    pod_spec["nodeSelector"] = {"kubernetes.io/hostname": node}
+    return manifest
+
+
+def load_manifest(path):
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def completed_cells(results_csv):
+    """Number of finished repetitions per (workload, interference)."""
+    done = defaultdict(int)
+    if os.path.exists(results_csv):
+        for row in pd.read_csv(results_csv).itertuples():
+            done[(row.workload, row.interference)] += 1
+    return done
+
+
+def pending_cells(workloads, interference_types, repetitions, results_csv):
+    """Cells still to run, grouped by interference type."""
+    done = completed_cells(results_csv)
+    groups = {}
+    for interference in interference_types:
+        cells = []
+        for workload in workloads:
+            for rep in range(done[(workload, interference)] + 1, repetitions + 1):
+                cells.append((workload, rep))
+        if cells:
+            groups[interference] = cells
+    return groups
+
+
+class MatrixRunner:
+    def __init__(
+        self,
+        kubectl,
+        results_csv,
+        log_dir,
+        stabilization,
+        cooldown,
+        job_timeout,
+        poll=5,
+        fixed_waits=False,
+    ):
+        self.kubectl = kubectl
+        self.results_csv = Path(results_csv)
+        self.log_dir = Path(log_dir)
+        self.stabilization = stabilization
+        self.cooldown = cooldown
+        self.job_timeout = job_timeout
+        self.poll = poll
+        self.fixed_waits = fixed_waits
+        self.settle_csv = self.log_dir / "settle_times.csv"
+        self._csv_lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        self.failures = []
+
+    def log(self, node, message):
+        with self._print_lock:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] [{node}] {message}", flush=True)
+
+    def wait_for_pod_ready(self, node, pod_name, timeout=300):
+        start_time = time.time()
+        while (time.time() - start_time) < timeout:
+            pod = self.kubectl.get_json("pod", pod_name)
+            if pod is not None and pod.get("status", {}).get("phase") == "Running":
+                conditions = pod["status"].get("conditions", [])
+                if any(c["type"] == "Ready" and c["status"] == "True" for c in conditions):
+                    return True
+            time.sleep(self.poll)
+        self.log(node, f"ERROR: Pod {pod_name} not ready after {timeout}s")
+        return False
+
+    def wait_for_job_completion(self, node, job_name):
+        start_time = time.time()
+        while (time.time() - start_time) < self.job_timeout:
+            job = self.kubectl.get_json("job", job_name)
+            status = job.get("status", {}) if job is not None else {}
+            if status.get("succeeded", 0) >= 1:
+                return True
+            if status.get("failed", 0) > 0:
+                self.log(node, f"Job {job_name} failed!")
+                return False
+            time.sleep(self.poll)
+        self.log(node, f"ERROR: Job {job_name} did not complete after {self.job_timeout}s")
+        return False
+
+    def append_result(self, result):
+        with self._csv_lock:
+            df = pd.DataFrame([result])
+            header = not self.results_csv.exists()
+            df.to_csv(self.results_csv, mode="a", header=header, index=False)
+
+    def wait_until_stable(self, node, sampler, label, max_wait):
+        return wait_until_stable(sampler, f"{node} {label}", max_wait, log_file=self.settle_csv)
+
+    def start_interference(self, node, interference, sampler):
+        if interference == "none":
+            return None
+        pod_name = f"ibench-{interference}-{node}"
+        manifest = pin_to_node(
+            load_manifest(INTERFERENCE_DIR / f"ibench-{interference}.yaml"), node, pod_name
+        )
+        if not self.kubectl.recreate(manifest) or not self.wait_for_pod_ready(node, pod_name):
+            self.kubectl.delete("pod", pod_name)
+            raise RuntimeError(f"Could not start {interference} interference on {node}")
+        self.log(node, f"{interference} interference running, waiting up to {self.stabilization}s")
+        self.wait_until_stable(node, sampler, f"{interference} interference", self.stabilization)
+        return pod_name
+
+    def run_cell(self, node, workload, interference, rep):
+        job_name = f"parsec-{workload}-{node}"
+        manifest = pin_to_node(load_manifest(PARSEC_DIR / f"parsec-{workload}.yaml"), node, job_name)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.log(node, f"Running {workload} with {interference} interference (repetition {rep})")
+        try:
+            if not self.kubectl.recreate(manifest) or not self.wait_for_job_completion(node, job_name):
+                self.failures.append((workload, interference, rep))
+                return
+            pods = self.kubectl.get_json("pods", "-l", f"job-name={job_name}")
+            if not pods or not pods.get("items"):
+                self.log(node, f"ERROR: Could not find pod for job {job_name}")
+                self.failures.append((workload, interference, rep))
+                return
+            logs = self.kubectl.run("logs", pods["items"][0]["metadata"]["name"]) or ""
+            with open(self.log_dir / f"{workload}_{interference}_rep{rep}_{timestamp}.log", "w") as f:
+                f.write(logs)
+
+            exec_time = extract_execution_time(logs)
+            if exec_time is None:
+                self.failures.append((workload, interference, rep))
+                return
+            self.append_result(
+                {
+                    "workload": workload,
+                    "interference": interference,
+                    "repetition": rep,
+                    "execution_time": exec_time,
+                    "timestamp": timestamp,
+                }
+            )
+            self.log(node, f"{workload}/{interference}/{rep}: {exec_time:.3f}s")
+        finally:
+            self.kubectl.delete("job", job_name)
+
+    def node_worker(self, node, groups):
+        sampler = None if self.fixed_waits else CpuSampler(gcloud_ssh_command(node))
+        try:
+            while True:
+                try:
+                    interference, cells = groups.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    pod_name = self.start_interference(node, interference, sampler)
+                except RuntimeError as e:
+                    self.log(node, f"ERROR: {e}")
+                    self.failures.extend((w, interference, r) for w, r in cells)
+                    continue
+                try:
+                    for i, (workload, rep) in enumerate(cells):
+                        if i > 0:
+                            self.wait_until_stable(node, sampler, "cooldown", self.cooldown)
+                        self.run_cell(node, workload, interference, rep)
+                finally:
+                    if pod_name:
+                        self.kubectl.delete("pod", pod_name)
+        finally:
+            if sampler is not None:
+                sampler.close()
+
+    def run(self, nodes, groups):
+        work = queue.Queue()
+        # largest groups first so no node ends up alone with a long one at the end
+        for interference, cells in sorted(groups.items(), key=lambda g: -len(g[1])):
+            work.put((interference, cells))
+        threads = [
+            threading.Thread(target=self.node_worker, args=(node, work), name=node)
+            for node in nodes
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run the PARSEC interference matrix in parallel")
+    parser.add_argument("--kubectl", default="kubectl", help="kubectl command (default: kubectl)")
+    parser.add_argument("--results", default=str(RESULTS_CSV), help="Results CSV (also used to resume)")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument(
+        "--interference", nargs="+", choices=INTERFERENCE_TYPES, default=INTERFERENCE_TYPES
+    )
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS)
+    parser.add_argument("--stabilization", type=float, default=STABILIZATION_WAIT)
+    parser.add_argument("--cooldown", type=float, default=COOLDOWN_WAIT)
+    parser.add_argument("--job-timeout", type=float, default=1800)
+    parser.add_argument("--poll", type=float, default=5, help="Seconds between status checks")
+    parser.add_argument(
+        "--fixed-waits",
+        action="store_true",
+        help="Always wait the full stabilization and cooldown time",
+    )
+    parser.add_argument(
+        "--nodes", nargs="+", help="Nodes to use (default: all nodes labelled " + NODE_LABEL + ")"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    kubectl = Kubectl(args.kubectl)
+
+    nodes = args.nodes or kubectl.nodes(NODE_LABEL)
+    if not nodes:
+        print(f"Error: No nodes labeled with {NODE_LABEL}")
+        sys.exit(1)
+
+    groups = pending_cells(args.workloads, args.interference, args.repetitions, args.results)
+    total = sum(len(cells) for cells in groups.values())
+    if total == 0:
+        print(f"All cells already in {args.results}, nothing to do")
+        return
+    print(f"{total} cells in {len(groups)} interference groups on {len(nodes)} node(s): {', '.join(nodes)}")
+
+    log_dir = Path(args.results).parent
+    log_dir.mkdir(parents=True, exist_ok=True)
+    runner = MatrixRunner(
+        kubectl,
+        args.results,
+        log_dir,
+        args.stabilization,
+        args.cooldown,
+        args.job_timeout,
+        args.poll,
+        args.fixed_waits,
+    )
+    start_time = time.time()
+    runner.run(nodes, groups)
+
+    print(f"\nMatrix finished in {time.time() - start_time:.0f}s")
+    if runner.failures:
+        print(f"{len(runner.failures)} cell(s) failed, run again to retry them:")
+        for workload, interference, rep in runner.failures:
+            print(f"  {workload} / {interference} / rep {rep}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,19 @@
+import calendar
 import json
 import re
 from datetime import datetime
 import os
 import numpy as np
+import sys
+
+# mcperf_log.py and slo_stream.py are in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mcperf_log import iter_mcperf
+from slo_stream import SloEngine
+
+SLO_MS = 1.0
+# also reported, to see how close the runs are to the SLO
+EXTRA_THRESHOLDS_MS = [0.5, 0.8, 1.5, 2.0]
 
 
 def parse_datetime(dt_str):
@@ -55,61 +66,27 @@ def get_batch_job_time_window(pods_file):
     return earliest_start, latest_completion
 
 
-def parse_mcperf_data(mcperf_file, start_time, end_time):
-    """Parse mcperf data file and extract 95th percentile latency data points."""
-    data_points = []
-    slo_violations = 0
-    total_checked = 0
-
-    with open(mcperf_file, "r") as f:
-        lines = f.readlines()
-
-    # Skip header and comment lines
-    for line_num, line in enumerate(lines):
-        if line.startswith("#") or not line.strip():
-            continue
-
-        # Parse columns (space-separated)
-        parts = line.strip().split()
-        if len(parts) < 15:  # Need at least 15 columns for ts_start and ts_end
-            continue
-
-        try:
-            # Extract p95 latency (microseconds) - column 13
-            p95_latency_us = float(parts[12])
-
-            # Extract timestamps (milliseconds since epoch)
-            ts_start_ms = int(parts[-2])
-            ts_end_ms = int(parts[-1])
-
-            # Convert to datetime using UTC (important for timezone consistency)
-            ts_start = datetime.utcfromtimestamp(ts_start_ms / 1000.0)
-            ts_end = datetime.utcfromtimestamp(ts_end_ms / 1000.0)
+def to_epoch_ms(dt):
+    """Milliseconds since epoch of a naive UTC datetime (as parsed from the pods file)."""
+    return calendar.timegm(dt.timetuple()) * 1000
 
-            total_checked += 1
 
-            # Check if measurement overlaps with batch job window
-            if ts_end < start_time or ts_start > end_time:
-                continue
-
-            # Convert latency to milliseconds
-            p95_latency_ms = p95_latency_us / 1000.0
-
-            # Add to data points
-            data_points.append(p95_latency_ms)
-
-            # Check SLO violation (latency > 1ms)
-            if p95_latency_ms > 1.0:
-                slo_violations += 1
-
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing line {line_num}: {line.strip()[:50]}... - {str(e)}")
-            continue
+def parse_mcperf_data(mcperf_file, start_time, end_time):
+    """Stream the mcperf data file through the SLO engine, counting the p95 latency of
+    every measurement that overlaps the batch job window."""
+    engine = SloEngine(
+        [SLO_MS] + EXTRA_THRESHOLDS_MS,
+        column="p95",
+        start_ms=to_epoch_ms(start_time),
+        end_ms=to_epoch_ms(end_time),
+    )
+    with open(mcperf_file, "r") as f:
+        engine.consume(iter_mcperf(f))
 
-    print(f"Total mcperf records checked: {total_checked}")
-    print(f"Data points in batch window: {len(data_points)}")
+    print(f"Total mcperf records checked: {engine.rows}")
+    print(f"Data points in batch window: {engine.measurements}")
 
-    return data_points, slo_violations
+    return engine
 
 
 def main():
@@ -141,14 +118,15 @@ def main():
             )
 
             # Parse mcperf data and calculate SLO violations
-            data_points, slo_violations = parse_mcperf_data(
-                mcperf_file, start_time, end_time
-            )
+            engine = parse_mcperf_data(mcperf_file, start_time, end_time)
+            summaries = {s["threshold_ms"]: s for s in engine.summary()}
+            slo = summaries[SLO_MS]
 
-            total_points = len(data_points)
+            total_points = engine.measurements
 
             if total_points > 0:
-                slo_violation_ratio = slo_violations / total_points
+                slo_violations = slo["violations"]
+                slo_violation_ratio = slo["violation_ratio"]
                 results.append(slo_violation_ratio)
 
                 print(f"Data points analyzed: {total_points}")
@@ -156,6 +134,17 @@ def main():
                 print(
                     f"SLO violation ratio: {slo_violation_ratio:.4f} ({slo_violations}/{total_points})"
                 )
+                print(
+                    f"Time weighted violation ratio: {slo['time_weighted_ratio']:.4f}, "
+                    f"longest violation streak: {slo['longest_streak']} measurements "
+                    f"({slo['longest_streak_ms'] / 1000:.1f}s)"
+                )
+                for threshold in EXTRA_THRESHOLDS_MS:
+                    s = summaries[threshold]
+                    print(
+                        f"  p95 > {threshold:g}ms: {s['violations']}/{total_points} "
+                        f"({s['violation_ratio']:.4f}), time weighted {s['time_weighted_ratio']:.4f}"
+                    )
             else:
                 print(f"No data points found during batch job window.")
 
@@ -0,0 +1,369 @@
+"""Cluster wide dynamic scheduler for the part 3 PARSEC jobs.
+
+controller-node-{a,b,c,d}.sh pin every job to a node by hand and run each node's
+list one after the other, so the makespan is that of the slowest node. This
+scheduler treats the free cores of all worker nodes as one pool (without the
+memcached cores on node-d) and places the jobs as cores free up:
+ - jobs are taken longest first, by their single thread runtime in part2
+ - a job goes where it is expected to finish first: now on the free cores of a
+   node, or later on a node that then has more cores. The expected runtime is the
+   part2 runtime at that thread count times the slowdown of the node measured in
+   the recorded part3 runs (NODE_SLOWDOWN)
+ - if the best place for the first job is not free yet it is reserved, later jobs
+   only backfill the other nodes or finish before the reservation starts
+ - a pod gets its node with the nodeSelector and its cores with taskset, it runs
+   with one thread per core
+ - failed jobs are deleted and queued again, at most MAX_ATTEMPTS times
+
+The cluster is accessed through KubernetesCluster. fake_cluster.FakeCluster has
+the same methods and replays the jobs on a virtual clock, so the scheduler can be
+tried without a cluster and compared to the hand-written assignment:
+
+    python3 part3/cluster_scheduler.py
+    python3 part3/cluster_scheduler.py --fake --fail parsec-dedup
+"""
+
+import argparse
+import copy
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+# k8s_waiter.py is in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from k8s_waiter import NAMESPACE, PhaseEvent, Waiter  # noqa: E402
+
+PART3_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNTIMES_CSV = os.path.join(
+    PART3_DIR, "..", "part2", "task2", "parsec_result_threads", "execution_times.csv"
+)
+NODE_LABEL = "cca-project-nodetype"
+# cores of a node that are not given to the jobs (memcache-t1-cpuset.yaml: taskset -c 0-1)
+RESERVED_CORES = {"node-d-4core": {0, 1}}
+# runtime in the recorded part3 runs (logs/run_*/times_*.txt) / part2 runtime at
+# the same thread count. node-d includes the interference of memcached.
+NODE_SLOWDOWN = {
+    "node-a-2core": 1.6,
+    "node-b-2core": 1.5,
+    "node-c-4core": 1.5,
+    "node-d-4core": 2.2,
+}
+MAX_ATTEMPTS = 3
+# controller-node-{a,b,c,d}.sh: node -> jobs run one after the other, cores
+CONTROLLER_PLAN = {
+    "node-a-2core": (["parsec-canneal"], [0, 1]),
+    "node-b-2core": (["parsec-blackscholes", "parsec-dedup"], [0, 1]),
+    "node-c-4core": (["parsec-freqmine", "parsec-radix", "parsec-vips"], [0, 1, 2, 3]),
+    "node-d-4core": (["parsec-ferret"], [2, 3]),
+}
+
+# "[taskset -c 2-3 ]./run -a run -S parsec -p ferret -i native -n 2"
+_RUN_COMMAND = re.compile(r"^(?:taskset -c \S+ )?(\./run .*-n )\d+$")
+
+
+def log(message: str):
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}", flush=True)
+
+
+def read_runtimes(path: str = RUNTIMES_CSV) -> Dict[str, Dict[int, float]]:
+    """workload -> threads -> execution time in seconds (part2 task2)."""
+    runtimes: Dict[str, Dict[int, float]] = {}
+    with open(path, "r") as f:
+        for row in csv.DictReader(f):
+            runtimes.setdefault(row["workload"], {})[int(row["threads"])] = float(
+                row["execution_time"]
+            )
+    return runtimes
+
+
+def load_manifests(pattern: str = os.path.join(PART3_DIR, "parsec-*.yaml")) -> Dict[str, dict]:
+    manifests = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r") as f:
+            manifest = yaml.safe_load(f)
+        manifests[manifest["metadata"]["name"]] = manifest
+    return manifests
+
+
+def workload(job_name: str) -> str:
+    return job_name.removeprefix("parsec-")
+
+
+def format_cores(cores) -> str:
+    return ",".join(str(core) for core in sorted(cores))
+
+
+def placed_manifest(manifest: dict, node: str, cores: List[int]) -> dict:
+    """The job manifest pinned to the node and cores, with one thread per core."""
+    manifest = copy.deepcopy(manifest)
+    pod = manifest["spec"]["template"]["spec"]
+    pod["nodeSelector"] = {NODE_LABEL: node}
+    container = pod["containers"][0]
+    match = _RUN_COMMAND.match(container["args"][-1].strip())
+    if match is None:
+        raise ValueError(f"Unexpected command for {manifest['metadata']['name']}")
+    container["args"][-1] = f"taskset -c {format_cores(cores)} {match.group(1)}{len(cores)}"
+    # the cores are pinned with taskset, a cpu limit would only throttle a wider job
+    for section in container.get("resources", {}).values():
+        section.pop("cpu", None)
+    return manifest
+
+
+@dataclass
+class Node:
+    name: str
+    cores: List[int]  # cores the jobs may use
+    free: set = field(default_factory=set)
+
+
+@dataclass
+class Placement:
+    job: str
+    node: str
+    cores: List[int]
+    uid: str
+    start: float
+    expected_end: float
+
+
+class KubernetesCluster:
+    """The few operations the scheduler needs, on the real cluster."""
+
+    def __init__(self, namespace: str = NAMESPACE):
+        self.waiter = Waiter(namespace)
+        self.namespace = namespace
+
+    def nodes(self) -> Dict[str, int]:
+        """Worker node type -> number of cores."""
+        nodes = {}
+        for item in self.waiter.core.list_node().items:
+            node_type = (item.metadata.labels or {}).get(NODE_LABEL, "")
+            if node_type.startswith("node-"):
+                nodes[node_type] = int(item.status.capacity["cpu"])
+        return nodes
+
+    def create_job(self, manifest: dict) -> str:
+        job = self.waiter.batch.create_namespaced_job(self.namespace, manifest)
+        return job.metadata.uid
+
+    def delete_job(self, name: str):
+        from kubernetes.client.rest import ApiException
+
+        try:
+            self.waiter.batch.delete_namespaced_job(
+                name, self.namespace, propagation_policy="Background"
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+        self.waiter.wait_for_job_deleted(name)
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[PhaseEvent]:
+        return self.waiter.watch_jobs(timeout=timeout)
+
+    def now(self) -> float:
+        return time.time()
+
+
+class ClusterScheduler:
+    def __init__(
+        self,
+        cluster,
+        manifests: Dict[str, dict],
+        runtimes: Dict[str, Dict[int, float]],
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.cluster = cluster
+        self.manifests = manifests
+        self.runtimes = runtimes
+        self.max_attempts = max_attempts
+        self.nodes: Dict[str, Node] = {}
+        for name, count in sorted(cluster.nodes().items()):
+            cores = [c for c in range(count) if c not in RESERVED_CORES.get(name, set())]
+            self.nodes[name] = Node(name, cores, set(cores))
+        # longest single thread runtime first
+        self.queue: List[str] = sorted(manifests, key=lambda job: -self.total_work(job))
+        self.running: Dict[str, Placement] = {}
+        self.attempts: Dict[str, int] = {job: 0 for job in manifests}
+        self.completed: Dict[str, Placement] = {}
+        self.failed: List[str] = []
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+
+    def total_work(self, job: str) -> float:
+        """Runtime with the fewest threads measured, usually 1."""
+        runtimes = self.runtimes[workload(job)]
+        return runtimes[min(runtimes)]
+
+    def expected_runtime(self, job: str, node: str, threads: int) -> float:
+        return self.runtimes[workload(job)][threads] * NODE_SLOWDOWN.get(node, 1.0)
+
+    def _thread_options(self, job: str, node: Node) -> List[int]:
+        return [t for t in sorted(self.runtimes[workload(job)]) if t <= len(node.cores)]
+
+    def _free_at(self, node: Node, count: int, now: float) -> float:
+        """Expected time at which count cores of the node are free."""
+        free = len(node.free)
+        if free >= count:
+            return now
+        running = sorted(
+            (p for p in self.running.values() if p.node == node.name),
+            key=lambda p: p.expected_end,
+        )
+        for placement in running:
+            free += len(placement.cores)
+            if free >= count:
+                # a job that runs longer than expected is expected to end any moment
+                return max(placement.expected_end, now)
+        return float("inf")
+
+    def best_option(self, job: str, now: float) -> Tuple[float, float, str, int]:
+        """(expected end, start, node, threads) with the earliest expected end."""
+        options = []
+        for node in self.nodes.values():
+            for threads in self._thread_options(job, node):
+                start = self._free_at(node, threads, now)
+                end = start + self.expected_runtime(job, node.name, threads)
+                # ties: start now, then fewer cores
+                options.append((end, start, node.name, threads))
+        return min(options, key=lambda o: (o[0], o[1], o[3]))
+
+    def _place(self, job: str, node_name: str, threads: int, now: float):
+        node = self.nodes[node_name]
+        cores = sorted(node.free)[:threads]
+        manifest = placed_manifest(self.manifests[job], node_name, cores)
+        self.attempts[job] += 1
+        uid = self.cluster.create_job(manifest)
+        node.free -= set(cores)
+        self.queue.remove(job)
+        expected_end = now + self.expected_runtime(job, node_name, threads)
+        self.running[job] = Placement(job, node_name, cores, uid, now, expected_end)
+        if self.first_start is None:
+            self.first_start = now
+        log(
+            f"Placed {job} on {node_name} cores {format_cores(cores)} "
+            f"(attempt {self.attempts[job]}, expected {expected_end - now:.0f}s)"
+        )
+
+    def schedule(self):
+        """Place every queued job that should start now."""
+        now = self.cluster.now()
+        reservation: Optional[Tuple[str, float]] = None
+        for job in list(self.queue):
+            end, start, node_name, threads = self.best_option(job, now)
+            if reservation is None:
+                if start <= now:
+                    self._place(job, node_name, threads, now)
+                else:
+                    # the first job waits for its node, the others may only backfill
+                    reservation = (node_name, start)
+                continue
+            # backfill: start now on the free cores of a node without stalling the
+            # reserved job
+            backfill = None
+            for node in self.nodes.values():
+                for t in self._thread_options(job, node):
+                    if len(node.free) < t:
+                        continue
+                    end = now + self.expected_runtime(job, node.name, t)
+                    if node.name == reservation[0] and end > reservation[1]:
+                        continue
+                    if backfill is None or end < backfill[0]:
+                        backfill = (end, node.name, t)
+            if backfill is not None:
+                self._place(job, backfill[1], backfill[2], now)
+
+    def _release(self, job: str) -> Placement:
+        placement = self.running.pop(job)
+        self.nodes[placement.node].free |= set(placement.cores)
+        return placement
+
+    def handle(self, event: PhaseEvent):
+        placement = self.running.get(event.name)
+        # events of an earlier attempt of the same job name are ignored
+        if placement is None or event.obj is None or event.obj.metadata.uid != placement.uid:
+            return
+        if event.phase == "Complete":
+            self._release(event.name)
+            self.completed[event.name] = placement
+            self.last_end = event.timestamp
+            log(
+                f"{event.name} completed on {placement.node} after "
+                f"{event.timestamp - placement.start:.0f}s"
+            )
+        elif event.phase in ("Failed", "Deleted"):
+            self._release(event.name)
+            log(f"{event.name} failed on {placement.node} (attempt {self.attempts[event.name]})")
+            self.cluster.delete_job(event.name)
+            if self.attempts[event.name] < self.max_attempts:
+                self.queue.append(event.name)
+                self.queue.sort(key=lambda job: -self.total_work(job))
+            else:
+                self.failed.append(event.name)
+                log(f"Giving up on {event.name} after {self.max_attempts} attempts")
+        else:
+            return
+        self.schedule()
+
+    def done(self) -> bool:
+        return not self.queue and not self.running
+
+    def run(self, timeout: Optional[float] = None):
+        # names are reused, an old job from an earlier run must be gone first
+        for job in self.queue:
+            self.cluster.delete_job(job)
+        log(
+            "Worker cores: "
+            + ", ".join(f"{n.name} {format_cores(n.cores)}" for n in self.nodes.values())
+        )
+        self.schedule()
+        for event in self.cluster.events(timeout=timeout):
+            self.handle(event)
+            if self.done():
+                break
+        if self.first_start is not None and self.last_end is not None:
+            log(
+                f"{len(self.completed)}/{len(self.manifests)} jobs completed, "
+                f"makespan {self.last_end - self.first_start:.0f}s"
+            )
+        return not self.failed and self.done()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Place the part 3 PARSEC jobs dynamically")
+    parser.add_argument("--timeout", type=float, default=7200)
+    parser.add_argument(
+        "--fake", action="store_true", help="Run against fake_cluster.FakeCluster"
+    )
+    parser.add_argument(
+        "--fail",
+        nargs="*",
+        default=[],
+        help="With --fake, jobs whose first attempt fails",
+    )
+    args = parser.parse_args()
+
+    manifests = load_manifests()
+    runtimes = read_runtimes()
+    if args.fake:
+        from fake_cluster import FakeCluster, static_makespan
+
+        cluster = FakeCluster(runtimes, failures={job: 1 for job in args.fail})
+        log(f"Hand-written assignment: makespan {static_makespan(cluster):.0f}s")
+    else:
+        cluster = KubernetesCluster()
+
+    scheduler = ClusterScheduler(cluster, manifests, runtimes)
+    sys.exit(0 if scheduler.run(args.timeout) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/bin/bash
+
+# Runs the jobs of the controller scripts through the work stealing queue of
+# part3/job_queue.py: one worker per node pulls its jobs from the queue server and
+# steals queued jobs of the other nodes when its own queue is empty.
+
+QUEUE_PORT=8000
+QUEUE_DB=${1:-part3/job_queue.db}
+SERVER="http://localhost:$QUEUE_PORT"
+
+echo "Starting job queue server..."
+python3 part3/job_queue.py serve --db "$QUEUE_DB" --port $QUEUE_PORT &
+SERVER_PID=$!
+sleep 2
+
+echo "Starting all node workers in parallel..."
+for node in node-a-2core node-b-2core node-c-4core node-d-4core; do
+  python3 part3/job_queue.py worker $node --server $SERVER &
+  WORKER_PIDS="$WORKER_PIDS $!"
+done
+
+# Wait for all workers to run out of jobs
+wait $WORKER_PIDS
+
+echo "Node utilization and makespan:"
+python3 part3/job_queue.py report --server $SERVER
+status=$?
+
+kill $SERVER_PID 2>/dev/null
+echo "All jobs completed."
+exit $status
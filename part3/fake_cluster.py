@@ -0,0 +1,121 @@
+"""A cluster on a virtual clock for trying cluster_scheduler.py without kubernetes.
+
+FakeCluster has the methods of cluster_scheduler.KubernetesCluster. A created job
+runs for its part2 runtime at its thread count times the slowdown of its node and
+a deterministic +-10% noise per job and attempt. It checks the placements: a job
+on a core that is taken or reserved for memcached raises. Jobs in failures fail
+halfway through that many of their first attempts.
+
+static_makespan() replays the hand-written assignment of controller-node-*.sh on
+the same cluster for comparison.
+"""
+
+import heapq
+import re
+import zlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from kubernetes.client import V1Job, V1ObjectMeta
+
+from cluster_scheduler import CONTROLLER_PLAN, NODE_LABEL, NODE_SLOWDOWN, RESERVED_CORES
+from k8s_waiter import PhaseEvent
+
+NODES = {"node-a-2core": 2, "node-b-2core": 2, "node-c-4core": 4, "node-d-4core": 4}
+NOISE = 0.1
+
+_TASKSET = re.compile(r"taskset -c (\S+) .*-p (\S+) .*-n (\d+)")
+
+
+def parse_cores(cores: str) -> Set[int]:
+    result = set()
+    for part in cores.split(","):
+        first, _, last = part.partition("-")
+        result.update(range(int(first), int(last or first) + 1))
+    return result
+
+
+class FakeCluster:
+    def __init__(
+        self,
+        runtimes: Dict[str, Dict[int, float]],
+        nodes: Dict[str, int] = NODES,
+        failures: Optional[Dict[str, int]] = None,
+    ):
+        self.runtimes = runtimes
+        self._nodes = dict(nodes)
+        self.failures = dict(failures or {})
+        self.clock = 0.0
+        self._uids = 0
+        self._attempts: Dict[str, int] = {}
+        # (time, sequence, name, uid, phase) of the pending job ends
+        self._events: List[Tuple[float, int, str, str, str]] = []
+        # name -> (uid, node, cores) of the jobs that hold cores
+        self._running: Dict[str, Tuple[str, str, Set[int]]] = {}
+
+    def nodes(self) -> Dict[str, int]:
+        return dict(self._nodes)
+
+    def now(self) -> float:
+        return self.clock
+
+    def duration(self, job: str, node: str, threads: int, attempt: int) -> float:
+        noise = zlib.crc32(f"{job}/{attempt}".encode()) / 0xFFFFFFFF * 2 - 1
+        workload = job.removeprefix("parsec-")
+        runtime = self.runtimes[workload][threads] * NODE_SLOWDOWN.get(node, 1.0)
+        return runtime * (1 + NOISE * noise)
+
+    def create_job(self, manifest: dict) -> str:
+        name = manifest["metadata"]["name"]
+        if name in self._running:
+            raise RuntimeError(f"{name} already exists")
+        pod = manifest["spec"]["template"]["spec"]
+        node = pod["nodeSelector"][NODE_LABEL]
+        match = _TASKSET.search(pod["containers"][0]["args"][-1])
+        cores = parse_cores(match.group(1))
+        threads = int(match.group(3))
+        taken = set(RESERVED_CORES.get(node, set()))
+        for _, other_node, other_cores in self._running.values():
+            if other_node == node:
+                taken |= other_cores
+        if cores & taken or max(cores) >= self._nodes[node]:
+            raise RuntimeError(f"{name} on {node} cores {sorted(cores)}, taken {sorted(taken)}")
+
+        self._uids += 1
+        uid = f"uid-{self._uids}"
+        attempt = self._attempts.get(name, 0) + 1
+        self._attempts[name] = attempt
+        duration = self.duration(name, node, threads, attempt)
+        phase = "Complete"
+        if attempt <= self.failures.get(name, 0):
+            duration, phase = duration / 2, "Failed"
+        heapq.heappush(self._events, (self.clock + duration, self._uids, name, uid, phase))
+        self._running[name] = (uid, node, cores)
+        return uid
+
+    def delete_job(self, name: str):
+        self._running.pop(name, None)
+        self._events = [e for e in self._events if e[2] != name]
+        heapq.heapify(self._events)
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[PhaseEvent]:
+        deadline = None if timeout is None else self.clock + timeout
+        while self._events:
+            end, _, name, uid, phase = heapq.heappop(self._events)
+            if deadline is not None and end > deadline:
+                return
+            self.clock = end
+            if phase == "Complete":
+                # a completed job keeps its name but no longer its cores
+                self._running.pop(name, None)
+            job = V1Job(metadata=V1ObjectMeta(name=name, uid=uid))
+            yield PhaseEvent("job", name, phase, end, job)
+
+
+def static_makespan(cluster: FakeCluster) -> float:
+    """Makespan of controller-node-*.sh on the cluster, without failures."""
+    makespan = 0.0
+    for node, (jobs, cores) in CONTROLLER_PLAN.items():
+        # the manifests run one thread per core
+        end = sum(cluster.duration(job, node, len(cores), 1) for job in jobs)
+        makespan = max(makespan, end)
+    return makespan
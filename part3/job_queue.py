@@ -0,0 +1,372 @@
+"""Work stealing job queue for the part 3 node controllers.
+
+controller-node-{a,b,c,d}.sh each run a fixed list of jobs, a node that is done
+early stays idle while another one still has a backlog. Here the lists of the
+controller scripts (CONTROLLER_PLAN) become per-node queues in a SQLite database
+behind a small HTTP server, and one worker per node pulls its next job from it:
+ - a worker gets the head of its own queue first
+ - a worker with an empty queue steals the queued job of another node that it
+   would finish the most ahead of that node, which first has to run its current
+   job and the jobs queued before it. The expected runtimes are those of
+   cluster_scheduler.py (part2 runtime at the thread count times the slowdown of
+   the node)
+ - a job runs on the cores of its node in the plan (node-d keeps 0-1 for
+   memcached) with the largest thread count of part2 that fits on them
+ - a failed job goes back to the head of the queue of the node it failed on, at
+   most MAX_ATTEMPTS times
+Every run is kept in the database, the report has the busy core time and the
+utilization of every node and the makespan. The state survives a restart of the
+server with --resume.
+
+    python3 part3/job_queue.py serve --db part3/job_queue.db
+    python3 part3/job_queue.py worker node-a-2core
+    python3 part3/job_queue.py report
+
+part3/controller-queue.sh starts the server and the four workers. A worker with
+--fake sleeps the expected runtime divided by --speedup instead of running the
+job, to try the queue without a cluster.
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from cluster_scheduler import (
+    CONTROLLER_PLAN,
+    MAX_ATTEMPTS,
+    NODE_SLOWDOWN,
+    KubernetesCluster,
+    format_cores,
+    load_manifests,
+    log,
+    placed_manifest,
+    read_runtimes,
+    workload,
+)
+
+DEFAULT_DB = "part3/job_queue.db"
+DEFAULT_PORT = 8000
+# seconds an idle worker waits before asking again while jobs still run elsewhere
+POLL_SECONDS = 5
+JOB_TIMEOUT = 7200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    node TEXT NOT NULL,          -- queue the job is in
+    position INTEGER NOT NULL,   -- order within the queue of the node
+    state TEXT NOT NULL,         -- queued, running, complete, failed
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    node TEXT NOT NULL,
+    cores TEXT NOT NULL,
+    threads INTEGER NOT NULL,
+    stolen_from TEXT,
+    start REAL NOT NULL,
+    end REAL,
+    status TEXT
+);
+"""
+
+
+def expected_runtime(
+    runtimes: Dict[str, Dict[int, float]], job: str, node: str, threads: int
+) -> float:
+    return runtimes[workload(job)][threads] * NODE_SLOWDOWN.get(node, 1.0)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        path: str,
+        runtimes: Dict[str, Dict[int, float]],
+        plan=CONTROLLER_PLAN,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.runtimes = runtimes
+        self.max_attempts = max_attempts
+        # node -> cores the jobs of the node may use
+        self.cores: Dict[str, List[int]] = {node: cores for node, (_, cores) in plan.items()}
+        self._plan = plan
+        # one connection for all request threads, the lock serializes them
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Drop all state and queue the jobs of the plan."""
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM jobs")
+            self.db.execute("DELETE FROM runs")
+            for node, (jobs, _) in self._plan.items():
+                self.db.executemany(
+                    "INSERT INTO jobs (name, node, position, state) VALUES (?, ?, ?, 'queued')",
+                    [(job, node, position) for position, job in enumerate(jobs)],
+                )
+
+    def threads(self, job: str, node: str) -> int:
+        """Largest measured thread count that fits on the cores of the node."""
+        fitting = [t for t in self.runtimes[workload(job)] if t <= len(self.cores[node])]
+        return max(fitting) if fitting else 0
+
+    def expected_runtime(self, job: str, node: str) -> float:
+        threads = self.threads(job, node)
+        if threads == 0:
+            return float("inf")
+        return expected_runtime(self.runtimes, job, node, threads)
+
+    def _queued(self, node: str) -> List[str]:
+        rows = self.db.execute(
+            "SELECT name FROM jobs WHERE node = ? AND state = 'queued' ORDER BY position",
+            (node,),
+        )
+        return [name for (name,) in rows]
+
+    def _busy_until(self, node: str, now: float) -> float:
+        """Expected time at which the running job of the node ends."""
+        row = self.db.execute(
+            "SELECT job, start FROM runs WHERE node = ? AND end IS NULL", (node,)
+        ).fetchone()
+        if row is None:
+            return now
+        job, start = row
+        # a job that runs longer than expected is expected to end any moment
+        return max(start + self.expected_runtime(job, node), now)
+
+    def _steal(self, thief: str, now: float) -> Optional[Tuple[str, str]]:
+        """(job, node) of the queued job that gains most by moving to thief."""
+        best = None
+        for victim in self.cores:
+            if victim == thief:
+                continue
+            # the victim runs its queue in order after its current job
+            end = self._busy_until(victim, now)
+            for job in self._queued(victim):
+                end += self.expected_runtime(job, victim)
+                gain = end - (now + self.expected_runtime(job, thief))
+                if gain > 0 and (best is None or gain > best[0]):
+                    best = (gain, job, victim)
+        return None if best is None else (best[1], best[2])
+
+    def claim(self, node: str) -> dict:
+        """The next job for the idle worker of node, {"job": None} if there is none."""
+        with self._lock, self.db:
+            now = time.time()
+            queued = self._queued(node)
+            stolen_from = None
+            if queued:
+                job = queued[0]
+            else:
+                stolen = self._steal(node, now)
+                if stolen is None:
+                    running = self.db.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+                    ).fetchone()[0]
+                    # a running job can still fail and be queued again
+                    return {"job": None, "finished": running == 0}
+                job, stolen_from = stolen
+            threads = self.threads(job, node)
+            cores = self.cores[node][:threads]
+            self.db.execute(
+                "UPDATE jobs SET node = ?, state = 'running', attempts = attempts + 1 "
+                "WHERE name = ?",
+                (node, job),
+            )
+            self.db.execute(
+                "INSERT INTO runs (job, node, cores, threads, stolen_from, start) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job, node, format_cores(cores), threads, stolen_from, now),
+            )
+        if stolen_from is not None:
+            log(f"{node} stole {job} from {stolen_from}")
+        log(f"{job} on {node} cores {format_cores(cores)}")
+        return {"job": job, "cores": cores, "threads": threads, "stolen_from": stolen_from}
+
+    def finish(self, job: str, node: str, status: str):
+        with self._lock, self.db:
+            self.db.execute(
+                "UPDATE runs SET end = ?, status = ? WHERE job = ? AND node = ? AND end IS NULL",
+                (time.time(), status, job, node),
+            )
+            if status == "Complete":
+                self.db.execute("UPDATE jobs SET state = 'complete' WHERE name = ?", (job,))
+                log(f"{job} completed on {node}")
+                return
+            (attempts,) = self.db.execute(
+                "SELECT attempts FROM jobs WHERE name = ?", (job,)
+            ).fetchone()
+            if attempts >= self.max_attempts:
+                self.db.execute("UPDATE jobs SET state = 'failed' WHERE name = ?", (job,))
+                log(f"Giving up on {job} after {attempts} attempts")
+                return
+            # retried first on the node it failed on, like the controller scripts do
+            (first,) = self.db.execute(
+                "SELECT COALESCE(MIN(position), 0) FROM jobs WHERE node = ?", (node,)
+            ).fetchone()
+            self.db.execute(
+                "UPDATE jobs SET state = 'queued', position = ? WHERE name = ?", (first - 1, job)
+            )
+            log(f"{job} failed on {node} (attempt {attempts}), queued again")
+
+    def report(self) -> dict:
+        with self._lock:
+            runs = self.db.execute(
+                "SELECT job, node, threads, stolen_from, start, end, status FROM runs"
+            ).fetchall()
+            states = dict(self.db.execute("SELECT name, state FROM jobs").fetchall())
+        ended = [r for r in runs if r[5] is not None]
+        makespan = 0.0
+        if ended:
+            makespan = max(r[5] for r in ended) - min(r[4] for r in runs)
+        nodes = {}
+        for node, cores in self.cores.items():
+            node_runs = [r for r in ended if r[1] == node]
+            busy = sum((r[5] - r[4]) * r[2] for r in node_runs)
+            nodes[node] = {
+                "jobs": [r[0] for r in node_runs if r[6] == "Complete"],
+                "stolen": sum(1 for r in node_runs if r[3] is not None),
+                "busy_core_seconds": busy,
+                "utilization": busy / (makespan * len(cores)) if makespan else 0.0,
+            }
+        return {"makespan": makespan, "jobs": states, "nodes": nodes}
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for node, stats in report["nodes"].items():
+        lines.append(
+            f"{node}: utilization {stats['utilization']:.0%}, "
+            f"{stats['busy_core_seconds']:.0f} core seconds, {stats['stolen']} stolen, "
+            f"jobs {', '.join(stats['jobs']) or '-'}"
+        )
+    done = sum(1 for state in report["jobs"].values() if state == "complete")
+    lines.append(f"{done}/{len(report['jobs'])} jobs completed, makespan {report['makespan']:.0f}s")
+    return "\n".join(lines)
+
+
+def make_handler(queue: JobQueue):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/report":
+                self._reply(queue.report())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if self.path == "/claim":
+                self._reply(queue.claim(body["node"]))
+            elif self.path == "/finish":
+                queue.finish(body["job"], body["node"], body["status"])
+                self._reply({})
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            # every claim and finish is logged by the queue already
+            pass
+
+    return Handler
+
+
+def request(server: str, path: str, body: Optional[dict] = None) -> dict:
+    data = None if body is None else json.dumps(body).encode()
+    req = urllib.request.Request(
+        server + path, data=data, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def run_worker(server: str, node: str, fake_speedup: Optional[float] = None):
+    manifests = load_manifests()
+    runtimes = read_runtimes()
+    if fake_speedup is None:
+        cluster = KubernetesCluster()
+    while True:
+        reply = request(server, "/claim", {"node": node})
+        job = reply["job"]
+        if job is None:
+            if reply["finished"]:
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+
+        if fake_speedup is not None:
+            time.sleep(expected_runtime(runtimes, job, node, reply["threads"]) / fake_speedup)
+            status = "Complete"
+        else:
+            # names are reused, an earlier attempt must be gone first
+            cluster.delete_job(job)
+            cluster.create_job(placed_manifest(manifests[job], node, reply["cores"]))
+            event = cluster.waiter.wait_for_job(job, timeout=JOB_TIMEOUT)
+            status = event.phase if event is not None else "Failed"
+            if status != "Complete":
+                cluster.delete_job(job)
+        request(server, "/finish", {"job": job, "node": node, "status": status})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work stealing queue for the part 3 jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the queue server")
+    serve.add_argument("--db", default=DEFAULT_DB)
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument(
+        "--resume", action="store_true", help="Keep the queue of an earlier server"
+    )
+
+    worker = subparsers.add_parser("worker", help="Run the jobs of one node")
+    worker.add_argument("node", choices=sorted(CONTROLLER_PLAN))
+    worker.add_argument("--server", default=f"http://localhost:{DEFAULT_PORT}")
+    worker.add_argument(
+        "--fake", action="store_true", help="Sleep the expected runtime instead of running"
+    )
+    worker.add_argument("--speedup", type=float, default=1.0)
+
+    report = subparsers.add_parser("report", help="Print utilization and makespan")
+    report.add_argument("--server", default=f"http://localhost:{DEFAULT_PORT}")
+    report.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        queue = JobQueue(args.db, read_runtimes())
+        if not args.resume:
+            queue.reset()
+        server = ThreadingHTTPServer(("", args.port), make_handler(queue))
+        log(f"Job queue on port {args.port}, state in {args.db}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.command == "worker":
+        run_worker(args.server, args.node, args.speedup if args.fake else None)
+        log(f"Worker for {args.node} done")
+    else:
+        result = request(args.server, "/report")
+        print(json.dumps(result, indent=2) if args.json else format_report(result))
+        sys.exit(0 if all(s == "complete" for s in result["jobs"].values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
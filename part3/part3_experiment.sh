@@ -4,13 +4,22 @@
 set -e
 
 # Check for run number argument
-if [ $# -ne 1 ]; then
-    echo "Usage: $0 <run_number>"
-    echo "Example: $0 2   # Run experiment #2"
+if [ $# -lt 1 ] || [ $# -gt 2 ]; then
+    echo "Usage: $0 <run_number> [static|dynamic|queue]"
+    echo "Example: $0 2           # Run experiment #2 with the controller scripts"
+    echo "Example: $0 3 dynamic   # Run experiment #3 with part3/cluster_scheduler.py"
+    echo "Example: $0 4 queue     # Run experiment #4 with the work stealing part3/job_queue.py"
     exit 1
 fi
 
 run_number=$1
+# static: controller-node-*.sh, dynamic: cluster_scheduler.py places the jobs,
+# queue: the node workers of controller-queue.sh pull and steal the jobs
+mode=${2:-static}
+if [ "$mode" != "static" ] && [ "$mode" != "dynamic" ] && [ "$mode" != "queue" ]; then
+    echo "ERROR: Unknown mode $mode, use static, dynamic or queue"
+    exit 1
+fi
 
 # Constants
 RESULTS_DIR="part3/logs/run_${run_number}"
@@ -24,7 +33,7 @@ mkdir -p $RESULTS_DIR
 
 # Start logging
 exec > >(tee -a $LOG_FILE) 2>&1
-echo "=== Starting experiment run #${run_number} at $(date) ==="
+echo "=== Starting experiment run #${run_number} (${mode}) at $(date) ==="
 
 # Function to check if mcperf is installed on a node
 check_mcperf_installed() {
@@ -87,18 +96,6 @@ get_node_name() {
     kubectl get nodes | grep "$prefix" | awk '{print $1}' | head -1
 }
 
-# Function to check if all parsec jobs are completed
-check_jobs_completed() {
-    local expected_jobs=("parsec-blackscholes" "parsec-canneal" "parsec-dedup" "parsec-ferret" "parsec-freqmine" "parsec-radix" "parsec-vips")
-
-    for job in "${expected_jobs[@]}"; do
-        if ! kubectl get job "$job" -o jsonpath='{.status.conditions[?(@.type=="Complete")].status}' 2>/dev/null | grep -q "True"; then
-            return 1
-        fi
-    done
-    return 0
-}
-
 # Function to run a single experiment
 run_experiment() {
     local run_number=$1
@@ -182,8 +179,20 @@ run_experiment() {
     MCPERF_PID=$!
 
     # 4. Start controller scripts to run PARSEC jobs
-    echo "Starting PARSEC jobs via controller scripts..."
-    ./part3/controller-main.sh
+    if [ "$mode" = "dynamic" ]; then
+        echo "Starting PARSEC jobs via the cluster scheduler..."
+        python3 part3/cluster_scheduler.py || {
+            echo "WARNING: Not all PARSEC jobs completed"
+        }
+    elif [ "$mode" = "queue" ]; then
+        echo "Starting PARSEC jobs via the job queue..."
+        ./part3/controller-queue.sh $RESULTS_DIR/job_queue_${run_number}.db || {
+            echo "WARNING: Not all PARSEC jobs completed"
+        }
+    else
+        echo "Starting PARSEC jobs via controller scripts..."
+        ./part3/controller-main.sh
+    fi
 
     # Wait for mcperf to finish collecting data
     echo "Waiting for measurement to complete..."
@@ -197,15 +206,12 @@ run_experiment() {
     local start_time=$(date +%s)
     local current_time
 
-    while ! check_jobs_completed; do
-        current_time=$(date +%s)
-        if ((current_time - start_time > timeout)); then
-            echo "WARNING: Not all jobs completed within timeout. Continuing anyway."
-            break
-        fi
-        echo "Still waiting for jobs to complete... ($(((current_time - start_time) / 60)) minutes elapsed)"
-        sleep 30
-    done
+    if ! python3 k8s_waiter.py wait-jobs --timeout $timeout parsec-blackscholes parsec-canneal \
+        parsec-dedup parsec-ferret parsec-freqmine parsec-radix parsec-vips; then
+        echo "WARNING: Not all jobs completed within timeout. Continuing anyway."
+    fi
+    current_time=$(date +%s)
+    echo "Jobs finished after $(((current_time - start_time) / 60)) minutes"
 
     # 6. Collect pod data
     echo "Collecting pod data..."
@@ -277,7 +283,7 @@ if [ $exit_code -eq 0 ]; then
     echo "All required files for run #${run_number} are present."
     echo ""
     echo "To run the next experiment:"
-    echo "  ./part3_experiment.sh $((run_number + 1))"
+    echo "  ./part3_experiment.sh $((run_number + 1)) $mode"
     echo ""
 else
     echo "Some files are missing. Please check the logs."
@@ -6,8 +6,13 @@ import json
 import pandas as pd
 from datetime import datetime
 import os
+import sys
 from matplotlib.ticker import FuncFormatter
 
+# mcperf_log.py is in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mcperf_log import read_mcperf
+
 # Define colors for different workloads - using matplotlib's default color cycle for consistency
 WORKLOADS = ["ferret", "dedup", "canneal", "freqmine", "blackscholes", "radix", "vips"]
 # Define custom colors for each workload
@@ -24,38 +29,23 @@ WORKLOAD_COLORS = {
 
 def parse_mcperf_data(file_path):
     """Parse mcperf data into a pandas DataFrame."""
-    data = []
     # Correction for the 2-hour time difference (2 hours = 7,200,000 milliseconds)
     TIME_CORRECTION_MS = 7200000
 
-    with open(file_path, "r") as f:
-        for line in f:
-            if line.startswith("#") or not line.strip():
-                continue
-            parts = line.strip().split()
-            if parts[0] == "read" and len(parts) >= 16:
-                # Get raw Unix epoch timestamps in milliseconds and apply time correction
-                ts_start_ms = int(parts[-2]) - TIME_CORRECTION_MS
-                ts_end_ms = int(parts[-1]) - TIME_CORRECTION_MS
-                ts_mid_ms = (ts_start_ms + ts_end_ms) / 2
-
-                # Extract performance metrics
-                p95 = float(parts[12])
-                qps = float(parts[16])  # QPS is typically the 2nd value
-
-                data.append(
-                    {
-                        "timestamp_ms": ts_mid_ms,
-                        "ts_start_ms": ts_start_ms,
-                        "ts_end_ms": ts_end_ms,
-                        "p95_us": p95,  # Store original microseconds
-                        "p95_ms": p95 / 1000,  # Convert to milliseconds
-                        "qps": qps,
-                    }
-                )
-
-    # Convert to DataFrame for easier manipulation
-    return pd.DataFrame(data)
+    df = read_mcperf(file_path)
+    ts_start_ms = df["ts_start"] - TIME_CORRECTION_MS
+    ts_end_ms = df["ts_end"] - TIME_CORRECTION_MS
+
+    return pd.DataFrame(
+        {
+            "timestamp_ms": (ts_start_ms + ts_end_ms) / 2,
+            "ts_start_ms": ts_start_ms,
+            "ts_end_ms": ts_end_ms,
+            "p95_us": df["p95"],  # Store original microseconds
+            "p95_ms": df["p95"] / 1000,  # Convert to milliseconds
+            "qps": df["qps"],
+        }
+    )
 
 
 def parse_datetime(dt_str):
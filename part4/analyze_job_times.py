@@ -1,10 +1,16 @@
 import os
+import sys
 import csv
 import statistics
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 import pandas as pd
 import numpy as np
+from intervals import intervals_from_status, memcached_cores_from_events, status_from_events
+
+# mcperf_log.py is in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mcperf_log import read_mcperf
 
 # Define colors for different workloads - using matplotlib's default color cycle for consistency
 WORKLOADS = ["ferret", "dedup", "canneal", "freqmine", "blackscholes", "radix", "vips"]
@@ -29,215 +35,59 @@ def ensure_directory_exists(directory_path):
 
 def parse_mcperf_data(file_path):
     """Parse mcperf data into a pandas DataFrame."""
-    data = []
-
-    with open(file_path, mode='r') as file:
-        # Get QPS and their timestamps
-        file.readline()
-        interval_line = file.readline().strip()
-        interval_string = interval_line.split("=")[1].strip().split(" ", 1)
-        
-        number_of_intervals = int(interval_string[0])
-
-        file.readline()
-        timestamp_start_ms = int(file.readline().split(":")[1].strip())
-        timestamp_end_ms = int(file.readline().split(":")[1].strip())
-        timestamp_delta_ms = (timestamp_end_ms - timestamp_start_ms) / number_of_intervals
-
-        file.readline()
-        file.readline()
-        for i in range(number_of_intervals):
-            line = file.readline().strip().split()
-            latency_95th = float(line[-6])
-            qps = float(line[-2])
-
-            data.append(
-                {
-                    "timestamp_ms": timestamp_start_ms + i * timestamp_delta_ms,
-                    "p95_us": latency_95th, # Store original microseconds
-                    "p95_ms": latency_95th / 1000, # Convert to milliseconds
-                    "qps": qps,
-                }
-            )
+    # the interval start times are computed from the Timestamp start/end header
+    df = read_mcperf(file_path)
+    return pd.DataFrame(
+        {
+            "timestamp_ms": df["ts_start"],
+            "p95_us": df["p95"],  # Store original microseconds
+            "p95_ms": df["p95"] / 1000,  # Convert to milliseconds
+            "qps": df["qps"],
+        }
+    )
+def read_run_events(input_directory_path, policy_number, run_number):
+    """Job status and memcached cores of a run, None for what the run does not have.
 
-        return pd.DataFrame(data)
-    
-def process_execution_intervals(file_path):
-    # Are the jobs running or not
-    blackscholes_is_running = False
-    canneal_is_running = False
-    dedup_is_running = False
-    ferret_is_running = False
-    freqmine_is_running = False
-    radix_is_running = False
-    vips_is_running = False
-
-    job_events = []
-    earliest_start_ms = None
-
-    df = pd.read_csv(file_path)
-    for index, row in df.iterrows():
-        job_name = row["job_name"].strip()
-        timestamp = int(row["timestamp"]) * 1000
-        status = row["status"].strip()
-
-        if earliest_start_ms is None or timestamp < earliest_start_ms:
-            earliest_start_ms = timestamp
-
-        if job_name == "blackscholes":
-            if status == "RUNNING" and not blackscholes_is_running:
-                blackscholes_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "blackscholes",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and blackscholes_is_running:
-                blackscholes_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "blackscholes",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "canneal":
-            if status == "RUNNING" and not canneal_is_running:
-                canneal_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "canneal",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and canneal_is_running:
-                canneal_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "canneal",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "dedup":
-            if status == "RUNNING" and not dedup_is_running:
-                dedup_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "dedup",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and dedup_is_running:
-                dedup_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "dedup",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "ferret":
-            if status == "RUNNING" and not ferret_is_running:
-                ferret_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "ferret",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and ferret_is_running:
-                ferret_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "ferret",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "freqmine":
-            if status == "RUNNING" and not freqmine_is_running:
-                freqmine_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "freqmine",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and freqmine_is_running:
-                freqmine_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "freqmine",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "radix":
-            if status == "RUNNING" and not radix_is_running:
-                radix_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "radix",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and radix_is_running:
-                radix_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "radix",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-        elif job_name == "vips":
-            if status == "RUNNING" and not vips_is_running:
-                vips_is_running = True
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "vips",
-                        "event": "START",
-                        "node": None,
-                    }
-                )
-            elif (status == "PAUSED" or status == "COMPLETED") and vips_is_running:
-                vips_is_running = False
-                job_events.append(
-                    {
-                        "timestamp_ms": timestamp,
-                        "process_name": "vips",
-                        "event": "END",
-                        "node": None,
-                    }
-                )
-
-    events_df = pd.DataFrame(job_events)
-    return events_df, earliest_start_ms
-
-def process_cpu_usage_of_memcached(file_path):
-    df = pd.read_csv(file_path)
+    Read from the binary event log of the scheduler (scheduler_policy*_run*.bin) if
+    the run has one, otherwise from the CSVs extract_job_data.py wrote from the text log.
+    """
+    events_file = os.path.join(input_directory_path, f"scheduler_policy{policy_number}_run{run_number}.bin")
+    if os.path.exists(events_file):
+        return status_from_events(events_file), memcached_cores_from_events(events_file)
 
+    scheduler_file = os.path.join(input_directory_path, f"job_times/job_start_end_times/job_times_policy{policy_number}_run{run_number}.csv")
+    cpu_usage_file = os.path.join(input_directory_path, f"job_times/memcached_cpu_usage/memcached_cpu_usage_policy{policy_number}_run{run_number}.csv")
+    status_df = pd.read_csv(scheduler_file) if os.path.exists(scheduler_file) else None
+    cores_df = pd.read_csv(cpu_usage_file) if os.path.exists(cpu_usage_file) else None
+    return status_df, cores_df
+
+def process_execution_intervals(status_df):
+    """START/END events of every running interval and the first timestamp of the run."""
+    earliest_start_ms = int(status_df["timestamp"].min()) * 1000 if len(status_df) else None
+
+    # open intervals have no END event, the timeline only draws complete pairs anyway
+    intervals = intervals_from_status(status_df)
+    starts = pd.DataFrame(
+        {
+            "timestamp_ms": intervals["start"].astype(np.int64) * 1000,
+            "process_name": intervals["job"],
+            "event": "START",
+            "node": None,
+        }
+    )
+    closed = intervals.dropna(subset=["end"])
+    ends = pd.DataFrame(
+        {
+            "timestamp_ms": closed["end"].astype(np.int64) * 1000,
+            "process_name": closed["job"],
+            "event": "END",
+            "node": None,
+        }
+    )
+    events_df = pd.concat([starts, ends]).sort_values("timestamp_ms", kind="stable")
+    return events_df.reset_index(drop=True), earliest_start_ms
+
+def process_cpu_usage_of_memcached(df):
     memcached_cpu_usage = []
     for index, row in df.iterrows():
         timestamp_ms = int(row["timestamp"]) * 1000
@@ -252,15 +102,15 @@ def process_cpu_usage_of_memcached(file_path):
 
 def create_plots_A(input_directory_path, policy_number, run_number, save_folder_path):
     mcperf_file = os.path.join(input_directory_path, f"mcperf_policy{policy_number}_run{run_number}.log")
-    scheduler_file = os.path.join(input_directory_path, f"job_times/job_start_end_times/job_times_policy{policy_number}_run{run_number}.csv")
-    
-    if not os.path.exists(mcperf_file) or not os.path.exists(scheduler_file):
+    status_df, _ = read_run_events(input_directory_path, policy_number, run_number)
+
+    if not os.path.exists(mcperf_file) or status_df is None:
         print(f"Missing files for run {run_number}. Skipping.")
         return
 
     # Parse data into DataFrames
     mcperf_df = parse_mcperf_data(mcperf_file)
-    events_df, earliest_start_ms = process_execution_intervals(scheduler_file)
+    events_df, earliest_start_ms = process_execution_intervals(status_df)
 
     if mcperf_df.empty or events_df.empty:
         print(f"No data found for run {run_number}. Skipping.")
@@ -434,17 +284,16 @@ def create_plots_A(input_directory_path, policy_number, run_number, save_folder_
 
 def create_plots_B(input_directory_path, policy_number, run_number, save_folder_path):
     mcperf_file = os.path.join(input_directory_path, f"mcperf_policy{policy_number}_run{run_number}.log")
-    scheduler_file = os.path.join(input_directory_path, f"job_times/job_start_end_times/job_times_policy{policy_number}_run{run_number}.csv")
-    cpu_usage_file = os.path.join(input_directory_path, f"job_times/memcached_cpu_usage/memcached_cpu_usage_policy{policy_number}_run{run_number}.csv")
+    status_df, cores_df = read_run_events(input_directory_path, policy_number, run_number)
 
-    if not os.path.exists(mcperf_file) or not os.path.exists(scheduler_file) or not os.path.exists(cpu_usage_file):
+    if not os.path.exists(mcperf_file) or status_df is None or cores_df is None:
         print(f"Missing files for run {run_number}. Skipping.")
         return
 
     # Parse data into DataFrames
     mcperf_df = parse_mcperf_data(mcperf_file)
-    events_df, earliest_start_ms = process_execution_intervals(scheduler_file)
-    cpu_usage_df = process_cpu_usage_of_memcached(cpu_usage_file)
+    events_df, earliest_start_ms = process_execution_intervals(status_df)
+    cpu_usage_df = process_cpu_usage_of_memcached(cores_df)
 
     if mcperf_df.empty or events_df.empty or cpu_usage_df.empty:
         print(f"No data found for run {run_number}. Skipping.")
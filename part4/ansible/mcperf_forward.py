@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+"""Copies mcperf output from stdin to stdout and sends every line to the scheduler.
+
+run_load.sh pipes mcperf through it when a feedback address is given:
+
+    stdbuf -oL ./mcperf ... 2>&1 | python3 mcperf_forward.py 10.0.16.3:5555 >> mcperf.log
+
+The log on stdout is always complete. If the scheduler is not reachable the lines
+are dropped for it and the connection is retried at most once per second, so the
+load generator is never slowed down by the feedback channel.
+
+With --replay SECONDS it waits between two measurement lines, to send a recorded
+log to a local scheduler for testing.
+"""
+
+import argparse
+import socket
+import sys
+import time
+
+RETRY_INTERVAL = 1
+SEND_TIMEOUT = 0.5
+
+
+class Forwarder:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._socket = None
+        self._last_attempt = 0.0
+
+    def _connect(self):
+        now = time.monotonic()
+        if now - self._last_attempt < RETRY_INTERVAL:
+            return
+        self._last_attempt = now
+        try:
+            self._socket = socket.create_connection((self.host, self.port), timeout=SEND_TIMEOUT)
+        except OSError:
+            self._socket = None
+
+    def send(self, line: str):
+        if self._socket is None:
+            self._connect()
+            if self._socket is None:
+                return
+        try:
+            self._socket.sendall(line.encode("utf-8"))
+        except OSError:
+            self._socket.close()
+            self._socket = None
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forward mcperf output to the scheduler")
+    parser.add_argument("address", help="host:port of the scheduler latency feedback")
+    parser.add_argument("--replay", type=float, default=0, help="Seconds between measurements")
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(":", 1)
+    forwarder = Forwarder(host, int(port))
+    try:
+        for line in sys.stdin:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            forwarder.send(line)
+            if args.replay and line.startswith("read"):
+                time.sleep(args.replay)
+    finally:
+        forwarder.close()
+
+
+if __name__ == "__main__":
+    main()
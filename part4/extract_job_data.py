@@ -2,6 +2,12 @@ import os
 import csv
 import pandas as pd
 import statistics
+from intervals import (
+    intervals_from_csv,
+    memcached_cores_from_events,
+    status_from_events,
+    total_execution_time,
+)
 
 def parse_scheduler_line(line):
     """Parses a line from the log file and returns the relevant parts."""
@@ -50,6 +56,15 @@ def extract_memcached_cores_usage_to_csv(input_file_path, output_file_path):
                     memcached_cores_usage = 4 - len(info_parts[-1].split(" "))
                     writer.writerow([timestamp, memcached_cores_usage])
 
+def extract_job_times_from_events_to_csv(events_file_path, output_file_path):
+    """Same CSV as extract_job_times_to_csv, read from a binary event log."""
+    status_df = status_from_events(events_file_path)
+    status_df[["job_name", "timestamp", "status"]].to_csv(output_file_path, index=False)
+
+def extract_memcached_cores_usage_from_events_to_csv(events_file_path, output_file_path):
+    """Same CSV as extract_memcached_cores_usage_to_csv, read from a binary event log."""
+    memcached_cores_from_events(events_file_path).to_csv(output_file_path, index=False)
+
 def extract_job_times_to_csv_all(input_directory_path, output_directory_path):
     """Extracts job times from all log files in the specified directory.""" 
     print(f"START: Extracting job times")   
@@ -57,9 +72,14 @@ def extract_job_times_to_csv_all(input_directory_path, output_directory_path):
 
     for run in runs:
         log_file_path = os.path.join(input_directory_path, f"scheduler_policy1_run{run}.log")
+        events_file_path = os.path.join(input_directory_path, f"scheduler_policy1_run{run}.bin")
         output_file_path = os.path.join(output_directory_path, f"job_start_end_times/job_times_policy1_run{run}.csv")
-        
-        extract_job_times_to_csv(log_file_path, output_file_path)
+
+        # the binary event log is much faster to read, runs before it only have the text log
+        if os.path.exists(events_file_path):
+            extract_job_times_from_events_to_csv(events_file_path, output_file_path)
+        else:
+            extract_job_times_to_csv(log_file_path, output_file_path)
     
     print(f"END: Extracted job times")
 
@@ -70,114 +90,16 @@ def extract_memcached_cores_usage_to_csv_all(input_directory_path, output_direct
 
     for run in runs:
         log_file_path = os.path.join(input_directory_path, f"scheduler_policy1_run{run}.log")
+        events_file_path = os.path.join(input_directory_path, f"scheduler_policy1_run{run}.bin")
         output_file_path = os.path.join(output_directory_path, f"memcached_cpu_usage/memcached_cpu_usage_policy1_run{run}.csv")
-        
-        extract_memcached_cores_usage_to_csv(log_file_path, output_file_path)
+
+        if os.path.exists(events_file_path):
+            extract_memcached_cores_usage_from_events_to_csv(events_file_path, output_file_path)
+        else:
+            extract_memcached_cores_usage_to_csv(log_file_path, output_file_path)
     
     print(f"END: Extracted Memcached cores usage")
 
-def calculate_execution_intervals(csv_file_path):
-    # Are the jobs running or not
-    blackscholes_is_running = False
-    canneal_is_running = False
-    dedup_is_running = False
-    ferret_is_running = False
-    freqmine_is_running = False
-    radix_is_running = False
-    vips_is_running = False
-
-    blackscholes_timestamps = []
-    canneal_timestamps = []
-    dedup_timestamps = []
-    ferret_timestamps = []
-    freqmine_timestamps = []
-    radix_timestamps = []
-    vips_timestamps = []
-
-    df = pd.read_csv(csv_file_path)
-
-    for index, row in df.iterrows():
-        job_name = row["job_name"]
-        timestamp = row["timestamp"]
-        status = row["status"]
-
-        if job_name == "blackscholes":
-            if status == "RUNNING" and not blackscholes_is_running:
-                blackscholes_is_running = True
-                blackscholes_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and blackscholes_is_running:
-                blackscholes_is_running = False
-                blackscholes_timestamps.append((timestamp, "end"))
-
-        elif job_name == "canneal":
-            if status == "RUNNING" and not canneal_is_running:
-                canneal_is_running = True
-                canneal_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and canneal_is_running:
-                canneal_is_running = False
-                canneal_timestamps.append((timestamp, "end"))
-
-        elif job_name == "dedup":
-            if status == "RUNNING" and not dedup_is_running:
-                dedup_is_running = True
-                dedup_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and dedup_is_running:
-                dedup_is_running = False
-                dedup_timestamps.append((timestamp, "end"))
-
-        elif job_name == "ferret":
-            if status == "RUNNING" and not ferret_is_running:
-                ferret_is_running = True
-                ferret_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and ferret_is_running:
-                ferret_is_running = False
-                ferret_timestamps.append((timestamp, "end"))
-
-        elif job_name == "freqmine":
-            if status == "RUNNING" and not freqmine_is_running:
-                freqmine_is_running = True
-                freqmine_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and freqmine_is_running:
-                freqmine_is_running = False
-                freqmine_timestamps.append((timestamp, "end"))
-
-        elif job_name == "radix":
-            if status == "RUNNING" and not radix_is_running:
-                radix_is_running = True
-                radix_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and radix_is_running:
-                radix_is_running = False
-                radix_timestamps.append((timestamp, "end"))
-
-        elif job_name == "vips":
-            if status == "RUNNING" and not vips_is_running:
-                vips_is_running = True
-                vips_timestamps.append((timestamp, "start"))
-            elif (status == "PAUSED" or status == "COMPLETED") and vips_is_running:
-                vips_is_running = False
-                vips_timestamps.append((timestamp, "end"))
-
-    return (
-        blackscholes_timestamps,
-        canneal_timestamps,
-        dedup_timestamps,
-        ferret_timestamps,
-        freqmine_timestamps,
-        radix_timestamps,
-        vips_timestamps
-    )
-
-def calculate_execution_time(timestamps):
-    total_execution_time_s = 0
-
-    for i in range(0, len(timestamps), 2):
-        start_time_s = int(timestamps[i][0])
-        end_time_s = int(timestamps[i + 1][0])
-
-        total_execution_time_s += end_time_s - start_time_s
-
-    return total_execution_time_s
-
 def extract_job_exec_times_to_csv_all(input_directory_path, output_directory_path):
     """Extracts job execution times from all log files in the specified directory."""    
     print(f"START: Calculating execution times")
@@ -187,28 +109,13 @@ def extract_job_exec_times_to_csv_all(input_directory_path, output_directory_pat
         input_file_path = os.path.join(input_directory_path, f"job_times/job_start_end_times/job_times_policy1_run{run}.csv")
         output_file_path = os.path.join(output_directory_path, f"job_exec_times/job_tot_exec_times_policy1_run{run}.csv")
 
-        blackscholes_timestamps, canneal_timestamps, \
-        dedup_timestamps, ferret_timestamps, \
-        freqmine_timestamps, radix_timestamps, vips_timestamps = calculate_execution_intervals(input_file_path)
-
-        blackscholes_tot_exec_time = calculate_execution_time(blackscholes_timestamps)
-        canneal_tot_exec_time = calculate_execution_time(canneal_timestamps)
-        dedup_tot_exec_time = calculate_execution_time(dedup_timestamps)
-        ferret_tot_exec_time = calculate_execution_time(ferret_timestamps)
-        freqmine_tot_exec_time = calculate_execution_time(freqmine_timestamps)
-        radix_tot_exec_time = calculate_execution_time(radix_timestamps)  
-        vips_tot_exec_time = calculate_execution_time(vips_timestamps)          
+        exec_times = total_execution_time(intervals_from_csv(input_file_path))
 
         with open(output_file_path, mode='w', newline='') as output_file:
             writer = csv.writer(output_file)
             writer.writerow(["job_name", "total_execution_time_seconds"])
-            writer.writerow(["blackscholes", blackscholes_tot_exec_time])
-            writer.writerow(["canneal", canneal_tot_exec_time])
-            writer.writerow(["dedup", dedup_tot_exec_time])
-            writer.writerow(["ferret", ferret_tot_exec_time])
-            writer.writerow(["freqmine", freqmine_tot_exec_time])
-            writer.writerow(["radix", radix_tot_exec_time])
-            writer.writerow(["vips", vips_tot_exec_time])
+            for job_name, exec_time in exec_times.items():
+                writer.writerow([job_name, int(exec_time)])
 
     print("END: Execution times calculated and written to CSV files.")
 
@@ -0,0 +1,128 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# event_log.py lives next to the scheduler
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scheduler"))
+from event_log import Event, JOBS, Job, mask_to_cores, read_events, wall_time
+
+RUNNING = "RUNNING"
+STOPPED = ["PAUSED", "COMPLETED"]
+
+# Job status written for each binary event, as in the "Job x status:" lines
+EVENT_STATUS = {
+    Event.START: "RUNNING",
+    Event.UNPAUSE: "RUNNING",
+    Event.PAUSE: "PAUSED",
+    Event.END: "COMPLETED",
+}
+
+
+def intervals_from_status(status_df):
+    """Turns a job status table into the intervals during which each job was running.
+
+    status_df has the columns job_name, timestamp and status (the job_times CSVs),
+    optionally cores. A job starts running at the first RUNNING status after it was
+    not running and stops at the first PAUSED or COMPLETED status after that, any
+    other status keeps the current state. Rows of a job are taken in file order.
+
+    Returns a DataFrame with one row per interval and the columns job, start, end
+    (NaN if the job was still running at the end of the log) and cores (the cores
+    at the start, only if status_df has them).
+    """
+    jobs = status_df["job_name"].astype(str).str.strip().to_numpy()
+    status = status_df["status"].astype(str).str.strip().to_numpy()
+    timestamps = status_df["timestamp"].to_numpy(dtype=np.float64)
+
+    # group the rows by job, a stable sort keeps the file order within a job
+    job_codes, job_names = pd.factorize(jobs)
+    order = np.argsort(job_codes, kind="stable")
+    codes = job_codes[order]
+    status = status[order]
+    timestamps = timestamps[order]
+
+    # 1 = running, 0 = not running, NaN = no change, forward filled within each job
+    state = np.where(status == RUNNING, 1.0, np.where(np.isin(status, STOPPED), 0.0, np.nan))
+    state = pd.Series(state).groupby(codes).ffill().fillna(0).to_numpy()
+
+    first_of_job = np.ones(len(codes), dtype=bool)
+    first_of_job[1:] = codes[1:] != codes[:-1]
+    previous = np.roll(state, 1)
+    previous[first_of_job] = 0
+
+    starts = np.flatnonzero((state == 1) & (previous == 0))
+    ends = np.flatnonzero((state == 0) & (previous == 1))
+
+    # the matching end is the next end of the same job
+    next_end = np.searchsorted(ends, starts)
+    has_end = next_end < len(ends)
+    has_end[has_end] = codes[ends[next_end[has_end]]] == codes[starts[has_end]]
+    end_times = np.full(len(starts), np.nan)
+    end_times[has_end] = timestamps[ends[next_end[has_end]]]
+
+    intervals = pd.DataFrame(
+        {
+            "job": job_names[codes[starts]],
+            "start": timestamps[starts],
+            "end": end_times,
+        }
+    )
+    if "cores" in status_df.columns:
+        intervals["cores"] = status_df["cores"].to_numpy()[order][starts]
+    return intervals
+
+
+def intervals_from_csv(csv_file_path):
+    """Intervals of a job_times_policy*_run*.csv file."""
+    return intervals_from_status(pd.read_csv(csv_file_path))
+
+
+def status_from_events(events_file_path):
+    """Job status table (with cores) of the batch jobs in a binary event log."""
+    header, records = read_events(events_file_path)
+    batch_job = records["job"] > JOBS.index(Job.MEMCACHED)
+    records = records[batch_job]
+
+    # cores of a job from its last start or update_cores event
+    with_cores = np.isin(records["event"], [Event.START, Event.UPDATE_CORES])
+    masks = pd.Series(np.where(with_cores, records["cores"], np.nan))
+    masks = masks.groupby(records["job"]).ffill().fillna(0).astype(np.int64)
+
+    selected = np.isin(records["event"], list(EVENT_STATUS))
+    events = records["event"][selected]
+    return pd.DataFrame(
+        {
+            "job_name": [JOBS[job].value for job in records["job"][selected]],
+            "timestamp": wall_time(header, records[selected]).astype(np.int64),
+            "status": [EVENT_STATUS[Event(event)] for event in events],
+            "cores": [
+                ",".join(str(core) for core in mask_to_cores(mask))
+                for mask in masks.to_numpy()[selected]
+            ],
+        }
+    )
+
+
+def memcached_cores_from_events(events_file_path):
+    """Number of memcached cores after every memcached start or core change."""
+    header, records = read_events(events_file_path)
+    selected = np.flatnonzero(
+        (records["job"] == JOBS.index(Job.MEMCACHED))
+        & np.isin(records["event"], [Event.START, Event.UPDATE_CORES])
+    )
+    return pd.DataFrame(
+        {
+            "timestamp": wall_time(header, records[selected]).astype(np.int64),
+            "memcached_cores_usage": [
+                bin(int(mask)).count("1") for mask in records["cores"][selected]
+            ],
+        }
+    )
+
+
+def total_execution_time(intervals):
+    """Seconds each job spent running, open intervals are not counted."""
+    durations = intervals["end"] - intervals["start"]
+    return durations.groupby(intervals["job"]).sum()
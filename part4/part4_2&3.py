@@ -4,6 +4,10 @@ import time
 import os
 from datetime import datetime
 
+# Port of the scheduler latency feedback (latency_feedback.DEFAULT_PORT is 5555),
+# None runs without it
+FEEDBACK_PORT = None
+
 # Define the policies to test
 POLICIES = {
     "policy1": "1",  # Policy1And2Cores
@@ -11,8 +15,10 @@ POLICIES = {
 }
 
 
-def run_load(logfileName: str):
-    """Run the load test and save output to the specified path."""
+def run_load(logfileName: str, feedback: str | None = None):
+    """Run the load test and save output to the specified path.
+
+    With feedback (host:port) every mcperf line is also sent to the scheduler."""
     # Create output directory if it doesn't exist
 
     with open("ansible/inventory.yaml", "r") as f:
@@ -28,7 +34,9 @@ def run_load(logfileName: str):
                 "-i",
                 "~/.ssh/cloud-computing",
                 f"ubuntu@{client_measure_external_ip}",
-                "cd memcache-perf-dynamic && ./run_load.sh " + logfileName,
+                "cd memcache-perf-dynamic && ./run_load.sh "
+                + logfileName
+                + (" " + feedback if feedback else ""),
             ]
         )
 
@@ -48,7 +56,15 @@ def run_experiment(policy: str, run: int = 1, output_dir: str = "part4_2_logs"):
         # Run the load test
         mcperf_log = f"mcperf_policy{policy}_run{run}.log"
         print(f"[{datetime.now()}] Starting mcperf load test")
-        load_process = run_load(mcperf_log)
+        memcached_server = inventory["all"]["children"]["memcached_servers"]["hosts"][
+            "memcache-server"
+        ]
+        feedback = None
+        feedback_flag = ""
+        if FEEDBACK_PORT is not None:
+            feedback = f"{memcached_server['internal_ip']}:{FEEDBACK_PORT}"
+            feedback_flag = f" -f {FEEDBACK_PORT}"
+        load_process = run_load(mcperf_log, feedback)
 
         # Wait for a bit to ensure all data is collected
         time.sleep(10)
@@ -63,7 +79,7 @@ def run_experiment(policy: str, run: int = 1, output_dir: str = "part4_2_logs"):
                 "-i",
                 "~/.ssh/cloud-computing",
                 f"ubuntu@{inventory['all']['children']['memcached_servers']['hosts']['memcache-server']['ansible_host']}",
-                f"cd ~/scheduler && venv/bin/python3 main.py -p {policy} -l {scheduler_log}",
+                f"cd ~/scheduler && venv/bin/python3 main.py -p {policy} -l {scheduler_log}{feedback_flag}",
             ]
         )
 
@@ -96,6 +112,19 @@ def run_experiment(policy: str, run: int = 1, output_dir: str = "part4_2_logs"):
             check=True,
         )
 
+        # the binary event log (and its .comments) is named after the scheduler log
+        events_log = os.path.splitext(scheduler_log)[0] + ".bin"
+        subprocess.run(
+            [
+                "scp",
+                "-i",
+                "~/.ssh/cloud-computing",
+                f"ubuntu@{inventory['all']['children']['memcached_servers']['hosts']['memcache-server']['ansible_host']}:~/scheduler/{events_log}*",
+                output_dir,
+            ],
+            check=True,
+        )
+
         subprocess.run(
             [
                 "scp",
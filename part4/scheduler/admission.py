@@ -0,0 +1,150 @@
+# Memory bandwidth aware admission control for the batch jobs.
+# Combines the two interference measurements of the project:
+#  - part1 (part1/logs/benchmark_results_<type>_<run>.txt): memcached's p95 under
+#    every ibench interference type. The ratio to the run without interference says
+#    how much memcached suffers from llc and from membw pressure.
+#  - part2 (InterferenceProfile): how much each PARSEC job slows down under llc and
+#    membw interference. The part above its slowdown under cpu interference is how
+#    much the job depends on (and so puts pressure on) the memory hierarchy.
+# The memory pressure of a job is that excess slowdown, weighted per interference
+# type with how much memcached suffers from the type. Jobs above MEMORY_HEAVY are
+# memory heavy.
+# While memcached has 2 cores (it is loaded and its p95 is at risk) at most
+# MAX_HEAVY memory heavy jobs are admitted, the others wait and the cores go to
+# the next jobs in priority order, e.g. the cpu bound blackscholes.
+
+import glob
+import logging
+import os
+import statistics
+import sys
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from interference_profile import MEMORY_INTERFERENCE, InterferenceProfile
+
+# mcperf_log.py is in the repository root, install_scheduler.yaml copies it next to
+# the scheduler on the memcached node
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from mcperf_log import read_mcperf  # noqa: E402
+
+if TYPE_CHECKING:
+    from job import JobInstance
+
+logger = logging.getLogger(__name__)
+
+# install_scheduler.yaml copies the part1 logs next to the scheduler on the memcached
+# node, in the repository they are read from part1/logs
+DEFAULT_PART1_LOGS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "measurements", "part1_logs"
+)
+if not os.path.isdir(DEFAULT_PART1_LOGS):
+    DEFAULT_PART1_LOGS = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", "part1", "logs"
+    )
+# Memory pressure above which a job counts as memory heavy
+MEMORY_HEAVY = 0.2
+# Memory heavy jobs admitted at the same time while memcached has 2 cores
+MAX_HEAVY = 1
+
+
+def read_memcached_sensitivity(logs_dir: str = DEFAULT_PART1_LOGS) -> Dict[str, float]:
+    """Interference type -> median over the QPS targets of p95 / p95 without interference."""
+    # interference type -> target qps -> p95 of every run
+    p95s: Dict[str, Dict[float, List[float]]] = {}
+    for path in glob.glob(os.path.join(logs_dir, "benchmark_results_*_*.txt")):
+        interference = os.path.basename(path).split("_")[2]
+        df = read_mcperf(path)
+        by_target = p95s.setdefault(interference, {})
+        for target, p95 in zip(df["target"], df["p95"]):
+            by_target.setdefault(target, []).append(p95)
+
+    baseline = p95s.get("none", {})
+    sensitivity = {}
+    for interference, by_target in p95s.items():
+        ratios = [
+            statistics.median(values) / statistics.median(baseline[target])
+            for target, values in by_target.items()
+            if target in baseline
+        ]
+        if ratios:
+            sensitivity[interference] = statistics.median(ratios)
+    return sensitivity
+
+
+class MemoryPressure:
+    def __init__(self, profile: InterferenceProfile, memcached_sensitivity: Dict[str, float]):
+        # how much memcached suffers from each memory interference type
+        self.weights = {
+            t: max(memcached_sensitivity.get(t, 1.0) - 1.0, 0.0) for t in MEMORY_INTERFERENCE
+        }
+        total = sum(self.weights.values())
+        self.pressure: Dict[str, float] = {}
+        for workload, row in profile.slowdowns.items():
+            if total == 0 or "cpu" not in row:
+                # memcached does not care about the memory hierarchy
+                self.pressure[workload] = 0.0
+                continue
+            self.pressure[workload] = (
+                sum(w * (row.get(t, row["cpu"]) - row["cpu"]) for t, w in self.weights.items())
+                / total
+            )
+
+    def is_heavy(self, job_name: str) -> bool:
+        # unknown workloads are admitted, the profile has no reason to hold them back
+        return self.pressure.get(job_name, 0.0) > MEMORY_HEAVY
+
+    def log_table(self):
+        logger.info(
+            "Memcached sensitivity weights: "
+            + ", ".join(f"{t} {w:.2f}" for t, w in self.weights.items())
+        )
+        for workload, pressure in sorted(self.pressure.items(), key=lambda item: item[1]):
+            logger.info(
+                f"Memory pressure {workload}: {pressure:.2f}"
+                + (" (memory heavy)" if self.is_heavy(workload) else "")
+            )
+
+
+def load_memory_pressure(
+    profile: Optional[InterferenceProfile], logs_dir: str = DEFAULT_PART1_LOGS
+) -> Optional[MemoryPressure]:
+    """None if the part1 or part2 measurements are not available."""
+    if profile is None:
+        return None
+    sensitivity = read_memcached_sensitivity(logs_dir)
+    if "none" not in sensitivity:
+        logger.warning(f"No part1 measurements in {logs_dir}, admitting all jobs")
+        return None
+    return MemoryPressure(profile, sensitivity)
+
+
+class AdmissionControl:
+    def __init__(
+        self, pressure: MemoryPressure, num_cores: Optional[int] = None, max_heavy: int = MAX_HEAVY
+    ):
+        self.pressure = pressure
+        self.num_cores = num_cores if num_cores is not None else os.cpu_count()
+        self.max_heavy = max_heavy
+        self._held_back: List[str] = []
+
+    def admit(self, jobs: List["JobInstance"], available_cores: set[int]) -> List["JobInstance"]:
+        """The jobs (in priority order) that may get cores with these available cores."""
+        admitted = jobs
+        held_back = []
+        if self.num_cores - len(available_cores) >= 2:
+            admitted = []
+            heavy = 0
+            for job in jobs:
+                if self.pressure.is_heavy(job._jobName):
+                    if heavy >= self.max_heavy:
+                        held_back.append(job._jobName)
+                        continue
+                    heavy += 1
+                admitted.append(job)
+        if held_back != self._held_back:
+            if held_back:
+                logger.info(f"Holding back memory heavy jobs {held_back}")
+            else:
+                logger.info("Admitting all jobs")
+            self._held_back = held_back
+        return admitted
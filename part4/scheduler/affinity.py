@@ -0,0 +1,86 @@
+# In-process cpu affinity control for memcached.
+# Instead of forking `sudo taskset -a -cp` on every scaling decision, every
+# memcached thread listed in /proc/<pid>/task gets os.sched_setaffinity directly.
+# The applied mask is read back to verify it and the switch is logged as one
+# structured line (parsed by convert_log_format.py).
+# Changing the affinity of another user's process needs root or CAP_SYS_NICE.
+# Without it we fall back to the old sudo taskset call.
+
+import logging
+import os
+import subprocess
+import time
+
+from scheduler_logger import SchedulerLogger, Job as JobEnum
+
+logger = logging.getLogger(__name__)
+
+
+def format_cores(cores: set[int]) -> str:
+    return ",".join(str(core) for core in sorted(cores))
+
+
+class AffinityManager:
+    def __init__(self, pid: int, schedulerLogger: SchedulerLogger):
+        self._pid = int(pid)
+        self._schedulerLogger = schedulerLogger
+        self._use_taskset = False
+        self.cores: set[int] = set()
+
+    def _thread_ids(self) -> list[int]:
+        return [int(tid) for tid in os.listdir(f"/proc/{self._pid}/task")]
+
+    def _apply(self, cores: set[int]) -> tuple[int, bool]:
+        """Set the mask on every thread, return (#threads, verified)."""
+        threads = 0
+        verified = True
+        for tid in self._thread_ids():
+            try:
+                os.sched_setaffinity(tid, cores)
+                verified = verified and os.sched_getaffinity(tid) == cores
+                threads += 1
+            except ProcessLookupError:
+                # thread exited between listing and setting
+                continue
+        return threads, verified
+
+    def _apply_taskset(self, cores: set[int]) -> tuple[int, bool]:
+        result = subprocess.run(
+            ["sudo", "taskset", "-a", "-cp", format_cores(cores), str(self._pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return len(self._thread_ids()), result.returncode == 0
+
+    def set_cores(self, cores: set[int]) -> bool:
+        """Pin all memcached threads to cores, return whether the mask was verified."""
+        cores = set(cores)
+        wall_time = time.time()
+        start = time.perf_counter_ns()
+
+        if not self._use_taskset:
+            try:
+                threads, verified = self._apply(cores)
+            except PermissionError:
+                logger.warning(
+                    "No permission for sched_setaffinity on memcached, falling back to sudo taskset"
+                )
+                self._use_taskset = True
+
+        if self._use_taskset:
+            threads, verified = self._apply_taskset(cores)
+
+        latency_us = (time.perf_counter_ns() - start) / 1000
+
+        logger.info(
+            f"Memcached affinity switched to cores {format_cores(cores)} "
+            f"(threads={threads}, verified={verified}, latency_us={latency_us:.0f}, "
+            f"wall={wall_time:.6f})"
+        )
+        if not verified:
+            logger.error(f"Memcached affinity could not be verified for cores {format_cores(cores)}")
+
+        if cores != self.cores and self.cores:
+            self._schedulerLogger.update_cores(JobEnum.MEMCACHED, sorted(cores))
+        self.cores = cores
+        return verified
@@ -0,0 +1,197 @@
+# Backends for the cpuset, pause and cpu.max operations of the jobs.
+# DockerBackend goes through the dockerd HTTP API (container.update / pause /
+# unpause), every call is a round trip through the daemon and runc.
+# CgroupBackend resolves the cgroup v2 directory of a container once and then writes
+# cpuset.cpus, cgroup.freeze and cpu.max directly, which takes microseconds. A freeze is
+# confirmed by waiting for the frozen flag in cgroup.events, a freeze that times
+# out is undone with cgroup.freeze=0 before docker pauses the container. Containers whose
+# cgroup cannot be found or written (cgroup v1, missing permissions) fall back to
+# the DockerBackend.
+#
+# The cgroup root and /proc can point to a temporary directory tree for testing,
+# the kernel side (cgroup.events following cgroup.freeze) is then up to the test.
+
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+PROC_ROOT = "/proc"
+# Seconds to wait for cgroup.events to report the new frozen state
+FREEZE_TIMEOUT = 1.0
+FREEZE_POLL_INTERVAL = 0.0002
+# CFS period in us for cpu.max quotas
+CPU_PERIOD = 100000
+
+
+class DockerBackend:
+    name = "docker"
+
+    def update_cpus(self, container, cores: str):
+        container.update(cpuset_cpus=cores)
+
+    def pause(self, container):
+        container.pause()
+
+    def unpause(self, container):
+        container.unpause()
+
+    def set_quota(self, container, cpus: Optional[float]):
+        # -1 removes the quota
+        quota = int(cpus * CPU_PERIOD) if cpus is not None else -1
+        container.update(cpu_quota=quota, cpu_period=CPU_PERIOD)
+
+    def forget(self, container):
+        pass
+
+
+class CgroupBackend:
+    name = "cgroup"
+
+    def __init__(
+        self,
+        root: str = CGROUP_ROOT,
+        proc: str = PROC_ROOT,
+        fallback: Optional[DockerBackend] = None,
+    ):
+        self.root = root
+        self.proc = proc
+        self.fallback = fallback if fallback is not None else DockerBackend()
+        # container id -> cgroup directory, None if the container uses the fallback
+        self._paths: Dict[str, Optional[str]] = {}
+        # container id -> cgroup directory of the containers we froze
+        self._frozen_paths: Dict[str, str] = {}
+
+    def _from_proc(self, container) -> Optional[str]:
+        # the attributes of a container returned by run() are from before the start
+        container.reload()
+        pid = container.attrs.get("State", {}).get("Pid", 0)
+        if not pid:
+            return None
+        try:
+            with open(os.path.join(self.proc, str(pid), "cgroup")) as f:
+                for line in f:
+                    # cgroup v2 has a single hierarchy with id 0
+                    if line.startswith("0::"):
+                        return os.path.join(self.root, line[3:].strip().lstrip("/"))
+        except OSError:
+            pass
+        return None
+
+    def _candidates(self, container):
+        # systemd and cgroupfs cgroup drivers
+        yield os.path.join(self.root, "system.slice", f"docker-{container.id}.scope")
+        yield os.path.join(self.root, "docker", container.id)
+
+    def path(self, container) -> Optional[str]:
+        """The cgroup directory of the container, resolved on the first call."""
+        if container.id in self._paths:
+            return self._paths[container.id]
+        path = None
+        try:
+            path = self._from_proc(container)
+        except Exception as e:
+            logger.warning(f"Reading the pid of {container.name} failed: {e}")
+        if path is None or not os.path.exists(os.path.join(path, "cgroup.freeze")):
+            path = next(
+                (
+                    p
+                    for p in self._candidates(container)
+                    if os.path.exists(os.path.join(p, "cgroup.freeze"))
+                ),
+                None,
+            )
+        if path is None:
+            logger.warning(f"No cgroup v2 directory for {container.name}, using docker")
+        else:
+            logger.info(f"Cgroup of {container.name}: {path}")
+        self._paths[container.id] = path
+        return path
+
+    def _write(self, path: str, name: str, value: str):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(value)
+
+    def _frozen(self, path: str) -> bool:
+        with open(os.path.join(path, "cgroup.events")) as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if key == "frozen":
+                    return value.strip() == "1"
+        raise OSError(f"No frozen entry in {path}/cgroup.events")
+
+    def _set_frozen(self, path: str, frozen: bool):
+        self._write(path, "cgroup.freeze", "1" if frozen else "0")
+        deadline = time.monotonic() + FREEZE_TIMEOUT
+        while self._frozen(path) != frozen:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"{path} not {'frozen' if frozen else 'thawed'} after {FREEZE_TIMEOUT}s"
+                )
+            time.sleep(FREEZE_POLL_INTERVAL)
+
+    def _use_fallback(self, container, error: Exception):
+        logger.warning(f"Cgroup write for {container.name} failed, using docker: {error}")
+        self._paths[container.id] = None
+
+    def update_cpus(self, container, cores: str):
+        path = self.path(container)
+        if path is not None:
+            try:
+                self._write(path, "cpuset.cpus", cores)
+                return
+            except OSError as e:
+                self._use_fallback(container, e)
+        self.fallback.update_cpus(container, cores)
+
+    def set_quota(self, container, cpus: Optional[float]):
+        path = self.path(container)
+        if path is not None:
+            quota = str(int(cpus * CPU_PERIOD)) if cpus is not None else "max"
+            try:
+                self._write(path, "cpu.max", f"{quota} {CPU_PERIOD}")
+                return
+            except OSError as e:
+                self._use_fallback(container, e)
+        self.fallback.set_quota(container, cpus)
+
+    def pause(self, container):
+        path = self.path(container)
+        if path is not None:
+            try:
+                self._set_frozen(path, True)
+                self._frozen_paths[container.id] = path
+                return
+            except TimeoutError as e:
+                # the kernel may still finish the freeze, thaw before docker pauses it
+                try:
+                    self._write(path, "cgroup.freeze", "0")
+                except OSError as thaw_error:
+                    logger.error(f"Thawing {container.name} after the timeout failed: {thaw_error}")
+                self._use_fallback(container, e)
+            except OSError as e:
+                self._use_fallback(container, e)
+        self.fallback.pause(container)
+
+    def unpause(self, container):
+        # docker does not know about our freeze, so a thaw has no fallback
+        path = self._frozen_paths.get(container.id)
+        if path is not None:
+            self._set_frozen(path, False)
+            del self._frozen_paths[container.id]
+            return
+        self.fallback.unpause(container)
+
+    def forget(self, container):
+        """Thaw the container if we froze it and drop its cached path."""
+        self._paths.pop(container.id, None)
+        path = self._frozen_paths.pop(container.id, None)
+        if path is None:
+            return
+        try:
+            self._write(path, "cgroup.freeze", "0")
+        except OSError:
+            pass
@@ -0,0 +1,191 @@
+# Completion tracking for PARSEC containers.
+# Instead of re-reading the full container log on every scheduler tick, every
+# started container gets a ContainerTail that follows its log stream
+# incrementally (logs(stream=True, follow=True, since=...)) and remembers whether
+# the "[PARSEC] Done." or "Error" markers were seen. A single thread listens on
+# the Docker events stream for container die/oom events, so the scheduler learns
+# about finished containers as soon as dockerd reports them.
+# Checking a job is then a lookup on the tail object instead of a log scan.
+# The stream starts at the State.StartedAt of the container, a reconnect starts
+# at the time the last chunk was received, both minus SINCE_MARGIN. Chunks read
+# twice are harmless, the markers are flags.
+
+import datetime
+import enum
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from docker.client import DockerClient
+
+logger = logging.getLogger(__name__)
+
+DONE_MARKER = "[PARSEC] Done."
+ERROR_MARKER = "Error"
+# Keep the end of the previous chunk so markers split across chunks are found
+_CARRY = max(len(DONE_MARKER), len(ERROR_MARKER)) - 1
+# Seconds the log stream starts before the last known position, covers the clock
+# granularity of the log timestamps and chunks in flight when a connection drops
+SINCE_MARGIN = 1.0
+
+
+def started_at(container) -> Optional[float]:
+    """State.StartedAt of a container in seconds since epoch, None if it never started."""
+    value = container.attrs.get("State", {}).get("StartedAt", "")
+    if not value or value.startswith("0001-"):
+        return None
+    # Docker reports nanoseconds, datetime takes at most microseconds
+    date, _, fraction = value.rstrip("Z").partition(".")
+    started = datetime.datetime.fromisoformat(date).replace(tzinfo=datetime.timezone.utc)
+    return started.timestamp() + float(f"0.{fraction or 0}")
+
+
+class EndState(enum.Enum):
+    RUNNING = "running"
+    EXITED = "exited"
+    OOM = "oom"
+
+
+class ContainerTail:
+    """Incremental view on the log and end state of a single container."""
+
+    def __init__(self, container, on_change: threading.Event):
+        self.container_id = container.id
+        self.name = container.name
+        self.done = False
+        self.error = False
+        self.state = EndState.RUNNING
+        self.exit_code: Optional[int] = None
+        self.ended_at: Optional[float] = None
+        # without a start time the whole log is read
+        started = started_at(container)
+        self._since: Optional[float] = (
+            started - SINCE_MARGIN if started is not None else None
+        )
+        self._carry = ""
+        self._on_change = on_change
+        self._container = container
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._follow, name=f"tail-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def _follow(self):
+        # The stream ends when the container stops. If the connection drops while
+        # the container is still running, reconnect from the last received chunk.
+        while not self._stopped and self.state == EndState.RUNNING:
+            try:
+                stream = self._container.logs(stream=True, follow=True, since=self._since)
+                for chunk in stream:
+                    self._since = time.time() - SINCE_MARGIN
+                    self.feed(chunk)
+                    if self._stopped:
+                        break
+            except Exception as e:
+                logger.warning(f"Log stream for {self.name} interrupted: {e}")
+            if self.state == EndState.RUNNING and not self._stopped:
+                time.sleep(0.1)
+
+    def feed(self, chunk: bytes):
+        """Scan a new log chunk for the completion markers."""
+        text = self._carry + chunk.decode("utf-8", errors="replace")
+        changed = False
+        if not self.done and DONE_MARKER in text:
+            self.done = True
+            changed = True
+        if not self.error and ERROR_MARKER in text:
+            self.error = True
+            changed = True
+        self._carry = text[-_CARRY:]
+        if changed:
+            self._on_change.set()
+
+    def mark_ended(self, state: EndState, exit_code: Optional[int]):
+        self.state = state
+        self.exit_code = exit_code
+        self.ended_at = time.time()
+        self._on_change.set()
+
+    def stop(self):
+        self._stopped = True
+
+
+class CompletionTracker:
+    """Shared Docker events listener that keeps one ContainerTail per container."""
+
+    _instance = None
+
+    def __new__(cls, docker_client: DockerClient):
+        if cls._instance is None:
+            cls._instance = super(CompletionTracker, cls).__new__(cls)
+            cls._instance._init(docker_client)
+        return cls._instance
+
+    def _init(self, docker_client: DockerClient):
+        self._docker_client = docker_client
+        self._tails: Dict[str, ContainerTail] = {}
+        self._lock = threading.Lock()
+        self.changed = threading.Event()
+        self._events = None
+        self._thread = threading.Thread(
+            target=self._listen, name="docker-events", daemon=True
+        )
+        self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._events = self._docker_client.events(
+                    decode=True,
+                    filters={"type": "container", "event": ["die", "oom"]},
+                )
+                for event in self._events:
+                    self._handle_event(event)
+            except Exception as e:
+                logger.warning(f"Docker events stream interrupted: {e}")
+            time.sleep(0.5)
+
+    def _handle_event(self, event: dict):
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        with self._lock:
+            tail = self._tails.get(container_id)
+        if tail is None:
+            return
+
+        action = event.get("Action") or event.get("status")
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        if action == "oom":
+            tail.mark_ended(EndState.OOM, None)
+        elif action == "die" and tail.state == EndState.RUNNING:
+            exit_code = attributes.get("exitCode")
+            tail.mark_ended(
+                EndState.EXITED, int(exit_code) if exit_code is not None else None
+            )
+        logger.info(f"Container {tail.name} received {action} event")
+
+    def watch(self, container) -> ContainerTail:
+        """Start following a freshly started container."""
+        # a started warm pool container still has the attrs of its creation
+        container.reload()
+        tail = ContainerTail(container, self.changed)
+        with self._lock:
+            self._tails[container.id] = tail
+
+        # The die event may have fired before the tail was registered
+        container.reload()
+        if container.status in ("exited", "dead"):
+            tail.mark_ended(EndState.EXITED, container.attrs["State"].get("ExitCode"))
+        return tail
+
+    def forget(self, tail: ContainerTail):
+        tail.stop()
+        with self._lock:
+            self._tails.pop(tail.container_id, None)
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Block until any tracked container logs a marker or ends, or until timeout."""
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
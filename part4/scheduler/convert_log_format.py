@@ -2,6 +2,8 @@ import re
 from datetime import datetime
 import os
 
+from event_log import to_text
+
 # Job names as in SchedulerLogger
 JOBS = [
     "scheduler",
@@ -31,7 +33,7 @@ def get_job_name(name):
 # Parse a log line and convert to SchedulerLogger format
 def parse_line(line):
     # Example: [1746539176] [policy: 1_2_cores] [INFO] [job] Job ferret started with cores 2,3 and 2 threads
-    m = re.match(r"\[(\d+)\].*?\[(job|__main__)\] (.*)", line)
+    m = re.match(r"\[(\d+)\].*?\[(job|__main__|affinity)\] (.*)", line)
     if not m:
         return None
     timestamp, section, msg = m.groups()
@@ -101,6 +103,16 @@ def parse_line(line):
                 return f"{dt} update_cores {job_name} [{cores}]"
             return None
 
+    elif section == "affinity":
+        # Memcached core update, e.g.
+        # Memcached affinity switched to cores 0,1 (threads=4, verified=True, latency_us=35, wall=1746539176.123456)
+        m2 = re.match(r"Memcached affinity switched to cores ([\d,]+) \(.*wall=([\d.]+)\)", msg)
+        if m2:
+            cores, wall = m2.groups()
+            if job_statuses.get("memcached") == "RUNNING":
+                return f"{datetime.fromtimestamp(float(wall)).isoformat()} update_cores memcached [{cores}]"
+        return None
+
     elif section == "__main__":
         # Taskset command (memcached core update)
         if "CompletedProcess" in msg:
@@ -137,6 +149,13 @@ def parse_line(line):
 
 
 def main(input_log: str, output_log: str):
+    # runs with a binary event log (named after the log) need no regex parsing
+    events_log = os.path.splitext(input_log)[0] + ".bin"
+    if os.path.exists(events_log):
+        with open(output_log, "w") as fout:
+            for line in to_text(events_log):
+                fout.write(line + "\n")
+        return
     with open(input_log, "r") as fin, open(output_log, "w") as fout:
         for line in fin:
             line = line.strip()
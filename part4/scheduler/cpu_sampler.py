@@ -0,0 +1,136 @@
+# High frequency cpu sampler for the memcached scaling decision.
+# Reads /proc/stat (per core) and /proc/<pid>/stat (memcached) directly and
+# turns the jiffy deltas into usage percentages. The samples are kept in a
+# fixed-size NumPy ring buffer, so the scaling decision can look at smoothed
+# signals (EWMA, windowed max) without any list copying or pop(0).
+
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+# Fields of a cpu line in /proc/stat that count as idle time (idle, iowait)
+_IDLE_FIELDS = (3, 4)
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def read_proc_stat(path: str = "/proc/stat") -> tuple[np.ndarray, np.ndarray]:
+    """Return (busy, total) jiffies per core."""
+    busy = []
+    total = []
+    with open(path, "r") as f:
+        for line in f:
+            # skip the aggregated "cpu " line, keep cpu0, cpu1, ...
+            if not line.startswith("cpu") or line.startswith("cpu "):
+                continue
+            values = [int(v) for v in line.split()[1:]]
+            line_total = sum(values[:8])
+            idle = sum(values[i] for i in _IDLE_FIELDS)
+            busy.append(line_total - idle)
+            total.append(line_total)
+    return np.array(busy, dtype=np.int64), np.array(total, dtype=np.int64)
+
+
+def read_process_ticks(pid: int) -> int:
+    """Return utime + stime of a process (all threads) in clock ticks."""
+    with open(f"/proc/{pid}/stat", "r") as f:
+        # the command name may contain spaces, the fields start after the last ")"
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of the full line
+    return int(fields[11]) + int(fields[12])
+
+
+class CpuSampler:
+    def __init__(
+        self,
+        pid: Optional[int] = None,
+        period: float = 0.1,
+        capacity: int = 100,
+        alpha: float = 0.3,
+    ):
+        self.period = period
+        self.alpha = alpha
+        self._pid = int(pid) if pid is not None else None
+
+        busy, total = read_proc_stat()
+        self.num_cores = len(busy)
+        self._last_busy = busy
+        self._last_total = total
+        self._last_proc_ticks = self._read_memcached_ticks()
+        self._last_time = time.monotonic()
+
+        # ring buffers: per-core usage in percent and memcached usage in percent of one core
+        self._cores = np.zeros((capacity, self.num_cores), dtype=np.float32)
+        self._memcached = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        self._count = 0
+
+        self.ewma = np.zeros(self.num_cores, dtype=np.float32)
+        self.memcached_ewma = 0.0
+
+    def _read_memcached_ticks(self) -> Optional[int]:
+        if self._pid is None:
+            return None
+        try:
+            return read_process_ticks(self._pid)
+        except (FileNotFoundError, ProcessLookupError):
+            return None
+
+    def sample(self) -> np.ndarray:
+        """Take one sample, store it in the ring buffer and return per-core usage."""
+        busy, total = read_proc_stat()
+        proc_ticks = self._read_memcached_ticks()
+        now = time.monotonic()
+
+        delta_total = np.maximum(total - self._last_total, 1)
+        usage = (100.0 * (busy - self._last_busy) / delta_total).astype(np.float32)
+
+        memcached = 0.0
+        if proc_ticks is not None and self._last_proc_ticks is not None:
+            elapsed = max(now - self._last_time, 1e-6)
+            memcached = 100.0 * (proc_ticks - self._last_proc_ticks) / _CLOCK_TICKS / elapsed
+
+        self._last_busy = busy
+        self._last_total = total
+        self._last_proc_ticks = proc_ticks
+        self._last_time = now
+
+        index = self._count % self._capacity
+        self._cores[index] = usage
+        self._memcached[index] = memcached
+        if self._count == 0:
+            self.ewma[:] = usage
+            self.memcached_ewma = memcached
+        else:
+            self.ewma += self.alpha * (usage - self.ewma)
+            self.memcached_ewma += self.alpha * (memcached - self.memcached_ewma)
+        self._count += 1
+        return usage
+
+    def _last(self, ring: np.ndarray, n: int) -> np.ndarray:
+        n = min(n, self._count, self._capacity)
+        end = self._count % self._capacity
+        indices = (np.arange(end - n, end)) % self._capacity
+        return ring[indices]
+
+    def samples_for(self, seconds: float) -> int:
+        """Number of samples covering the given time window."""
+        return max(1, int(round(seconds / self.period)))
+
+    def latest(self) -> np.ndarray:
+        return self._last(self._cores, 1)[-1]
+
+    def window(self, seconds: float) -> np.ndarray:
+        """Per-core samples of the last seconds, oldest first."""
+        return self._last(self._cores, self.samples_for(seconds))
+
+    def window_max(self, seconds: float) -> np.ndarray:
+        """Per-core maximum usage over the last seconds."""
+        return self.window(seconds).max(axis=0)
+
+    def memcached_window(self, seconds: float) -> np.ndarray:
+        return self._last(self._memcached, self.samples_for(seconds))
+
+    def is_filled(self, seconds: float) -> bool:
+        return self._count >= self.samples_for(seconds)
@@ -0,0 +1,228 @@
+# Binary event log, written next to the text log of SchedulerLogger.
+# Every event is a fixed-size record (monotonic ns timestamp, event, job, threads,
+# core bitmask), so a full run can be mapped into a NumPy structured array without
+# parsing any strings. The file starts with a header that holds the wall clock and
+# monotonic clock at the time it was opened, which is enough to turn the monotonic
+# timestamps back into the wall clock times of the text format.
+# Custom events carry free text, it goes into <file>.comments (one line per event)
+# and the record stores the line number.
+#
+#   python event_log.py log20250506_153000.bin            # print the text format
+#   python event_log.py log20250506_153000.bin out.txt    # write it to a file
+
+import enum
+import os
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from typing import Iterable, Optional
+
+import numpy as np
+
+from scheduler_logger import Job, LOG_STRING
+
+MAGIC = b"SCHEDEVT"
+VERSION = 1
+# magic, version, wall clock ns, monotonic ns
+HEADER = struct.Struct("<8sIqq")
+HEADER_SIZE = HEADER.size
+# monotonic ns, event, job, threads, cores bitmask, argument (comment line)
+RECORD = struct.Struct("<qBBHII")
+RECORD_DTYPE = np.dtype(
+    [
+        ("mono_ns", "<i8"),
+        ("event", "u1"),
+        ("job", "u1"),
+        ("threads", "<u2"),
+        ("cores", "<u4"),
+        ("arg", "<u4"),
+    ]
+)
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+JOBS = list(Job)
+JOB_INDEX = {job: i for i, job in enumerate(JOBS)}
+
+
+class Event(enum.IntEnum):
+    START = 0
+    END = 1
+    UPDATE_CORES = 2
+    PAUSE = 3
+    UNPAUSE = 4
+    CUSTOM = 5
+
+
+# event names of the text format
+EVENT_NAMES = {
+    Event.START: "start",
+    Event.END: "end",
+    Event.UPDATE_CORES: "update_cores",
+    Event.PAUSE: "pause",
+    Event.UNPAUSE: "unpause",
+    Event.CUSTOM: "custom",
+}
+EVENTS_BY_NAME = {name: event for event, name in EVENT_NAMES.items()}
+
+
+def cores_to_mask(cores: Iterable) -> int:
+    mask = 0
+    for core in cores:
+        mask |= 1 << int(core)
+    return mask
+
+
+def mask_to_cores(mask: int) -> list[int]:
+    return [core for core in range(32) if mask >> core & 1]
+
+
+class EventLogWriter:
+    """Buffers packed records in memory, a background thread appends them to the file."""
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_buffer: int = 1 << 16):
+        self.path = path
+        self._file = open(path, "wb")
+        self._comments = None
+        self._comment_count = 0
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time_ns(), time.monotonic_ns()))
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="event-log", daemon=True
+        )
+        self._thread.start()
+
+    def append(
+        self,
+        event: Event,
+        job: Job,
+        cores: Iterable = (),
+        threads: int = 0,
+        comment: Optional[str] = None,
+    ):
+        mono_ns = time.monotonic_ns()
+        with self._lock:
+            if self._closed:
+                return
+            arg = 0
+            if comment is not None:
+                if self._comments is None:
+                    self._comments = open(self.path + ".comments", "w")
+                self._comments.write(urllib.parse.quote_plus(comment) + "\n")
+                arg = self._comment_count
+                self._comment_count += 1
+            self._buffer += RECORD.pack(
+                mono_ns, event, JOB_INDEX[job], threads, cores_to_mask(cores), arg
+            )
+            full = len(self._buffer) >= self._max_buffer
+        if full:
+            self._wakeup.set()
+
+    def _flush(self):
+        with self._lock:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        if data:
+            self._file.write(data)
+            self._file.flush()
+        if self._comments is not None:
+            self._comments.flush()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self._flush()
+        self._file.close()
+        if self._comments is not None:
+            self._comments.close()
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, version, wall_ns, mono_ns = HEADER.unpack(f.read(HEADER_SIZE))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a scheduler event log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported event log version {version} in {path}")
+    return {"version": version, "wall_ns": wall_ns, "mono_ns": mono_ns}
+
+
+def read_events(path: str) -> tuple[dict, np.ndarray]:
+    """Map the records of an event log into a structured array (no copy)."""
+    header = read_header(path)
+    size = os.path.getsize(path) - HEADER_SIZE
+    # a record that was being flushed when the scheduler died is ignored
+    count = size // RECORD.size
+    if count == 0:
+        return header, np.zeros(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+    return header, records
+
+
+def wall_time(header: dict, records: np.ndarray) -> np.ndarray:
+    """Wall clock time in seconds of every record."""
+    return (header["wall_ns"] + (records["mono_ns"] - header["mono_ns"])) / 1e9
+
+
+def read_comments(path: str) -> list[str]:
+    if not os.path.exists(path + ".comments"):
+        return []
+    with open(path + ".comments", "r") as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def to_text(path: str) -> Iterable[str]:
+    """Yield the lines of the SchedulerLogger text format for an event log."""
+    header, records = read_events(path)
+    comments = read_comments(path)
+    times = wall_time(header, records)
+    for record, timestamp in zip(records, times):
+        event = Event(int(record["event"]))
+        job = JOBS[int(record["job"])]
+        args = ""
+        if event == Event.START and job != Job.SCHEDULER:
+            cores = ",".join(str(c) for c in mask_to_cores(int(record["cores"])))
+            args = f"[{cores}] {int(record['threads'])}"
+        elif event == Event.UPDATE_CORES:
+            cores = ",".join(str(c) for c in mask_to_cores(int(record["cores"])))
+            args = f"[{cores}]"
+        elif event == Event.CUSTOM and int(record["arg"]) < len(comments):
+            args = comments[int(record["arg"])]
+        yield LOG_STRING.format(
+            timestamp=datetime.fromtimestamp(float(timestamp)).isoformat(),
+            event=EVENT_NAMES[event],
+            job_name=job.value,
+            args=args,
+        ).strip()
+
+
+def main(input_path: str, output_path: Optional[str] = None):
+    lines = to_text(input_path)
+    if output_path is None:
+        for line in lines:
+            print(line)
+        return
+    with open(output_path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,200 @@
+# Demand forecasting for memcached core scaling.
+# The control loop only reacted after core 0 was already busy. A forecaster is
+# fed with the same samples and predicts the usage a few samples ahead, so the
+# second core can be given to memcached before the load actually arrives.
+#
+# The online predictor is HoltForecaster with FORECAST_ALPHA / FORECAST_BETA on the
+# core 0 usage in percent, predicting FORECAST_HORIZON seconds ahead; with -e main.py
+# scales up when the prediction exceeds CPU_LOW while memcached has 1 core. It is
+# off by default: on the recorded runs it is less accurate than the last sample and
+# does not catch a single scale-up the last sample misses (see replay below), and
+# the recordings are too coarse to show whether it helps at the online cadence.
+#
+# Run it as a script to replay recorded runs offline and score that predictor:
+#   python forecast.py replay ../part4_4_logs/7s_interval
+# The core 0 usage and the memcached cores are read from the "CPU usage" and
+# "Cores available for jobs" lines of scheduler_policy1_run*.log. Each predictor
+# is fed the recorded samples and predicts FORECAST_HORIZON ahead, the prediction is
+# compared to the usage interpolated at that time and the scale-up decision
+# (above CPU_LOW) to the one the actual usage implies. Only samples with memcached
+# on 1 core are scored, the forecast is not used otherwise. The recorded runs
+# logged a sample every ~2 s instead of every SAMPLE_PERIOD, so the replay steps
+# the predictor less often than online and predicts a fraction of a step ahead.
+
+import argparse
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+# Smoothing of the online predictor (main.py)
+FORECAST_ALPHA = 0.3
+FORECAST_BETA = 0.1
+# Seconds ahead for which the core 0 usage is forecast when memcached has 1 core
+FORECAST_HORIZON = 0.5
+# CPU usage in percent for when to assign more cores to memcached (used by main.py)
+CPU_LOW = 70
+
+_TIMESTAMP = re.compile(r"^\[(\d+)\]")
+_USAGE = re.compile(r"CPU usage: \[([^\]]*)\]")
+_AVAILABLE = re.compile(r"Cores available for jobs: \{([^}]*)\}")
+
+
+class Forecaster:
+    def update(self, value: float) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def predict(self, steps: float = 1) -> float:
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class LastValueForecaster(Forecaster):
+    """Baseline: the next value is the current one (what the reactive loop assumes)."""
+
+    def __init__(self):
+        self._last = 0.0
+
+    def update(self, value: float) -> None:
+        self._last = value
+
+    def predict(self, steps: float = 1) -> float:
+        return self._last
+
+
+class HoltForecaster(Forecaster):
+    """Double exponential smoothing (Holt's linear trend method)."""
+
+    def __init__(self, alpha: float = FORECAST_ALPHA, beta: float = FORECAST_BETA):
+        self.alpha = alpha
+        self.beta = beta
+        self.level: Optional[float] = None
+        self.trend = 0.0
+
+    def update(self, value: float) -> None:
+        if self.level is None:
+            self.level = value
+            return
+        last_level = self.level
+        self.level = self.alpha * value + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (self.level - last_level) + (1 - self.beta) * self.trend
+
+    def predict(self, steps: float = 1) -> float:
+        if self.level is None:
+            return 0.0
+        return self.level + steps * self.trend
+
+
+class LinearForecaster(Forecaster):
+    """Least squares line over the last window values, extrapolated."""
+
+    def __init__(self, window: int = 10):
+        self._values = np.zeros(window, dtype=np.float64)
+        self._window = window
+        self._count = 0
+
+    def update(self, value: float) -> None:
+        self._values[self._count % self._window] = value
+        self._count += 1
+
+    def predict(self, steps: float = 1) -> float:
+        n = min(self._count, self._window)
+        if n == 0:
+            return 0.0
+        if n == 1:
+            return float(self._values[0])
+        end = self._count % self._window
+        values = self._values[np.arange(end - n, end) % self._window]
+        x = np.arange(n, dtype=np.float64)
+        slope, intercept = np.polyfit(x, values, 1)
+        return float(intercept + slope * (n - 1 + steps))
+
+
+FORECASTERS = {
+    "last": LastValueForecaster,
+    "holt": HoltForecaster,
+    "linear": LinearForecaster,
+}
+
+
+def read_scheduler_usage(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (timestamp, core 0 usage in percent, memcached cores) of a scheduler log."""
+    timestamps = []
+    usage = []
+    cores = []
+    timestamp = None
+    with open(path, "r") as f:
+        for line in f:
+            match = _TIMESTAMP.match(line)
+            if match is not None:
+                timestamp = int(match.group(1))
+            match = _USAGE.search(line)
+            if match is not None:
+                timestamps.append(timestamp)
+                usage.append(float(match.group(1).split(",")[0]))
+                continue
+            match = _AVAILABLE.search(line)
+            if match is not None and len(cores) < len(usage):
+                # the jobs get the cores above the memcached ones
+                cores.append(min(int(core) for core in match.group(1).split(",")))
+    n = len(cores)
+    return np.array(timestamps[:n], dtype=np.float64), np.array(usage[:n]), np.array(cores)
+
+
+def replay(directory: str, threshold: float = CPU_LOW):
+    runs = [1, 2, 3]
+    for run in runs:
+        log_file = os.path.join(directory, f"scheduler_policy1_run{run}.log")
+        if not os.path.exists(log_file):
+            print(f"Run {run}: {log_file} not found, skipping")
+            continue
+
+        timestamps, usage, cores = read_scheduler_usage(log_file)
+        if len(usage) < 3:
+            print(f"Run {run}: not enough samples, skipping")
+            continue
+        interval = float(np.median(np.diff(timestamps)))
+        steps = FORECAST_HORIZON / interval
+        # the usage FORECAST_HORIZON after every sample
+        actual = np.interp(timestamps + FORECAST_HORIZON, timestamps, usage)
+        # memcached on 1 core, and the horizon is within the run
+        scored = (cores == 1) & (timestamps + FORECAST_HORIZON <= timestamps[-1])
+        needed = actual[scored] > threshold
+
+        print(
+            f"\nRun {run}: {len(usage)} samples every {interval:.1f} s, {scored.sum()} on 1 core, "
+            f"usage above {threshold:.0f}% after {FORECAST_HORIZON} s in {needed.mean():.1%}"
+        )
+        for name, forecaster_class in FORECASTERS.items():
+            forecaster = forecaster_class()
+            predictions = np.zeros(len(usage))
+            for i, value in enumerate(usage):
+                forecaster.update(value)
+                predictions[i] = forecaster.predict(steps)
+            error = np.abs(predictions[scored] - actual[scored])
+            predicted_needed = predictions[scored] > threshold
+            accuracy = np.mean(predicted_needed == needed)
+            missed = np.mean(~predicted_needed & needed)
+            early = np.mean(predicted_needed & ~needed)
+            print(
+                f"  {name:<6} MAE {error.mean():5.1f} pp  decision accuracy {accuracy:6.1%}  "
+                f"missed scale-ups {missed:6.1%}  needless scale-ups {early:6.1%}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the forecasters on recorded runs")
+    parser.add_argument("mode", choices=["replay"])
+    parser.add_argument("directory", help="Directory with scheduler_policy1_run*.log")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=CPU_LOW,
+        help="Core 0 usage in percent above which memcached needs 2 cores",
+    )
+    args = parser.parse_args()
+    replay(args.directory, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
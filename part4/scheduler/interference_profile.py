@@ -0,0 +1,100 @@
+# Interference profile of the batch jobs, built from the part2 measurements
+# (part2/task1/parsec_results/all_results.csv: every workload under every ibench
+# interference type).
+# For each workload we keep the median slowdown per interference type relative to
+# the run without interference, the same normalization as vis_logs_interference.py.
+# From that table the aggressiveness of a job is derived: its mean slowdown under
+# llc and membw interference.
+# This is the job's own slowdown, not the pressure it puts on others, which was
+# never measured: part2 ran every job next to ibench, not ibench or memcached next
+# to the job. It stands in for aggressiveness because a job that slows down under
+# llc and membw pressure keeps its working set in the llc and streams from memory,
+# so it takes the same resources from memcached, and llc and membw are exactly the
+# resources memcached's p95 is most sensitive to (part1). It ranks the jobs, the
+# numbers are not a predicted memcached slowdown.
+# The scheduler uses it to co-locate the least aggressive job next to memcached
+# and to pause the most aggressive job first when memcached scales up.
+
+import csv
+import logging
+import os
+import statistics
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# install_scheduler.yaml copies the part2 results next to the scheduler on the
+# memcached node, in the repository they are read from part2/task1/parsec_results
+DEFAULT_PROFILE_CSV = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "measurements", "all_results.csv"
+)
+if not os.path.exists(DEFAULT_PROFILE_CSV):
+    DEFAULT_PROFILE_CSV = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "..",
+        "part2",
+        "task1",
+        "parsec_results",
+        "all_results.csv",
+    )
+MEMORY_INTERFERENCE = ("llc", "membw")
+
+
+class InterferenceProfile:
+    def __init__(self, slowdowns: Dict[str, Dict[str, float]]):
+        # workload -> interference type -> median normalized execution time
+        self.slowdowns = slowdowns
+        # own slowdown under memory interference, see the header for why
+        self.aggressiveness = {
+            workload: statistics.mean(row[k] for k in MEMORY_INTERFERENCE if k in row)
+            for workload, row in slowdowns.items()
+        }
+
+    @staticmethod
+    def from_csv(path: str) -> "InterferenceProfile":
+        times: Dict[str, Dict[str, List[float]]] = {}
+        with open(path, "r") as f:
+            for row in csv.DictReader(f):
+                times.setdefault(row["workload"], {}).setdefault(
+                    row["interference"], []
+                ).append(float(row["execution_time"]))
+
+        slowdowns = {}
+        for workload, by_type in times.items():
+            if "none" not in by_type:
+                continue
+            baseline = statistics.median(by_type["none"])
+            slowdowns[workload] = {
+                interference: statistics.median(t / baseline for t in values)
+                for interference, values in by_type.items()
+            }
+        return InterferenceProfile(slowdowns)
+
+    def order(self, workloads: Iterable[str]) -> List[str]:
+        """Least aggressive first, unknown workloads keep their order at the end."""
+        workloads = list(workloads)
+        return sorted(
+            workloads,
+            key=lambda w: (w not in self.aggressiveness, self.aggressiveness.get(w, 0.0)),
+        )
+
+    def job_key(self, job_name: str) -> float:
+        # unknown workloads are treated as the most aggressive
+        return self.aggressiveness.get(job_name, float("inf"))
+
+    def log_table(self):
+        for workload in self.order(self.slowdowns):
+            logger.info(
+                f"Profile {workload}: aggressiveness {self.aggressiveness[workload]:.2f}"
+            )
+
+
+@lru_cache(maxsize=None)
+def load_profile(path: str = DEFAULT_PROFILE_CSV) -> Optional[InterferenceProfile]:
+    """Load the profile once per path, None if the measurements are not available."""
+    if not os.path.exists(path):
+        logger.warning(f"Interference profile {path} not found, keeping the job order")
+        return None
+    return InterferenceProfile.from_csv(path)
@@ -1,6 +1,7 @@
 import __future__
 import enum
-from typing import Dict, Union, List
+import functools
+from typing import TYPE_CHECKING, Dict, Union, List, Optional
 from docker.client import DockerClient
 import docker
 import logging
@@ -9,6 +10,11 @@ import sys
 import time
 import atexit
 from scheduler_logger import SchedulerLogger, Job as JobEnum
+from completion_tracker import CompletionTracker, ContainerTail, EndState
+from cgroup_backend import CgroupBackend, DockerBackend
+
+if TYPE_CHECKING:
+    from warm_pool import WarmPool
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +23,12 @@ Job = Union[str, list[str], JobEnum]
 JobInfo = Dict[str, Job]
 
 
+@functools.lru_cache(maxsize=None)
+def default_docker_client() -> DockerClient:
+    # created lazily so importing this module does not need a Docker daemon
+    return docker.from_env()
+
+
 class JobStatus(enum.Enum):
     PENDING = "pending"
     RUNNING = "running"
@@ -66,30 +78,55 @@ class JobInstance:
         threads: int,
         schedulerLogger: SchedulerLogger,
         job: JobEnum,
-        docker_client: DockerClient = docker.from_env(),
+        docker_client: Optional[DockerClient] = None,
+        warm_pool: Optional["WarmPool"] = None,
+        backend: Optional[Union[DockerBackend, CgroupBackend]] = None,
     ):
         self._jobName = jobName
         self._job = job
         self._image = image
         self._command = command
         self._container = None
+        self._tail: Optional[ContainerTail] = None
         self._status = JobStatus.PENDING
-        self._docker_client = docker_client
+        self._docker_client = (
+            docker_client if docker_client is not None else default_docker_client()
+        )
         self._error_count = 0
         self._threads = threads
+        self._cores: list[int] = []
+        # cpu.max quota in cpus, None when the job is not throttled
+        self._quota: Optional[float] = None
+        # perf counter rates, filled in by perf_counters.PerfMonitor when enabled
+        self.counters: Dict[str, float] = {}
         self._start_time = None
         self._end_time = None
         self._schedulerLogger = schedulerLogger
+        self._warm_pool = warm_pool
+        # cpuset and pause operations, see cgroup_backend.py
+        self._backend = backend if backend is not None else DockerBackend()
         JobManager().register_job(self)
+        if warm_pool is not None:
+            warm_pool.register(self)
 
     def _handle_interrupt(self, signum, frame):
         logger.info(f"Received interrupt signal {signum} for job {self._jobName}")
         self.cleanup()
         sys.exit(0)
 
+    def _forget_tail(self):
+        if self._tail is not None:
+            CompletionTracker(self._docker_client).forget(self._tail)
+            self._tail = None
+
     def cleanup(self):
+        self._forget_tail()
+        if self._warm_pool is not None:
+            self._warm_pool.discard(self._jobName)
         if self._container is not None:
             try:
+                # a frozen container would not see the stop signal
+                self._backend.forget(self._container)
                 self._container.stop(timeout=5)
                 self._container.remove(force=True)
             except docker.errors.NotFound:
@@ -115,34 +152,85 @@ class JobInstance:
                 f"Job {self._jobName} failed {self._error_count} times, skipping"
             )
 
+        startup_begin = time.monotonic()
+        container = None
+        if self._warm_pool is not None:
+            # prepare_next must not create a second container while this one starts
+            container = self._warm_pool.claim(self._jobName)
+        try:
+            warm = container is not None
+            if warm:
+                # created without a cpuset, pin it before the process starts
+                container.update(cpuset_cpus=cores)
+                container.start()
+            else:
+                container = self._docker_client.containers.run(
+                    self._image,
+                    self._command_args(),
+                    cpuset_cpus=cores,
+                    name=f"{self._jobName}",
+                    detach=True,
+                )
+            if self._warm_pool is not None:
+                self._warm_pool.record_startup(
+                    self._jobName, time.monotonic() - startup_begin, warm
+                )
+                self._warm_pool.prepare_next()
+
+            logger.info(
+                f"Job {self._jobName} started with cores {cores} and {self._threads} threads"
+            )
+            self._schedulerLogger.job_start(self._job, cores.split(","), self._threads)
+            self._container = container
+            self._cores = [int(core) for core in cores.split(",")]
+            self._tail = CompletionTracker(self._docker_client).watch(container)
+            self._status = JobStatus.RUNNING
+            self._start_time = time.time()
+        finally:
+            if self._warm_pool is not None:
+                self._warm_pool.release(self._jobName)
+
+    def stop_job(self):
+        # undo start_job: remove the container, the job is pending again
+        if self._container is None:
+            raise ValueError(f"Job {self._jobName} is not running")
+        self._forget_tail()
+        try:
+            self._backend.forget(self._container)
+            self._container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        finally:
+            self._container = None
+        self._cores = []
+        self._quota = None
+        self._start_time = None
+        self._status = JobStatus.PENDING
+        logger.info(f"Job {self._jobName} stopped")
+        self._schedulerLogger.custom_event(self._job, "start undone")
+
+    def _command_args(self) -> list[str]:
         command = []
         for arg in self._command:
             try:
                 command.append(arg.format(threads=self._threads))
             except:
                 command.append(arg)
+        return command
 
-        container = self._docker_client.containers.run(
+    def create_container(self):
+        """Create the container of this job without starting it (see WarmPool)."""
+        return self._docker_client.containers.create(
             self._image,
-            command,
-            cpuset_cpus=cores,
+            self._command_args(),
             name=f"{self._jobName}",
-            detach=True,
         )
 
-        logger.info(
-            f"Job {self._jobName} started with cores {cores} and {self._threads} threads"
-        )
-        self._schedulerLogger.job_start(self._job, cores.split(","), self._threads)
-        self._container = container
-        self._status = JobStatus.RUNNING
-        self._start_time = time.time()
-
     def pause_job(self):
         # pause the job
         if self._container is None or self._status != JobStatus.RUNNING:
             raise ValueError(f"Job {self._jobName} is not running")
-        self._container.pause()
+        self._backend.pause(self._container)
         logger.info(f"Job {self._jobName} paused")
         self._schedulerLogger.job_pause(self._job)
         self._status = JobStatus.PAUSED
@@ -151,7 +239,7 @@ class JobInstance:
         # unpause the job
         if self._container is None or self._status != JobStatus.PAUSED:
             raise ValueError(f"Job {self._jobName} is not paused")
-        self._container.unpause()
+        self._backend.unpause(self._container)
         logger.info(f"Job {self._jobName} unpaused")
         self._status = JobStatus.RUNNING
         self._schedulerLogger.job_unpause(self._job)
@@ -160,19 +248,40 @@ class JobInstance:
         # update the cpu affinity of the job
         if self._container is None:
             raise ValueError(f"Job {self._jobName} is not running")
-        self._container.update(cpuset_cpus=cores)
+        self._backend.update_cpus(self._container, cores)
+        self._cores = [int(core) for core in cores.split(",")]
         logger.info(f"Job {self._jobName} updated to cores {cores}")
         self._schedulerLogger.update_cores(self._job, cores.split(","))
 
+    def throttle_job(self, cpus: Optional[float]):
+        # limit the cpu time of the job instead of pausing it, None removes the limit
+        if self._container is None:
+            raise ValueError(f"Job {self._jobName} is not running")
+        self._backend.set_quota(self._container, cpus)
+        self._quota = cpus
+        if cpus is None:
+            logger.info(f"Job {self._jobName} unthrottled")
+        else:
+            logger.info(f"Job {self._jobName} throttled to {cpus} cpus")
+        self._schedulerLogger.custom_event(
+            self._job, f"cpu.max {cpus if cpus is not None else 'max'}"
+        )
+
     def check_job_completed(self):
         # check if the job is completed
         if self._container is None:
             raise ValueError(f"Job {self._jobName} is not running")
 
-        container_logs = self._container.logs().decode("utf-8")
+        # The tail follows the log stream and the Docker events in the background,
+        # so this is a constant-time lookup instead of a full log scan
+        done = self._tail.done
+        error = self._tail.error
 
-        done = "[PARSEC] Done." in container_logs
-        error = "Error" in container_logs
+        if self._tail.state != EndState.RUNNING and not done and not error:
+            # The die event can overtake the last log chunk, look at the end once
+            last_lines = self._container.logs(tail=20).decode("utf-8")
+            done = "[PARSEC] Done." in last_lines
+            error = "Error" in last_lines or not done
 
         if done and not error:
             self._status = JobStatus.COMPLETED
@@ -184,7 +293,9 @@ class JobInstance:
         elif error:
             self._status = JobStatus.ERROR
             self._error_count += 1
-            self._container.remove()
+            self._forget_tail()
+            self._backend.forget(self._container)
+            self._container.remove(force=True)
             self._container = None
         elif self._container is None:
             self._status = JobStatus.PENDING
@@ -0,0 +1,80 @@
+# Live p95 latency reported by the load generator.
+# run_load.sh on client-measure pipes the mcperf output through mcperf_forward.py,
+# which sends every line over TCP to the scheduler host. LatencyFeedback accepts
+# those connections on a background thread and keeps the p95 of the latest
+# mcperf interval, so the control loop can scale memcached on the latency we are
+# graded on and not only on its CPU usage.
+#
+# Without a cluster, a recorded mcperf log can be replayed into a local scheduler:
+#   python3 ../ansible/mcperf_forward.py localhost:5555 --replay 2 < mcperf.log > /dev/null
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Optional
+
+# mcperf_log.py is in the repository root, install_scheduler.yaml copies it next to
+# the scheduler on the memcached node
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from mcperf_log import STAT_COLUMNS, iter_mcperf  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5555
+P95_INDEX = STAT_COLUMNS.index("p95")
+
+
+class LatencyFeedback:
+    def __init__(self, port: int = DEFAULT_PORT, host: str = "0.0.0.0"):
+        self.port = port
+        self.host = host
+        self.reports = 0
+        self._p95: Optional[float] = None
+        self._received = 0.0
+        self._lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._closed = False
+
+    def start(self):
+        self._server = socket.create_server((self.host, self.port))
+        threading.Thread(target=self._accept_loop, name="latency-feedback", daemon=True).start()
+        logger.info(f"Waiting for mcperf latency reports on port {self.port}")
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                connection, address = self._server.accept()
+            except OSError:
+                return
+            logger.info(f"Latency reports connected from {address[0]}")
+            threading.Thread(
+                target=self._read_reports,
+                args=(connection,),
+                name=f"latency-{address[0]}",
+                daemon=True,
+            ).start()
+
+    def _read_reports(self, connection: socket.socket):
+        with connection, connection.makefile("r", encoding="utf-8", errors="replace") as f:
+            for row in iter_mcperf(f):
+                with self._lock:
+                    self._p95 = row.stats[P95_INDEX]
+                    self._received = time.monotonic()
+                    self.reports += 1
+        if not self._closed:
+            logger.warning("Latency report connection closed")
+
+    def p95(self, max_age: float) -> Optional[float]:
+        """The latest p95 in us, None if there is none from the last max_age seconds."""
+        with self._lock:
+            if self._p95 is None or time.monotonic() - self._received > max_age:
+                return None
+            return self._p95
+
+    def close(self):
+        self._closed = True
+        if self._server is not None:
+            self._server.close()
@@ -1,13 +1,27 @@
 #! /usr/bin/env python3
 
+import asyncio
+import functools
+import os
 import subprocess
-import psutil
 import time
-from typing import Dict
 from policy_1_2_cores import Policy1And2Cores
 from policy_2_3_cores import Policy2And3Cores
-from job import JobInfo
+from policy_bin_packing import PolicyBinPacking, profile_priority
+from interference_profile import InterferenceProfile, load_profile, DEFAULT_PROFILE_CSV
+from admission import AdmissionControl, load_memory_pressure
+from parsec_jobs import jobs
+from job import JobInstance, JobManager, default_docker_client
+from warm_pool import WarmPool
+from cgroup_backend import CgroupBackend
+from perf_counters import PerfMonitor
 from policy import Policy
+from completion_tracker import CompletionTracker
+from runtime import SchedulerRuntime, SAMPLE_TIMEOUT
+from affinity import AffinityManager
+from cpu_sampler import CpuSampler
+from forecast import CPU_LOW, FORECAST_ALPHA, FORECAST_BETA, FORECAST_HORIZON, HoltForecaster
+from latency_feedback import LatencyFeedback
 import logging
 import sys
 from colorama import init, Fore, Style
@@ -32,94 +46,29 @@ class ColoredFormatter(logging.Formatter):
 
 
 logger = logging.getLogger(__name__)
-# CPU usage in percent for when to assign more cores to memcached
-CPU_LOW = 70
 # CPU usage in percent for when to assign less cores to memcached
 CPU_HIGH = 100
-# Number of consecutive samples below CPU_HIGH for which to switch back to 1 core
+# Seconds of usage below CPU_HIGH after which to switch back to 1 core
 CPU_HIGH_THRESHOLD = 2
-
-jobs: Dict[str, JobInfo] = {
-    "blackscholes": {
-        "name": "blackscholes",
-        "logger_job": JobEnum.BLACKSCHOLES,
-        "image": "anakli/cca:parsec_blackscholes",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p blackscholes -i native -n {threads}",
-        ],
-        "paralellizability": 1,
-    },
-    "canneal": {
-        "name": "canneal",
-        "logger_job": JobEnum.CANNEAL,
-        "image": "anakli/cca:parsec_canneal",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p canneal -i native -n {threads}",
-        ],
-        "paralellizability": 1,
-    },
-    "dedup": {
-        "name": "dedup",
-        "logger_job": JobEnum.DEDUP,
-        "image": "anakli/cca:parsec_dedup",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p dedup -i native -n {threads}",
-        ],
-        "paralellizability": 1,
-    },
-    "ferret": {
-        "name": "ferret",
-        "logger_job": JobEnum.FERRET,
-        "image": "anakli/cca:parsec_ferret",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p ferret -i native -n {threads}",
-        ],
-        "paralellizability": 2,
-    },
-    "freqmine": {
-        "name": "freqmine",
-        "logger_job": JobEnum.FREQMINE,
-        "image": "anakli/cca:parsec_freqmine",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p freqmine -i native -n {threads}",
-        ],
-        "paralellizability": 2,
-    },
-    "radix": {
-        "name": "radix",
-        "logger_job": JobEnum.RADIX,
-        "image": "anakli/cca:splash2x_radix",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S splash2x -p radix -i native -n {threads}",
-        ],
-        "paralellizability": 2,
-    },
-    "vips": {
-        "name": "vips",
-        "logger_job": JobEnum.VIPS,
-        "image": "anakli/cca:parsec_vips",
-        "command": [
-            "/bin/sh",
-            "-c",
-            "./run -a run -S parsec -p vips -i native -n {threads}",
-        ],
-        "paralellizability": 2,
-    },
-}
-
-schedulerLogger = SchedulerLogger()
+# Seconds between two cpu samples (and control decisions)
+SAMPLE_PERIOD = 0.1
+# Seconds between two periodic policy runs and usage log lines
+SCHEDULE_INTERVAL = 1
+# Reported p95 latency in us above which memcached gets 2 cores whatever its CPU usage
+LATENCY_HIGH = 800
+# Reported p95 latency in us that has to be undercut before going back to 1 core
+LATENCY_LOW = 500
+# Seconds after which a latency report is too old to be used (mcperf reports every 2s)
+LATENCY_MAX_AGE = 5
+
+
+# the binary event log is named after the -l logfile (scheduler_policy1_run1.bin),
+# that is the name part4_2&3.py copies back and the analysis scripts look for
+schedulerLogger = SchedulerLogger(
+    events_path=os.path.splitext(sys.argv[sys.argv.index("-l") + 1])[0] + ".bin"
+    if "-l" in sys.argv
+    else None
+)
 
 
 def get_memcached_pid():
@@ -127,18 +76,6 @@ def get_memcached_pid():
     return subprocess.check_output(["pgrep", "-f", "memcached"]).decode("utf-8").strip()
 
 
-def set_memcached_cpu_affinity(pid: int, cores: str):
-    # set the cpu affinity of the memcached process
-    # taskset -a -p <pid> -c <cores>
-    logger.info(
-        subprocess.run(
-            ["sudo", "taskset", "-a", "-cp", cores, str(pid)],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-    )
-
-
 # create two policies.
 # 1) One has 2 and 3 core jobs. It maintains 2 queues to run 2 and 3 core jobs.
 # when three cores are available it will start/resume the first job in the 3 core queue and pause the 2 core job currently running
@@ -151,7 +88,15 @@ def set_memcached_cpu_affinity(pid: int, cores: str):
 # If no more 1 core jobs are left, it will run the 2 core jobs on all available cores.
 
 
-def main(policy: Policy, logfile: str | None):
+def main(
+    policy: Policy,
+    logfile: str | None,
+    profile: InterferenceProfile | None = None,
+    warm_pool: WarmPool | None = None,
+    feedback: LatencyFeedback | None = None,
+    perf: PerfMonitor | None = None,
+    forecast: bool = False,
+):
     # log to a file (scheduler_04052025_17h36.log) with epoch time
     formatter = ColoredFormatter(
         f"[%(created)d] [policy: {policy.policy_name}] [%(levelname)s] [%(name)s] %(message)s"
@@ -174,16 +119,74 @@ def main(policy: Policy, logfile: str | None):
     logger.info(f"CPU_LOW: {CPU_LOW}")
     logger.info(f"CPU_HIGH: {CPU_HIGH}")
     logger.info(f"CPU_HIGH_THRESHOLD: {CPU_HIGH_THRESHOLD}")
+    logger.info(f"SAMPLE_PERIOD: {SAMPLE_PERIOD}")
+    if forecast:
+        logger.info(f"FORECAST_HORIZON: {FORECAST_HORIZON}")
+    if feedback is not None:
+        logger.info(f"LATENCY_HIGH: {LATENCY_HIGH}")
+        logger.info(f"LATENCY_LOW: {LATENCY_LOW}")
+
+    if profile is not None:
+        profile.log_table()
+    if isinstance(policy, PolicyBinPacking) and policy.admission is not None:
+        policy.admission.pressure.log_table()
+
+    asyncio.run(control_loop(policy, profile, warm_pool, feedback, perf, forecast))
+
+
+async def watch_completions(
+    runtime: SchedulerRuntime,
+    completion_tracker: CompletionTracker,
+    state: dict,
+):
+    # Reschedule as soon as a job finishes instead of waiting for the next sample
+    waiting = None
+    while not state["done"]:
+        if waiting is None:
+            waiting = runtime.submit_blocking(completion_tracker.wait_for_change, 0.5)
+        try:
+            changed = await asyncio.wait_for(asyncio.shield(waiting), SAMPLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # a slow Docker call must not end the watcher, the periodic run still
+            # picks up completions in the meantime. The call still holds a worker,
+            # keep waiting for it instead of submitting another one
+            logger.warning("Waiting for job completions timed out")
+            continue
+        waiting = None
+        if changed and not state["done"]:
+            runtime.kick_schedule(state["available_cores"])
+
+
+async def control_loop(
+    policy: Policy,
+    profile: InterferenceProfile | None,
+    warm_pool: WarmPool | None = None,
+    feedback: LatencyFeedback | None = None,
+    perf: PerfMonitor | None = None,
+    forecast: bool = False,
+):
+    runtime = SchedulerRuntime(policy)
+
+    if feedback is not None:
+        feedback.start()
+
+    if warm_pool is not None:
+        # pull in the background while memcached is set up
+        warm_pool.pull_all({job["image"] for job in jobs.values()})
 
     memcached_pid = get_memcached_pid()
     logger.info(f"Memcached PID: {memcached_pid}")
+    affinity = AffinityManager(memcached_pid, schedulerLogger)
     memcached_target_cores = 2
-    set_memcached_cpu_affinity(memcached_pid, "0,1")
+    await runtime.set_memcached_affinity(affinity, {0, 1})
     logger.info(f"Memcached CPU affinity set to 0,1")
 
     schedulerLogger.job_start(JobEnum.MEMCACHED, [0, 1], 2)
 
-    for job in jobs:
+    # Least aggressive jobs first, they end up next to memcached
+    job_order = profile.order(jobs) if profile is not None else list(jobs)
+
+    for job in job_order:
         if job == "radix":
             # radix cant run with 3 cores
             temp = jobs[job]
@@ -192,54 +195,140 @@ def main(policy: Policy, logfile: str | None):
         else:
             policy.add_job(jobs[job])
 
+    if warm_pool is not None:
+        warm_pool.prepare_next()
+
     logger.info(f"Starting scheduler with policy: {policy.policy_name}")
 
-    start_time = time.time()
+    completion_tracker = CompletionTracker(default_docker_client())
 
-    # store the last 10 cpu usage samples
-    cpu_usage_samples = []
+    start_time = time.time()
 
-    while True:
-        cpu_usage = psutil.cpu_percent(interval=1, percpu=True)
-        cpu_usage_samples.append(cpu_usage)
+    sampler = CpuSampler(memcached_pid, period=SAMPLE_PERIOD)
+    # the predictor that forecast.py replay scores on the recorded runs, on the
+    # recorded runs it does not beat the last sample so it is only used with -e
+    forecaster = HoltForecaster(alpha=FORECAST_ALPHA, beta=FORECAST_BETA) if forecast else None
+    horizon = sampler.samples_for(FORECAST_HORIZON)
+    available_cores = set(range(sampler.num_cores)) - {0, 1}
+    last_schedule = 0.0
 
-        if len(cpu_usage_samples) > 10:
-            cpu_usage_samples.pop(0)
+    state = {"done": False, "available_cores": available_cores}
+    completion_watcher = None
+    next_sample = time.monotonic()
 
-        logger.info(f"CPU usage: {cpu_usage}")
+    while True:
+        # Fixed-rate sampling, skip missed slots instead of bursting to catch up
+        next_sample = max(next_sample + SAMPLE_PERIOD, time.monotonic())
+        await asyncio.sleep(next_sample - time.monotonic())
+        cycle_start = time.monotonic()
+        # stop when the policy keeps failing instead of failing on every tick
+        runtime.raise_if_failed()
+        sampler.sample()
+        predicted = None
+        if forecaster is not None:
+            forecaster.update(float(sampler.latest()[0]))
+            predicted = forecaster.predict(horizon)
+        ahead = predicted is not None and predicted > CPU_LOW
+        # None without feedback or when the reports stopped, then only CPU counts
+        p95 = feedback.p95(LATENCY_MAX_AGE) if feedback is not None else None
 
         old_memcached_target_cores = memcached_target_cores
-
-        # Respond quickly to high CPU usage by checking current sample
-        if memcached_target_cores == 1 and cpu_usage[0] > CPU_LOW:
+        old_available_cores = available_cores
+
+        # Respond quickly to high CPU usage by checking the smoothed current usage,
+        # or scale up ahead of time when the trend says we get there soon
+        if memcached_target_cores == 1 and (
+            sampler.ewma[0] > CPU_LOW
+            or ahead
+            or (p95 is not None and p95 > LATENCY_HIGH)
+        ):
+            if sampler.ewma[0] <= CPU_LOW and ahead:
+                logger.info(f"Scaling up ahead of load, forecast {predicted:.1f}%")
+            elif sampler.ewma[0] <= CPU_LOW:
+                logger.info(f"Scaling up on latency, p95 {p95:.0f}us")
             memcached_target_cores = 2
-        # Respond slowly to low CPU usage by requiring multiple low samples
-        elif memcached_target_cores == 2 and all(
-            (sample[0] + sample[1]) < CPU_HIGH
-            for sample in cpu_usage_samples[-CPU_HIGH_THRESHOLD:]
+        # Respond slowly to low CPU usage by requiring a whole window of low samples,
+        # and stay at 2 cores while the reported latency is still high
+        elif (
+            memcached_target_cores == 2
+            and sampler.is_filled(CPU_HIGH_THRESHOLD)
+            and (p95 is None or p95 < LATENCY_LOW)
         ):
-            # Only scale down if we see consistently low usage across last 5 samples
-            memcached_target_cores = 1
+            window = sampler.window(CPU_HIGH_THRESHOLD)
+            if (window[:, 0] + window[:, 1]).max() < CPU_HIGH:
+                memcached_target_cores = 1
 
         memcached_cores = range(memcached_target_cores)
 
-        available_cores = set(range(len(cpu_usage))) - set(memcached_cores)
+        available_cores = set(range(sampler.num_cores)) - set(memcached_cores)
+        state["available_cores"] = available_cores
 
-        logger.info(f"Cores available for jobs: {available_cores}")
+        # what memcached leaves unused on its cores, for throttled batch jobs
+        policy.set_memcached_headroom(
+            memcached_target_cores - sampler.memcached_ewma / 100
+        )
 
-        policy.schedule(available_cores)
+        # Run the policy when the cores change, otherwise once per SCHEDULE_INTERVAL
+        reschedule = (
+            available_cores != old_available_cores
+            or cycle_start - last_schedule >= SCHEDULE_INTERVAL
+        )
+        if reschedule:
+            logger.info(
+                f"CPU usage: {[round(float(u), 1) for u in sampler.latest()]} "
+                f"(ewma: {[round(float(u), 1) for u in sampler.ewma]}, "
+                f"memcached: {sampler.memcached_ewma:.1f}"
+                + (f", p95: {p95:.0f}us)" if p95 is not None else ")")
+            )
+            logger.info(f"Cores available for jobs: {available_cores}")
 
+        # Memcached first: a running container start must not delay the scale-up
         if old_memcached_target_cores != memcached_target_cores:
-            set_memcached_cpu_affinity(
-                memcached_pid, ",".join(map(str, memcached_cores))
+            await runtime.set_memcached_affinity(affinity, set(memcached_cores))
+
+        if reschedule and perf is not None:
+            # fresh job.counters for the policy, reading them takes microseconds
+            try:
+                await runtime.run_blocking(
+                    perf.sample, list(JobManager()._jobs), timeout=SAMPLE_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Reading the perf counters timed out, skipping the sample")
+            except Exception as e:
+                # the counters are optional, they must not end the run
+                logger.error(f"Reading the perf counters failed, skipping the sample: {e!r}")
+
+        if reschedule:
+            runtime.kick_schedule(available_cores)
+            last_schedule = cycle_start
+
+        if completion_watcher is None:
+            completion_watcher = asyncio.create_task(
+                watch_completions(runtime, completion_tracker, state)
+            )
+
+        if reschedule:
+            logger.info(
+                f"Control cycle latency: {(time.monotonic() - cycle_start) * 1000:.1f} ms"
             )
 
         if policy.isCompleted:
-            set_memcached_cpu_affinity(memcached_pid, "0-3")
+            state["done"] = True
+            await runtime.wait_for_schedule()
+            await runtime.set_memcached_affinity(affinity, set(range(sampler.num_cores)))
             schedulerLogger.end()
             break
 
-        time.sleep(1)
+    await completion_watcher
+    runtime.shutdown()
+    if perf is not None:
+        perf.close()
+    if feedback is not None:
+        logger.info(f"Received {feedback.reports} latency reports")
+        feedback.close()
+    if warm_pool is not None:
+        warm_pool.log_summary()
+        warm_pool.shutdown()
 
     end_time = time.time()
     logger.info(f"Scheduler completed in {end_time - start_time} seconds")
@@ -247,17 +336,52 @@ def main(policy: Policy, logfile: str | None):
 
 if __name__ == "__main__":
 
+    # read the interference profile from command line with -i flag
+    if "-i" in sys.argv:
+        profile = load_profile(sys.argv[sys.argv.index("-i") + 1])
+    else:
+        profile = load_profile(DEFAULT_PROFILE_CSV)
+
+    # pull images and pre-create containers ahead of time
+    warm_pool = WarmPool(default_docker_client())
+
+    # write cpuset.cpus and cgroup.freeze directly instead of going through dockerd
+    # when the -c flag is given
+    backend = CgroupBackend() if "-c" in sys.argv else None
+    job_factory = functools.partial(JobInstance, warm_pool=warm_pool, backend=backend)
+
     # read policy from command line with -p flag
     policy = None
     if "-p" in sys.argv:
         if sys.argv[sys.argv.index("-p") + 1] == "1":
-            policy = Policy1And2Cores(schedulerLogger)
+            # -t throttles the 1 core job on the memcached core instead of pausing it
+            policy = Policy1And2Cores(
+                schedulerLogger, job_factory=job_factory, throttle="-t" in sys.argv
+            )
         elif sys.argv[sys.argv.index("-p") + 1] == "2":
             policy = Policy2And3Cores(schedulerLogger)
+        elif sys.argv[sys.argv.index("-p") + 1] == "3":
+            # -a: only one memory heavy job next to a loaded memcached
+            admission = None
+            pressure = load_memory_pressure(profile) if "-a" in sys.argv else None
+            if pressure is not None:
+                admission = AdmissionControl(pressure)
+            if profile is not None:
+                policy = PolicyBinPacking(
+                    schedulerLogger,
+                    priority=profile_priority(profile),
+                    job_factory=job_factory,
+                    admission=admission,
+                )
+            else:
+                policy = PolicyBinPacking(
+                    schedulerLogger, job_factory=job_factory, admission=admission
+                )
         else:
             raise ValueError(f"Invalid policy: {sys.argv[sys.argv.index('-p') + 1]}")
     else:
-        policy = Policy1And2Cores(schedulerLogger)
+        policy = Policy1And2Cores(schedulerLogger, job_factory=job_factory)
+    warm_pool.follow(policy.queued_jobs)
 
     # read logfile from command line with -l flag
     if "-l" in sys.argv:
@@ -265,4 +389,17 @@ if __name__ == "__main__":
     else:
         logfile = None
 
-    main(policy, logfile)
+    # listen for mcperf latency reports on the port given with the -f flag
+    feedback = None
+    if "-f" in sys.argv:
+        feedback = LatencyFeedback(int(sys.argv[sys.argv.index("-f") + 1]))
+
+    # count LLC misses, instructions and cycles of every job with the -m flag
+    perf = None
+    if "-m" in sys.argv:
+        perf = PerfMonitor(backend if backend is not None else CgroupBackend())
+
+    # scale memcached up when the Holt forecast of its usage crosses CPU_LOW with -e
+    forecast = "-e" in sys.argv
+
+    main(policy, logfile, profile, warm_pool, feedback, perf, forecast)
@@ -0,0 +1,86 @@
+# The PARSEC batch jobs run by the scheduler.
+# "paralellizability" is the number of cores a job is meant to run on.
+
+from typing import Dict
+from job import JobInfo
+from scheduler_logger import Job as JobEnum
+
+jobs: Dict[str, JobInfo] = {
+    "blackscholes": {
+        "name": "blackscholes",
+        "logger_job": JobEnum.BLACKSCHOLES,
+        "image": "anakli/cca:parsec_blackscholes",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p blackscholes -i native -n {threads}",
+        ],
+        "paralellizability": 1,
+    },
+    "canneal": {
+        "name": "canneal",
+        "logger_job": JobEnum.CANNEAL,
+        "image": "anakli/cca:parsec_canneal",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p canneal -i native -n {threads}",
+        ],
+        "paralellizability": 1,
+    },
+    "dedup": {
+        "name": "dedup",
+        "logger_job": JobEnum.DEDUP,
+        "image": "anakli/cca:parsec_dedup",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p dedup -i native -n {threads}",
+        ],
+        "paralellizability": 1,
+    },
+    "ferret": {
+        "name": "ferret",
+        "logger_job": JobEnum.FERRET,
+        "image": "anakli/cca:parsec_ferret",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p ferret -i native -n {threads}",
+        ],
+        "paralellizability": 2,
+    },
+    "freqmine": {
+        "name": "freqmine",
+        "logger_job": JobEnum.FREQMINE,
+        "image": "anakli/cca:parsec_freqmine",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p freqmine -i native -n {threads}",
+        ],
+        "paralellizability": 2,
+    },
+    "radix": {
+        "name": "radix",
+        "logger_job": JobEnum.RADIX,
+        "image": "anakli/cca:splash2x_radix",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S splash2x -p radix -i native -n {threads}",
+        ],
+        "paralellizability": 2,
+    },
+    "vips": {
+        "name": "vips",
+        "logger_job": JobEnum.VIPS,
+        "image": "anakli/cca:parsec_vips",
+        "command": [
+            "/bin/sh",
+            "-c",
+            "./run -a run -S parsec -p vips -i native -n {threads}",
+        ],
+        "paralellizability": 2,
+    },
+}
@@ -0,0 +1,305 @@
+# Hardware performance counters of the batch jobs.
+# Opens perf_event_open counters for the cgroup of every running container
+# (PERF_FLAG_PID_CGROUP, one counter per cpu) and turns them into per-second rates
+# that are attached to the JobInstance as job.counters, so a policy can see which
+# job pollutes the LLC / memory bandwidth and not only how much cpu it uses:
+#   instructions, cycles, llc_misses, ipc, llc_mpki (LLC misses per 1000 instructions)
+# The rates also go to the event log as custom events every PERF_LOG_INTERVAL.
+#
+# Everything degrades per event: the hardware events that open are kept, if any of
+# them is missing on the (virtual) PMU the software events task_clock and
+# context_switches are counted next to them, and if no counter can be opened at all
+# (no permission, no perf_event cgroup, unknown architecture) the jobs simply have
+# no counters. A process id can be used instead of a cgroup to test it on any
+# Linux box:
+#   python3 perf_counters.py <pid>
+#
+# This is collection only: the counters are in job.counters and the event log, no
+# policy bases a decision on them yet.
+
+import ctypes
+import errno
+import logging
+import os
+import platform
+import struct
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from job import JobStatus
+
+if TYPE_CHECKING:
+    from cgroup_backend import CgroupBackend
+    from job import JobInstance
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two perf custom events of a job in the event log
+PERF_LOG_INTERVAL = 5
+
+_SYSCALL_NUMBERS = {"x86_64": 298, "aarch64": 241}
+
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_SOFTWARE = 1
+PERF_COUNT_HW_CPU_CYCLES = 0
+PERF_COUNT_HW_INSTRUCTIONS = 1
+PERF_COUNT_HW_CACHE_MISSES = 3  # last level cache misses on most cpus
+PERF_COUNT_SW_TASK_CLOCK = 1
+PERF_COUNT_SW_CONTEXT_SWITCHES = 3
+
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1 << 0
+PERF_FORMAT_TOTAL_TIME_RUNNING = 1 << 1
+PERF_FLAG_PID_CGROUP = 1 << 2
+PERF_FLAG_FD_CLOEXEC = 1 << 3
+
+# bits of the flags field of perf_event_attr
+_ATTR_INHERIT = 1 << 1
+_ATTR_EXCLUDE_HV = 1 << 6
+
+HARDWARE_EVENTS = {
+    "instructions": (PERF_TYPE_HARDWARE, PERF_COUNT_HW_INSTRUCTIONS),
+    "cycles": (PERF_TYPE_HARDWARE, PERF_COUNT_HW_CPU_CYCLES),
+    "llc_misses": (PERF_TYPE_HARDWARE, PERF_COUNT_HW_CACHE_MISSES),
+}
+SOFTWARE_EVENTS = {
+    "task_clock": (PERF_TYPE_SOFTWARE, PERF_COUNT_SW_TASK_CLOCK),
+    "context_switches": (PERF_TYPE_SOFTWARE, PERF_COUNT_SW_CONTEXT_SWITCHES),
+}
+
+
+class PerfEventAttr(ctypes.Structure):
+    # the leading fields of struct perf_event_attr, padded to PERF_ATTR_SIZE_VER7
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("config", ctypes.c_uint64),
+        ("sample_period", ctypes.c_uint64),
+        ("sample_type", ctypes.c_uint64),
+        ("read_format", ctypes.c_uint64),
+        ("flags", ctypes.c_uint64),
+        ("_rest", ctypes.c_uint8 * 88),
+    ]
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.syscall.restype = ctypes.c_long
+
+
+def perf_event_open(
+    event_type: int, config: int, pid: int, cpu: int, flags: int = 0, inherit: bool = False
+) -> int:
+    """Open one counting (not sampling) perf event and return its fd."""
+    number = _SYSCALL_NUMBERS.get(platform.machine())
+    if number is None:
+        raise OSError(errno.ENOSYS, f"perf_event_open unknown on {platform.machine()}")
+    attr = PerfEventAttr()
+    attr.type = event_type
+    attr.size = ctypes.sizeof(PerfEventAttr)
+    attr.config = config
+    attr.read_format = PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING
+    attr.flags = _ATTR_EXCLUDE_HV | (_ATTR_INHERIT if inherit else 0)
+    fd = _libc.syscall(
+        number,
+        ctypes.byref(attr),
+        ctypes.c_int(pid),
+        ctypes.c_int(cpu),
+        ctypes.c_int(-1),
+        ctypes.c_ulong(flags | PERF_FLAG_FD_CLOEXEC),
+    )
+    if fd < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    return fd
+
+
+def read_counter(fd: int) -> float:
+    """Counter value, scaled up for the time the counter was multiplexed out."""
+    value, enabled, running = struct.unpack("QQQ", os.read(fd, 24))
+    if running == 0:
+        return 0.0
+    return value * enabled / running
+
+
+class CounterSet:
+    """A set of events counted for one cgroup (or process) on all cpus."""
+
+    def __init__(self, target: int, cgroup: bool, events: Dict[str, Tuple[int, int]]):
+        self._fds: Dict[str, List[int]] = {}
+        self._target = target
+        self._cgroup = cgroup
+        self.errors: List[str] = []
+        self.add(events)
+
+    def add(self, events: Dict[str, Tuple[int, int]]):
+        """Open the events, the ones that cannot be opened end up in errors."""
+        # a cgroup is counted per cpu, a process follows its threads with inherit
+        cpus = range(os.cpu_count() or 1) if self._cgroup else [-1]
+        flags = PERF_FLAG_PID_CGROUP if self._cgroup else 0
+        for name, (event_type, config) in events.items():
+            fds = []
+            try:
+                for cpu in cpus:
+                    fds.append(
+                        perf_event_open(
+                            event_type, config, self._target, cpu, flags,
+                            inherit=not self._cgroup,
+                        )
+                    )
+            except OSError as e:
+                for fd in fds:
+                    os.close(fd)
+                self.errors.append(f"{name}: {e.strerror}")
+                continue
+            self._fds[name] = fds
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._fds)
+
+    def read(self) -> Dict[str, float]:
+        return {name: sum(read_counter(fd) for fd in fds) for name, fds in self._fds.items()}
+
+    def close(self):
+        for fds in self._fds.values():
+            for fd in fds:
+                os.close(fd)
+        self._fds.clear()
+
+
+def open_counters(target: int, cgroup: bool) -> Optional[CounterSet]:
+    """The hardware events that open, plus the software events if one is missing."""
+    counters = CounterSet(target, cgroup, HARDWARE_EVENTS)
+    if len(counters.names) < len(HARDWARE_EVENTS):
+        missing = list(counters.errors)
+        counters.add(SOFTWARE_EVENTS)
+        logger.warning(
+            f"Hardware counters unavailable ({', '.join(missing)}), "
+            f"counting {counters.names}"
+        )
+    if not counters.names:
+        logger.warning(f"No perf counters available: {', '.join(counters.errors)}")
+        return None
+    return counters
+
+
+def rates(
+    previous: Dict[str, float], current: Dict[str, float], seconds: float
+) -> Dict[str, float]:
+    """Per-second rates of the counters and the derived ipc / llc_mpki."""
+    result = {name: (current[name] - previous[name]) / seconds for name in current}
+    # derived only from counters that are there, a missing one is not a zero
+    if result.get("cycles") and "instructions" in result:
+        result["ipc"] = result["instructions"] / result["cycles"]
+    if result.get("instructions") and "llc_misses" in result:
+        result["llc_mpki"] = 1000 * result["llc_misses"] / result["instructions"]
+    return result
+
+
+class JobCounters:
+    def __init__(self, counters: CounterSet, cgroup_fd: Optional[int]):
+        self.counters = counters
+        self._cgroup_fd = cgroup_fd
+        self._last = counters.read()
+        self._last_time = time.monotonic()
+        # when the rates were last written to the event log
+        self.last_log = 0.0
+
+    def sample(self) -> Dict[str, float]:
+        current = self.counters.read()
+        now = time.monotonic()
+        result = rates(self._last, current, max(now - self._last_time, 1e-6))
+        self._last = current
+        self._last_time = now
+        return result
+
+    def close(self):
+        self.counters.close()
+        if self._cgroup_fd is not None:
+            os.close(self._cgroup_fd)
+
+
+class PerfMonitor:
+    """Keeps counters open for the running jobs and refreshes job.counters."""
+
+    def __init__(self, cgroups: "CgroupBackend"):
+        # only used to find the cgroup directory of a container
+        self._cgroups = cgroups
+        self._jobs: Dict["JobInstance", Optional[JobCounters]] = {}
+
+    def _attach(self, job: "JobInstance", container) -> Optional[JobCounters]:
+        path = self._cgroups.path(container)
+        if path is None:
+            return None
+        try:
+            cgroup_fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            logger.warning(f"Opening the cgroup of {job._jobName} failed: {e}")
+            return None
+        counters = open_counters(cgroup_fd, cgroup=True)
+        if counters is None:
+            os.close(cgroup_fd)
+            return None
+        logger.info(f"Counting {counters.names} for {job._jobName}")
+        return JobCounters(counters, cgroup_fd)
+
+    def sample(self, jobs: Iterable["JobInstance"]):
+        """Update job.counters of all jobs that have a container."""
+        active = set()
+        for job in jobs:
+            # Policy.schedule may reset job._container in another thread, read it once
+            container = job._container
+            if container is None or job._status not in (
+                JobStatus.RUNNING,
+                JobStatus.PAUSED,
+            ):
+                continue
+            active.add(job)
+            if job not in self._jobs:
+                # None is remembered too, a job without counters is not retried
+                self._jobs[job] = self._attach(job, container)
+            job_counters = self._jobs[job]
+            if job_counters is None:
+                continue
+            job.counters = job_counters.sample()
+            now = time.monotonic()
+            if now - job_counters.last_log >= PERF_LOG_INTERVAL:
+                job_counters.last_log = now
+                job._schedulerLogger.custom_event(job._job, format_counters(job.counters))
+
+        for job in list(self._jobs):
+            if job not in active:
+                job_counters = self._jobs.pop(job)
+                if job_counters is not None:
+                    job_counters.close()
+
+    def close(self):
+        for job_counters in self._jobs.values():
+            if job_counters is not None:
+                job_counters.close()
+        self._jobs.clear()
+
+
+def format_counters(counters: Dict[str, float]) -> str:
+    parts = []
+    for name, value in counters.items():
+        if name in ("ipc", "llc_mpki"):
+            parts.append(f"{name}={value:.2f}")
+        else:
+            parts.append(f"{name}={value:.3g}/s")
+    return "perf " + " ".join(parts)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    pid = int(sys.argv[1]) if len(sys.argv) > 1 else os.getpid()
+    counters = open_counters(pid, cgroup=False)
+    if counters is None:
+        sys.exit(1)
+    job_counters = JobCounters(counters, None)
+    try:
+        while True:
+            time.sleep(1)
+            print(format_counters(job_counters.sample()), flush=True)
+    except KeyboardInterrupt:
+        job_counters.close()
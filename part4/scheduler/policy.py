@@ -1,8 +1,12 @@
 from job import JobInfo, JobInstance
+from reconfiguration import Reconfiguration
 from typing import List, Optional
 
 
 class Policy:
+    # spare cpus on the memcached cores, set by the control loop
+    memcached_headroom: Optional[float] = None
+
     def __init__(self):
         pass
 
@@ -11,3 +15,15 @@ class Policy:
 
     def add_job(self, job: JobInfo):
         raise NotImplementedError("Subclasses must implement this method")
+
+    def queued_jobs(self) -> List[JobInstance]:
+        """Jobs that were not started yet, in the order the policy starts them."""
+        return []
+
+    def set_memcached_headroom(self, cpus: float):
+        """Cpus memcached leaves unused on its own cores, for policies that throttle."""
+        self.memcached_headroom = cpus
+
+    def reconfigure(self) -> Reconfiguration:
+        """Collect the job changes of one tick, they are applied when the with block ends."""
+        return Reconfiguration()
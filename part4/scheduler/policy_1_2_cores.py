@@ -4,19 +4,36 @@
 # it will run the 1 core if a 3rd core is available.
 # If there are no 2 core jobs left, it will run the 1 core jobs on the remaining cores.
 # If no more 1 core jobs are left, it will run the 2 core jobs on all available cores.
+# With throttling enabled the 1 core job is not paused when memcached takes its core,
+# it keeps running there with a cpu.max quota of what memcached leaves unused on its
+# cores (minus a margin). It is only paused when that is less than THROTTLE_MIN.
 
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+import math
 from job import JobInstance, JobStatus
 import logging
 from job import JobInfo
 from policy import Policy
+from reconfiguration import Reconfiguration, ReconfigurationError
 from scheduler_logger import SchedulerLogger
 
 logger = logging.getLogger(__name__)
 
+# Cpus of the memcached headroom that are never given to a throttled job
+THROTTLE_MARGIN = 0.25
+# Smallest quota in cpus worth running a job with, below it the job is paused
+THROTTLE_MIN = 0.1
+# Quotas are rounded down to this many cpus so small changes cause no update
+THROTTLE_STEP = 0.1
+
 
 class Policy1And2Cores(Policy):
-    def __init__(self, schedulerLogger: SchedulerLogger):
+    def __init__(
+        self,
+        schedulerLogger: SchedulerLogger,
+        job_factory: Callable[..., JobInstance] = JobInstance,
+        throttle: bool = False,
+    ):
         self.one_core_queue: List[JobInstance] = []
         self.two_core_queue: List[JobInstance] = []
         self.running_one_core: Optional[JobInstance] = None
@@ -24,10 +41,14 @@ class Policy1And2Cores(Policy):
         self.isCompleted = False
         self.policy_name = "1_2_cores"
         self.schedulerLogger = schedulerLogger
+        # the simulator passes a factory for jobs that do not use Docker
+        self.job_factory = job_factory
+        # throttle the 1 core job on the memcached core instead of pausing it
+        self.throttle = throttle
 
     def add_job(self, job: JobInfo):
         """Add a job to the appropriate queue based on its paralellizability."""
-        job_instance = JobInstance(
+        job_instance = self.job_factory(
             job["name"],
             job["image"],
             job["command"],
@@ -40,6 +61,14 @@ class Policy1And2Cores(Policy):
         elif job["paralellizability"] == 2:
             self.two_core_queue.append(job_instance)
 
+    def queued_jobs(self) -> List[JobInstance]:
+        """The heads of both queues start next (on 3 cores both at the same time)."""
+        jobs = []
+        for index in range(max(len(self.two_core_queue), len(self.one_core_queue))):
+            jobs.extend(self.two_core_queue[index : index + 1])
+            jobs.extend(self.one_core_queue[index : index + 1])
+        return jobs
+
     def schedule(self, available_cores: set[int]):
         """Implement the scheduling policy:
         1. Run 2-core jobs sequentially
@@ -62,8 +91,30 @@ class Policy1And2Cores(Policy):
         # Sort available cores
         sorted_cores = sorted(available_cores)
 
+        # All changes of this tick are applied together at the end of the block.
+        # _plan moves jobs out of the queues while it collects the changes, if they
+        # are rolled back the jobs go back to where they were.
+        saved = (
+            list(self.one_core_queue),
+            list(self.two_core_queue),
+            self.running_one_core,
+            self.running_two_core,
+        )
+        try:
+            with self.reconfigure() as tx:
+                self._plan(tx, sorted_cores)
+        except ReconfigurationError:
+            (
+                self.one_core_queue,
+                self.two_core_queue,
+                self.running_one_core,
+                self.running_two_core,
+            ) = saved
+            raise
+
+    def _plan(self, tx: Reconfiguration, sorted_cores: List[int]):
         # If 3 cores available, run both 1-core and 2-core jobs
-        if len(available_cores) == 3:
+        if len(sorted_cores) == 3:
             # If both queues are empty and there's a running job, give it all cores
             if len(self.one_core_queue) == 0 and len(self.two_core_queue) == 0:
                 if (
@@ -71,63 +122,50 @@ class Policy1And2Cores(Policy):
                     and self.running_two_core
                     and self.running_two_core._status != JobStatus.COMPLETED
                 ):
-                    self.running_two_core.update_job_cpus(
-                        f"{sorted_cores[0]},{sorted_cores[1]},{sorted_cores[2]}"
-                    )
-                    try:
-                        self.running_two_core.unpause_job()
-                    except Exception as e:
-                        logger.warning(f"Error unpausing 2-core job: {e}")
+                    self._give_all_cores(tx, self.running_two_core, sorted_cores)
                 elif (
                     self.running_one_core
                     and self.running_two_core is None
                     and self.running_one_core._status != JobStatus.COMPLETED
                 ):
-                    self.running_one_core.update_job_cpus(
-                        f"{sorted_cores[0]},{sorted_cores[1]},{sorted_cores[2]}"
-                    )
-                    try:
-                        self.running_one_core.unpause_job()
-                    except Exception as e:
-                        logger.warning(f"Error unpausing 1-core job: {e}")
+                    self._give_all_cores(tx, self.running_one_core, sorted_cores)
                 return
 
             # Start/continue 2-core job
             if self.running_two_core is None:
                 if len(self.two_core_queue) > 0:
                     self.running_two_core = self.two_core_queue.pop(0)
-                    self.running_two_core.start_job(
-                        f"{sorted_cores[1]},{sorted_cores[2]}"
-                    )
+                    tx.start(self.running_two_core, f"{sorted_cores[1]},{sorted_cores[2]}")
                 elif len(self.one_core_queue) > 0:
                     # If no 2-core jobs, run a 1-core job on 2 cores
                     self.running_two_core = self.one_core_queue.pop(0)
-                    self.running_two_core.start_job(
-                        f"{sorted_cores[1]},{sorted_cores[2]}"
-                    )
+                    tx.start(self.running_two_core, f"{sorted_cores[1]},{sorted_cores[2]}")
             elif (
                 self.running_two_core
                 and self.running_two_core._status == JobStatus.PAUSED
             ):
-                self.running_two_core.unpause_job()
+                tx.unpause(self.running_two_core)
 
             # Start 1-core job
             if self.running_one_core is None:
                 if len(self.one_core_queue) > 0:
                     self.running_one_core = self.one_core_queue.pop(0)
-                    self.running_one_core.start_job(str(sorted_cores[0]))
+                    tx.start(self.running_one_core, str(sorted_cores[0]))
                 elif len(self.two_core_queue) > 0:
                     # If no 1-core jobs, run a 2-core job on 1 core
                     self.running_one_core = self.two_core_queue.pop(0)
-                    self.running_one_core.start_job(str(sorted_cores[0]))
+                    tx.start(self.running_one_core, str(sorted_cores[0]))
             if (
                 self.running_one_core
                 and self.running_one_core._status == JobStatus.PAUSED
             ):
-                self.running_one_core.unpause_job()
+                tx.unpause(self.running_one_core)
+            if self.throttle and self.running_one_core:
+                # the core is its own again
+                tx.throttle(self.running_one_core, None)
 
         # If 2 cores available, only run 2-core job and pause any running 1-core job
-        elif len(available_cores) == 2:
+        elif len(sorted_cores) == 2:
             # If both queues are empty and there's a running job, give it all cores
             if len(self.one_core_queue) == 0 and len(self.two_core_queue) == 0:
                 if (
@@ -135,50 +173,57 @@ class Policy1And2Cores(Policy):
                     and self.running_two_core
                     and self.running_two_core._status != JobStatus.COMPLETED
                 ):
-                    self.running_two_core.update_job_cpus(
-                        f"{sorted_cores[0]},{sorted_cores[1]}"
-                    )
-                    try:
-                        self.running_two_core.unpause_job()
-                    except Exception as e:
-                        logger.warning(f"Error unpausing 2-core job: {e}")
+                    self._give_all_cores(tx, self.running_two_core, sorted_cores)
                 elif (
                     self.running_two_core is None
                     and self.running_one_core
                     and self.running_one_core._status != JobStatus.COMPLETED
                 ):
-                    self.running_one_core.update_job_cpus(
-                        f"{sorted_cores[0]},{sorted_cores[1]}"
-                    )
-                    try:
-                        self.running_one_core.unpause_job()
-                    except Exception as e:
-                        logger.warning(f"Error unpausing 1-core job: {e}")
+                    self._give_all_cores(tx, self.running_one_core, sorted_cores)
                 return
 
-            # Pause running 1-core job if exists
-            if (
+            # Pause running 1-core job if exists, or throttle it on the memcached core
+            quota = self._throttle_quota() if self.throttle else None
+            if self.running_one_core and quota is not None:
+                tx.throttle(self.running_one_core, quota)
+                if self.running_one_core._status == JobStatus.PAUSED:
+                    tx.unpause(self.running_one_core)
+            elif (
                 self.running_one_core
                 and self.running_one_core._status == JobStatus.RUNNING
             ):
-                self.running_one_core.pause_job()
+                tx.pause(self.running_one_core)
 
             # Start new 2-core job if none running
             if self.running_two_core is None:
                 if len(self.two_core_queue) > 0:
                     self.running_two_core = self.two_core_queue.pop(0)
-                    self.running_two_core.start_job(
-                        f"{sorted_cores[0]},{sorted_cores[1]}"
-                    )
+                    tx.start(self.running_two_core, f"{sorted_cores[0]},{sorted_cores[1]}")
                 elif len(self.one_core_queue) > 0:
                     # If no 2-core jobs, run a 1-core job on 2 cores
                     self.running_two_core = self.one_core_queue.pop(0)
-                    self.running_two_core.start_job(
-                        f"{sorted_cores[0]},{sorted_cores[1]}"
-                    )
+                    tx.start(self.running_two_core, f"{sorted_cores[0]},{sorted_cores[1]}")
 
         return
 
+    def _throttle_quota(self) -> Optional[float]:
+        """Quota for the 1 core job on a memcached core, None if it should be paused."""
+        if self.memcached_headroom is None:
+            return None
+        cpus = min(1.0, self.memcached_headroom - THROTTLE_MARGIN)
+        cpus = round(math.floor(cpus / THROTTLE_STEP) * THROTTLE_STEP, 2)
+        if cpus < THROTTLE_MIN:
+            return None
+        return cpus
+
+    def _give_all_cores(self, tx: Reconfiguration, job: JobInstance, sorted_cores: List[int]):
+        """The last job left gets all cores and runs."""
+        tx.update_cpus(job, ",".join(str(core) for core in sorted_cores))
+        if self.throttle:
+            tx.throttle(job, None)
+        if job._status == JobStatus.PAUSED:
+            tx.unpause(job)
+
     def _check_completed_jobs(self):
         """Check for completed jobs and update running jobs accordingly."""
         if self.running_one_core:
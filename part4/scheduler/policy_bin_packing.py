@@ -0,0 +1,179 @@
+# Scheduling Policy:
+# Generic version of the 1_2_cores / 2_3_cores policies for any number of cores
+# and any number of concurrently running jobs.
+# Every tick it computes the wanted core assignment for all unfinished jobs with a
+# pluggable CoreAssigner and then only applies the difference to the current state
+# in one Reconfiguration: pause jobs that lost all their cores, update cpusets,
+# unpause and start jobs. Running jobs keep their cores where possible so a tick
+# without changes does not cause any Docker calls.
+
+from typing import Callable, Dict, List, Optional
+from job import JobInstance, JobStatus
+import logging
+from job import JobInfo
+from policy import Policy
+from scheduler_logger import SchedulerLogger
+from interference_profile import InterferenceProfile
+from admission import AdmissionControl
+
+logger = logging.getLogger(__name__)
+
+Assignment = Dict[JobInstance, List[int]]
+
+
+def format_cores(cores: List[int]) -> str:
+    return ",".join(str(core) for core in sorted(cores))
+
+
+class CoreAssigner:
+    """Decides which job gets which cores. Subclasses implement assign."""
+
+    def assign(
+        self, jobs: List[JobInstance], demands: Dict[JobInstance, int], cores: List[int]
+    ) -> Assignment:
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class FirstFitAssigner(CoreAssigner):
+    """First fit in priority order, left over cores go to the highest priority jobs.
+
+    Jobs get at most their demand (but at least one core) as long as cores are left.
+    If there are more cores than the selected jobs want, the spare cores are handed
+    out round robin so no core stays idle.
+    """
+
+    def assign(
+        self, jobs: List[JobInstance], demands: Dict[JobInstance, int], cores: List[int]
+    ) -> Assignment:
+        free = sorted(cores)
+        selected: List[JobInstance] = []
+        remaining = len(free)
+        for job in jobs:
+            if remaining == 0:
+                break
+            selected.append(job)
+            remaining -= min(demands[job], remaining)
+
+        # how many cores each selected job gets
+        counts = {}
+        left = len(free)
+        for job in selected:
+            counts[job] = min(demands[job], left)
+            left -= counts[job]
+        index = 0
+        while left > 0 and selected:
+            counts[selected[index % len(selected)]] += 1
+            left -= 1
+            index += 1
+
+        # keep the cores a job already has to avoid moving it around
+        assignment: Assignment = {}
+        for job in selected:
+            kept = [core for core in job._cores if core in free][: counts[job]]
+            for core in kept:
+                free.remove(core)
+            assignment[job] = kept
+        for job in selected:
+            while len(assignment[job]) < counts[job]:
+                assignment[job].append(free.pop(0))
+            assignment[job].sort()
+        return assignment
+
+
+def running_first(job: JobInstance) -> int:
+    """Default priority: running jobs, then paused jobs, then queued jobs."""
+    if job._status == JobStatus.RUNNING:
+        return 0
+    if job._status == JobStatus.PAUSED:
+        return 1
+    return 2
+
+
+def profile_priority(profile: InterferenceProfile) -> Callable[[JobInstance], object]:
+    """Like running_first, but within each group the least aggressive job comes first.
+
+    The first jobs get the cores next to memcached and the last job is the first to
+    lose its cores (and be paused) when memcached scales up.
+    """
+    return lambda job: (running_first(job), profile.job_key(job._jobName))
+
+
+class PolicyBinPacking(Policy):
+    def __init__(
+        self,
+        schedulerLogger: SchedulerLogger,
+        assigner: Optional[CoreAssigner] = None,
+        priority: Callable[[JobInstance], object] = running_first,
+        job_factory: Callable[..., JobInstance] = JobInstance,
+        admission: Optional[AdmissionControl] = None,
+    ):
+        self.jobs: List[JobInstance] = []
+        self.demands: Dict[JobInstance, int] = {}
+        self.assigner = assigner if assigner is not None else FirstFitAssigner()
+        self.priority = priority
+        self.isCompleted = False
+        self.policy_name = "bin_packing"
+        self.schedulerLogger = schedulerLogger
+        # the simulator passes a factory for jobs that do not use Docker
+        self.job_factory = job_factory
+        # jobs that are not admitted get no cores, as if they were queued
+        self.admission = admission
+
+    def add_job(self, job: JobInfo):
+        """Add a job, it wants as many cores as its paralellizability."""
+        job_instance = self.job_factory(
+            job["name"],
+            job["image"],
+            job["command"],
+            job["paralellizability"],
+            self.schedulerLogger,
+            job["logger_job"],
+        )
+        self.jobs.append(job_instance)
+        self.demands[job_instance] = job["paralellizability"]
+
+    def _active_jobs(self) -> List[JobInstance]:
+        return [job for job in self.jobs if job._status != JobStatus.COMPLETED]
+
+    def queued_jobs(self) -> List[JobInstance]:
+        """Jobs without a container in priority order, failed jobs start again too."""
+        queued = [
+            job for job in self.jobs if job._status in (JobStatus.PENDING, JobStatus.ERROR)
+        ]
+        return sorted(queued, key=self.priority)
+
+    def schedule(self, available_cores: set[int]):
+        """Compute the wanted core assignment and apply the difference."""
+        self._check_completed_jobs()
+
+        active = self._active_jobs()
+        if len(active) == 0:
+            self.isCompleted = True
+            return
+
+        # sorted is stable, so jobs with the same priority keep their queue order
+        ordered = sorted(active, key=self.priority)
+        if self.admission is not None:
+            ordered = self.admission.admit(ordered, available_cores)
+        assignment = self.assigner.assign(ordered, self.demands, sorted(available_cores))
+        self._apply(active, assignment)
+
+    def _apply(self, active: List[JobInstance], assignment: Assignment):
+        # the Reconfiguration orders the changes so no core is shared, see reconfiguration.py
+        with self.reconfigure() as tx:
+            for job in active:
+                if job not in assignment and job._status == JobStatus.RUNNING:
+                    tx.pause(job)
+            for job, cores in assignment.items():
+                if job._status in (JobStatus.RUNNING, JobStatus.PAUSED):
+                    tx.update_cpus(job, format_cores(cores))
+                if job._status == JobStatus.PAUSED:
+                    tx.unpause(job)
+                elif job._status in (JobStatus.PENDING, JobStatus.ERROR):
+                    tx.start(job, format_cores(cores))
+
+    def _check_completed_jobs(self):
+        """Check running jobs, failed jobs are started again on the next tick."""
+        for job in self.jobs:
+            if job._status == JobStatus.RUNNING:
+                job.check_job_completed()
@@ -0,0 +1,190 @@
+# Reconfiguration transactions for the batch jobs.
+# Calling update_job_cpus / pause_job / unpause_job / start_job one after the
+# other makes every change of a tick a separate synchronous Docker round trip, and
+# while they run the jobs are in a half reconfigured state. A Reconfiguration
+# collects all changes of one tick and applies them when the with block ends:
+#  1. release: pause jobs, shrink cpusets and lower cpu.max quotas. A job that moves
+#     first shrinks to the cores it keeps, so its old cores are free before anyone
+#     grows into them.
+#  2. acquire: grow and move cpusets, raise quotas, unpause and start jobs.
+# A core is never handed to a job before the job that held it has given it up.
+# Within a phase the jobs are changed concurrently (the changes of one job stay in
+# order). If a change fails, the changes that already went through are undone in
+# reverse order and ReconfigurationError is raised. The policy restores its own
+# bookkeeping (queues, running jobs) and tries again on the next tick.
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from job import JobInstance
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # created lazily, the simulator never has more than one change per phase
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=MAX_WORKERS, thread_name_prefix="reconfigure"
+        )
+    return _executor
+
+
+def format_cores(cores) -> str:
+    return ",".join(str(core) for core in sorted(cores))
+
+
+class ReconfigurationError(Exception):
+    pass
+
+
+class Change:
+    """One Docker call on a job and the call that undoes it."""
+
+    def __init__(self, job: "JobInstance", description: str, apply: Callable, undo: Callable):
+        self.job = job
+        self.description = description
+        self.apply = apply
+        self.undo = undo
+
+    def __str__(self):
+        return f"{self.job._jobName}: {self.description}"
+
+
+def update_cpus_change(job: "JobInstance", cores: str, old_cores: str) -> Change:
+    return Change(
+        job,
+        f"cores {old_cores} -> {cores}",
+        lambda: job.update_job_cpus(cores),
+        lambda: job.update_job_cpus(old_cores),
+    )
+
+
+class Reconfiguration:
+    def __init__(self):
+        self._release: List[Change] = []
+        self._acquire: List[Change] = []
+        self.duration_ms: Optional[float] = None
+
+    def __enter__(self) -> "Reconfiguration":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # nothing is applied if the policy failed while collecting the changes
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def __len__(self):
+        return len(self._release) + len(self._acquire)
+
+    def update_cpus(self, job: "JobInstance", cores: str):
+        old = set(job._cores)
+        new = {int(core) for core in cores.split(",")}
+        if new == old:
+            return
+        old_cores = format_cores(old)
+        kept = new & old
+        if new <= old:
+            self._release.append(update_cpus_change(job, cores, old_cores))
+        elif kept:
+            shrunk = format_cores(kept)
+            self._release.append(update_cpus_change(job, shrunk, old_cores))
+            self._acquire.append(update_cpus_change(job, cores, shrunk))
+        else:
+            # nothing in common, the new cores are freed in the release phase
+            self._acquire.append(update_cpus_change(job, cores, old_cores))
+
+    def pause(self, job: "JobInstance"):
+        self._release.append(Change(job, "pause", job.pause_job, job.unpause_job))
+
+    def unpause(self, job: "JobInstance"):
+        self._acquire.append(Change(job, "unpause", job.unpause_job, job.pause_job))
+
+    def throttle(self, job: "JobInstance", cpus: Optional[float]):
+        old = job._quota
+        if cpus == old:
+            return
+        change = Change(
+            job,
+            f"cpu.max {old} -> {cpus}",
+            lambda: job.throttle_job(cpus),
+            lambda: job.throttle_job(old),
+        )
+        # a lower quota gives cpu time back, None is no limit at all
+        if cpus is not None and (old is None or cpus < old):
+            self._release.append(change)
+        else:
+            self._acquire.append(change)
+
+    def start(self, job: "JobInstance", cores: str):
+        # undone by removing the container, the job is pending again
+        self._acquire.append(
+            Change(job, f"start on {cores}", lambda: job.start_job(cores), job.stop_job)
+        )
+
+    def _run_phase(self, changes: List[Change], applied: List[Change]):
+        # the changes of one job run in order, different jobs run concurrently
+        by_job: Dict["JobInstance", List[Change]] = {}
+        for change in changes:
+            by_job.setdefault(change.job, []).append(change)
+
+        def run(job_changes: List[Change]):
+            done = []
+            for change in job_changes:
+                try:
+                    change.apply()
+                except Exception as e:
+                    return done, change, e
+                done.append(change)
+            return done, None, None
+
+        if len(by_job) == 1:
+            results = [run(changes)]
+        else:
+            results = list(_get_executor().map(run, by_job.values()))
+
+        failures = []
+        for done, failed, error in results:
+            applied.extend(done)
+            if failed is not None:
+                failures.append((failed, error))
+        if failures:
+            raise ReconfigurationError(
+                ", ".join(f"{change} failed: {error}" for change, error in failures)
+            )
+
+    def _undo(self, applied: List[Change]):
+        for change in reversed(applied):
+            try:
+                change.undo()
+            except Exception as e:
+                logger.error(f"Undoing {change} failed: {e}")
+
+    def commit(self):
+        if len(self) == 0:
+            return
+        start = time.monotonic()
+        applied: List[Change] = []
+        try:
+            self._run_phase(self._release, applied)
+            self._run_phase(self._acquire, applied)
+        except ReconfigurationError as e:
+            logger.error(f"Reconfiguration failed, undoing {len(applied)} changes: {e}")
+            self._undo(applied)
+            raise
+        finally:
+            self.duration_ms = (time.monotonic() - start) * 1000
+        logger.info(
+            f"Reconfiguration of {len(self)} changes "
+            f"({len(self._release)} release, {len(self._acquire)} acquire) "
+            f"took {self.duration_ms:.1f} ms"
+        )
@@ -0,0 +1,138 @@
+# Asyncio runtime for the scheduler control loop.
+# All blocking work (psutil sampling, Docker calls inside Policy.schedule,
+# memcached affinity changes) is pushed to a thread pool so the
+# memcached core-scaling reaction is never stuck behind a slow container start.
+# Policy.schedule is not re-entrant, so at most one schedule call is in flight;
+# requests that arrive meanwhile are coalesced into a single follow-up call.
+# memcached affinity changes get their own worker, so Docker calls that hang in
+# the shared pool can not queue a scale-up behind them.
+# A failed schedule call is logged and retried on the next tick, after
+# MAX_SCHEDULE_FAILURES failures in a row the policy is considered broken and
+# raise_if_failed stops the control loop with the last error.
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+from typing import Callable, Optional
+
+from affinity import AffinityManager
+from policy import Policy
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which a blocking call is reported as timed out
+SAMPLE_TIMEOUT = 5
+SCHEDULE_TIMEOUT = 60
+AFFINITY_TIMEOUT = 5
+# Failed schedule calls in a row after which the control loop is stopped
+MAX_SCHEDULE_FAILURES = 5
+
+
+class SchedulerRuntime:
+    def __init__(self, policy: Policy, max_workers: int = 4):
+        self._policy = policy
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="scheduler"
+        )
+        self._affinity_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="affinity"
+        )
+        self._schedule_future: Optional[asyncio.Future] = None
+        self._schedule_started = 0.0
+        self._pending_cores: Optional[set[int]] = None
+        self._failures = 0
+        self._error: Optional[BaseException] = None
+
+    def submit_blocking(
+        self, fn: Callable, *args, executor: Optional[concurrent.futures.Executor] = None, **kwargs
+    ) -> asyncio.Future:
+        """Start a blocking function in the executor, the caller awaits the future."""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(executor or self._executor, lambda: fn(*args, **kwargs))
+
+    async def run_blocking(
+        self,
+        fn: Callable,
+        *args,
+        timeout: float,
+        executor: Optional[concurrent.futures.Executor] = None,
+        **kwargs,
+    ):
+        """Run a blocking function in the executor and wait at most timeout seconds."""
+        future = self.submit_blocking(fn, *args, executor=executor, **kwargs)
+        # shield: on timeout the thread keeps running, we only stop waiting for it
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    async def set_memcached_affinity(self, affinity: AffinityManager, cores: set[int]):
+        """Set the cpu affinity of all memcached threads without blocking the loop."""
+        try:
+            await self.run_blocking(
+                affinity.set_cores,
+                cores,
+                timeout=AFFINITY_TIMEOUT,
+                executor=self._affinity_executor,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Setting memcached cores {sorted(cores)} timed out")
+
+    def kick_schedule(self, available_cores: set[int]):
+        """Start a Policy.schedule call, or queue one if a call is still running."""
+        if self._error is not None:
+            # the policy is broken, raise_if_failed reports it
+            return
+        if self._schedule_future is not None and not self._schedule_future.done():
+            self._pending_cores = set(available_cores)
+            running_for = time.monotonic() - self._schedule_started
+            if running_for > SCHEDULE_TIMEOUT:
+                logger.warning(
+                    f"Policy schedule has been running for {running_for:.1f} seconds"
+                )
+            return
+
+        loop = asyncio.get_running_loop()
+        self._pending_cores = None
+        self._schedule_started = time.monotonic()
+        self._schedule_future = loop.run_in_executor(
+            self._executor, self._policy.schedule, set(available_cores)
+        )
+        self._schedule_future.add_done_callback(self._schedule_done)
+
+    def _schedule_done(self, future: asyncio.Future):
+        duration_ms = (time.monotonic() - self._schedule_started) * 1000
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self._failures += 1
+            logger.error(
+                f"Policy schedule failed ({self._failures}/{MAX_SCHEDULE_FAILURES}): {error!r}"
+            )
+            if self._failures >= MAX_SCHEDULE_FAILURES:
+                self._error = error
+                return
+        else:
+            self._failures = 0
+            logger.info(f"Policy schedule took {duration_ms:.1f} ms")
+
+        if self._pending_cores is not None:
+            self.kick_schedule(self._pending_cores)
+
+    def raise_if_failed(self):
+        """Raise the last error once schedule failed MAX_SCHEDULE_FAILURES times in a row."""
+        if self._error is not None:
+            raise RuntimeError(
+                f"Policy schedule failed {self._failures} times in a row"
+            ) from self._error
+
+    async def wait_for_schedule(self):
+        """Wait for the in-flight schedule call (and a queued follow-up) to finish."""
+        while self._schedule_future is not None and not self._schedule_future.done():
+            await asyncio.wait({self._schedule_future})
+            # the done callback may have started the queued call
+            await asyncio.sleep(0)
+        self.raise_if_failed()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._affinity_executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,7 @@
 from datetime import datetime
+import threading
 from enum import Enum
+from typing import Iterable
 import urllib.parse
 
 
@@ -19,22 +21,45 @@ class Job(Enum):
 
 
 class SchedulerLogger:
-    def __init__(self):
+    def __init__(self, binary: bool = True, events_path: str | None = None):
+        # event_log imports Job from this module
+        from event_log import EventLogWriter, EVENTS_BY_NAME
+
         start_date = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         self.file = open(f"log{start_date}.txt", "w")
+        # jobs are reconfigured from several threads at once
+        self._lock = threading.Lock()
+        # structured copy of the same events, see event_log.py
+        if events_path is None:
+            events_path = f"log{start_date}.bin"
+        self.events = EventLogWriter(events_path) if binary else None
+        self._event_ids = EVENTS_BY_NAME
         self._log("start", Job.SCHEDULER)
 
-    def _log(self, event: str, job_name: Job, args: str = "") -> None:
-        self.file.write(
-            LOG_STRING.format(
-                timestamp=datetime.now().isoformat(),
-                event=event,
-                job_name=job_name.value,
-                args=args,
-            ).strip()
-            + "\n"
-        )
+    def _log(
+        self,
+        event: str,
+        job_name: Job,
+        args: str = "",
+        cores: Iterable[str] = (),
+        threads: int = 0,
+        comment: str | None = None,
+    ) -> None:
+        with self._lock:
+            self.file.write(
+                LOG_STRING.format(
+                    timestamp=datetime.now().isoformat(),
+                    event=event,
+                    job_name=job_name.value,
+                    args=args,
+                ).strip()
+                + "\n"
+            )
+        if self.events is not None:
+            self.events.append(
+                self._event_ids[event], job_name, cores, threads, comment
+            )
 
     def job_start(
         self, job: Job, initial_cores: list[str], initial_threads: int
@@ -48,6 +73,8 @@ class SchedulerLogger:
             + (",".join(str(i) for i in initial_cores))
             + "] "
             + str(initial_threads),
+            cores=initial_cores,
+            threads=initial_threads,
         )
 
     def job_end(self, job: Job) -> None:
@@ -58,7 +85,12 @@ class SchedulerLogger:
     def update_cores(self, job: Job, cores: list[str]) -> None:
         assert job != Job.SCHEDULER, "You don't have to log SCHEDULER here"
 
-        self._log("update_cores", job, "[" + (",".join(str(i) for i in cores)) + "]")
+        self._log(
+            "update_cores",
+            job,
+            "[" + (",".join(str(i) for i in cores)) + "]",
+            cores=cores,
+        )
 
     def job_pause(self, job: Job) -> None:
         assert job != Job.SCHEDULER, "You don't have to log SCHEDULER here"
@@ -71,9 +103,11 @@ class SchedulerLogger:
         self._log("unpause", job)
 
     def custom_event(self, job: Job, comment: str):
-        self._log("custom", job, urllib.parse.quote_plus(comment))
+        self._log("custom", job, urllib.parse.quote_plus(comment), comment=comment)
 
     def end(self) -> None:
         self._log("end", Job.SCHEDULER)
         self.file.flush()
         self.file.close()
+        if self.events is not None:
+            self.events.close()
@@ -0,0 +1,417 @@
+# Offline scheduler simulator.
+# Drives the real Policy classes with SimJobs that have the same interface as
+# JobInstance but only advance a virtual clock, so a policy can be evaluated in
+# milliseconds instead of a 15 minute run on the cluster.
+#
+# Inputs (all recorded by earlier experiments):
+#  - job durations: job_times/job_exec_times/job_tot_exec_times_policy1_run*.csv,
+#    the time each job spent running in a recorded run, at the thread count the
+#    1_2_cores policy gave it
+#  - speedup per thread count: part2/task2/parsec_result_threads/execution_times.csv,
+#    to convert a duration to a different number of cores
+#  - memcached load: job_times/memcached_cpu_usage/memcached_cpu_usage_policy1_run*.csv,
+#    how many cores memcached needed over time
+#
+# Memcached follows the recorded demand with a configurable scale-up and
+# scale-down delay (the sampling period and CPU_HIGH_THRESHOLD of main.py). The
+# simulation steps at the sampling period of main.py by default, a delay shorter
+# than the step could not be told apart from one step and is rejected.
+# Every second in which memcached had fewer cores than it needed counts as SLO
+# exposure. Interference is not simulated, instead every second in which memcached
+# had 2 cores next to more than one memory heavy job (admission.py) counts as
+# memory co-location, the situation the part1 measurements show hurts its p95.
+#
+#   python simulator.py -p 1 --logs ../part4_3_logs --run 1
+#   python simulator.py -p 3 --logs ../part4_3_logs --sweep
+#   python simulator.py -p 3a --logs ../part4_3_logs --sweep   (with admission control)
+
+import argparse
+import csv
+import functools
+import itertools
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from admission import AdmissionControl, MemoryPressure, load_memory_pressure
+from interference_profile import load_profile
+from job import JobStatus
+from parsec_jobs import jobs as parsec_jobs
+from policy import Policy
+from policy_1_2_cores import Policy1And2Cores
+from policy_bin_packing import PolicyBinPacking
+from scheduler_logger import SchedulerLogger, Job as JobEnum
+
+DEFAULT_SPEEDUP_CSV = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "..",
+    "part2",
+    "task2",
+    "parsec_result_threads",
+    "execution_times.csv",
+)
+NUM_CORES = 4
+# Seconds per simulation step, SAMPLE_PERIOD of main.py
+SAMPLE_PERIOD = 0.1
+# Slack for the float error of the accumulated clock
+EPSILON = 1e-9
+
+
+class NullSchedulerLogger(SchedulerLogger):
+    """SchedulerLogger that does not create a log file."""
+
+    def __init__(self):
+        pass
+
+    def _log(self, event: str, job_name: JobEnum, args: str = "", **kwargs) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+class SpeedupTable:
+    """Speedup of every workload as a function of the number of cores."""
+
+    def __init__(self, path: str = DEFAULT_SPEEDUP_CSV):
+        points: Dict[str, List[tuple[int, float]]] = {}
+        with open(path, "r") as f:
+            for row in csv.DictReader(f):
+                points.setdefault(row["workload"], []).append(
+                    (int(row["threads"]), float(row["speed_up"]))
+                )
+        self._points = {
+            workload: (
+                np.array([t for t, _ in sorted(values)], dtype=np.float64),
+                np.array([s for _, s in sorted(values)], dtype=np.float64),
+            )
+            for workload, values in points.items()
+        }
+
+    def speedup(self, workload: str, cores: float) -> float:
+        if workload not in self._points:
+            return cores
+        threads, speedups = self._points[workload]
+        return float(np.interp(cores, threads, speedups))
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+
+class SimJob:
+    """Same interface as JobInstance, progress is computed from the virtual clock."""
+
+    def __init__(
+        self,
+        jobName: str,
+        image: str,
+        command: list[str],
+        threads: int,
+        schedulerLogger: SchedulerLogger,
+        job: JobEnum,
+        work: float = 0.0,
+        speedups: Optional[SpeedupTable] = None,
+        clock: Optional[SimClock] = None,
+    ):
+        self._jobName = jobName
+        self._job = job
+        self._threads = threads
+        self._status = JobStatus.PENDING
+        self._cores: list[int] = []
+        self._start_time = None
+        self._end_time = None
+        # work is measured in seconds on a single core
+        self.work = work
+        self.done_work = 0.0
+        self.pauses = 0
+        self.core_updates = 0
+        self._speedups = speedups
+        self._clock = clock
+
+    def rate(self) -> float:
+        """Single-core seconds of work done per second of wall time."""
+        if self._status != JobStatus.RUNNING:
+            return 0.0
+        return self._speedups.speedup(self._jobName, min(len(self._cores), self._threads))
+
+    def advance(self, start: float, dt: float):
+        rate = self.rate()
+        if rate == 0 or self._end_time is not None:
+            return
+        remaining = self.work - self.done_work
+        if rate * dt >= remaining:
+            self.done_work = self.work
+            self._end_time = start + remaining / rate
+        else:
+            self.done_work += rate * dt
+
+    def start_job(self, cores: str):
+        self._cores = [int(core) for core in cores.split(",")]
+        self._status = JobStatus.RUNNING
+        self._start_time = self._clock.now
+
+    def stop_job(self):
+        if self._status == JobStatus.PENDING:
+            raise ValueError(f"Job {self._jobName} is not running")
+        self._cores = []
+        self._status = JobStatus.PENDING
+        self._start_time = None
+        self.done_work = 0.0
+
+    def pause_job(self):
+        if self._status != JobStatus.RUNNING:
+            raise ValueError(f"Job {self._jobName} is not running")
+        self._status = JobStatus.PAUSED
+        self.pauses += 1
+
+    def unpause_job(self):
+        if self._status != JobStatus.PAUSED:
+            raise ValueError(f"Job {self._jobName} is not paused")
+        self._status = JobStatus.RUNNING
+
+    def update_job_cpus(self, cores: str):
+        if self._status == JobStatus.PENDING:
+            raise ValueError(f"Job {self._jobName} is not running")
+        self._cores = [int(core) for core in cores.split(",")]
+        self.core_updates += 1
+
+    def check_job_completed(self):
+        if self._status == JobStatus.PENDING:
+            raise ValueError(f"Job {self._jobName} is not running")
+        if self._end_time is not None:
+            self._status = JobStatus.COMPLETED
+        return self._status
+
+
+class MemcachedScaler:
+    """Follows the recorded memcached demand with a reaction delay per direction."""
+
+    def __init__(self, scale_up_delay: float, scale_down_delay: float, initial: int = 2):
+        self.scale_up_delay = scale_up_delay
+        self.scale_down_delay = scale_down_delay
+        self.cores = initial
+        self._since: Optional[float] = None
+
+    def update(self, now: float, demand: int) -> int:
+        if demand == self.cores:
+            self._since = None
+            return self.cores
+        if self._since is None:
+            self._since = now
+        delay = self.scale_up_delay if demand > self.cores else self.scale_down_delay
+        if now - self._since >= delay - EPSILON:
+            self.cores = demand
+            self._since = None
+        return self.cores
+
+
+class SimResult:
+    def __init__(self, makespan: float, job_times: Dict[str, float], pauses: int,
+                 core_updates: int, slo_exposure: float, duration: float,
+                 memory_colocation: float = 0.0):
+        self.makespan = makespan
+        self.job_times = job_times
+        self.pauses = pauses
+        self.core_updates = core_updates
+        self.slo_exposure = slo_exposure
+        self.duration = duration
+        self.memory_colocation = memory_colocation
+
+    def __str__(self):
+        return (
+            f"makespan {self.makespan:7.1f} s, pauses {self.pauses:3d}, "
+            f"core updates {self.core_updates:3d}, "
+            f"SLO exposure {self.slo_exposure:6.1f} s ({self.slo_exposure / max(self.duration, 1e-9):.1%}), "
+            f"memory co-location {self.memory_colocation:6.1f} s"
+        )
+
+
+def read_job_times(path: str) -> Dict[str, float]:
+    with open(path, "r") as f:
+        return {
+            row["job_name"]: float(row["total_execution_time_seconds"])
+            for row in csv.DictReader(f)
+        }
+
+
+def read_demand_trace(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Return (seconds since the start of the run, memcached cores needed)."""
+    timestamps = []
+    cores = []
+    with open(path, "r") as f:
+        for row in csv.DictReader(f):
+            timestamps.append(int(row["timestamp"]))
+            cores.append(int(row["memcached_cores_usage"]))
+    timestamps = np.array(timestamps, dtype=np.float64)
+    return timestamps - timestamps[0], np.array(cores, dtype=np.int64)
+
+
+def recorded_threads(name: str) -> int:
+    # threads the 1_2_cores policy gave each job in the recorded runs (see main.py)
+    if name == "radix":
+        return 1
+    return 1 if parsec_jobs[name]["paralellizability"] == 1 else 2
+
+
+def simulate(
+    policy_factory: Callable[[SchedulerLogger, Callable], Policy],
+    job_times: Dict[str, float],
+    trace: tuple[np.ndarray, np.ndarray],
+    speedups: SpeedupTable,
+    scale_up_delay: float = 0.1,
+    scale_down_delay: float = 2.0,
+    tick: float = SAMPLE_PERIOD,
+    num_cores: int = NUM_CORES,
+    max_time: float = 24 * 3600,
+    memory_pressure: Optional[MemoryPressure] = None,
+) -> SimResult:
+    """Run one policy against one recorded run and return the simulated outcome."""
+    if min(scale_up_delay, scale_down_delay) < tick - EPSILON:
+        raise ValueError(
+            f"Delays ({scale_up_delay} s, {scale_down_delay} s) must not be shorter "
+            f"than the tick ({tick} s)"
+        )
+    clock = SimClock()
+    sim_jobs: List[SimJob] = []
+
+    def job_factory(jobName, image, command, threads, schedulerLogger, job):
+        work = job_times[jobName] * speedups.speedup(jobName, recorded_threads(jobName))
+        sim_job = SimJob(jobName, image, command, threads, schedulerLogger, job,
+                         work=work, speedups=speedups, clock=clock)
+        sim_jobs.append(sim_job)
+        return sim_job
+
+    policy = policy_factory(NullSchedulerLogger(), job_factory)
+    for name, info in parsec_jobs.items():
+        if name not in job_times:
+            continue
+        info = dict(info)
+        if name == "radix":
+            # radix cant run with 3 cores
+            info["paralellizability"] = 1
+        policy.add_job(info)
+
+    trace_times, trace_cores = trace
+    scaler = MemcachedScaler(scale_up_delay, scale_down_delay)
+    slo_exposure = 0.0
+    memory_colocation = 0.0
+
+    while not policy.isCompleted and clock.now < max_time:
+        index = max(int(np.searchsorted(trace_times, clock.now, side="right")) - 1, 0)
+        demand = int(trace_cores[index])
+        memcached_cores = scaler.update(clock.now, demand)
+        if memcached_cores < demand:
+            slo_exposure += tick
+
+        policy.schedule(set(range(num_cores)) - set(range(memcached_cores)))
+
+        if memory_pressure is not None and memcached_cores >= 2:
+            heavy = sum(
+                1
+                for j in sim_jobs
+                if j._status == JobStatus.RUNNING and memory_pressure.is_heavy(j._jobName)
+            )
+            if heavy > 1:
+                memory_colocation += tick
+
+        for sim_job in sim_jobs:
+            sim_job.advance(clock.now, tick)
+        clock.now += tick
+
+    starts = [j._start_time for j in sim_jobs if j._start_time is not None]
+    ends = [j._end_time for j in sim_jobs if j._end_time is not None]
+    makespan = max(ends) - min(starts) if ends and starts else float("inf")
+    return SimResult(
+        makespan=makespan,
+        job_times={
+            j._jobName: j._end_time - j._start_time
+            for j in sim_jobs
+            if j._end_time is not None
+        },
+        pauses=sum(j.pauses for j in sim_jobs),
+        core_updates=sum(j.core_updates for j in sim_jobs),
+        slo_exposure=slo_exposure,
+        duration=clock.now,
+        memory_colocation=memory_colocation,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def default_memory_pressure() -> Optional[MemoryPressure]:
+    return load_memory_pressure(load_profile())
+
+
+POLICIES = {
+    "1": lambda logger, factory: Policy1And2Cores(logger, job_factory=factory),
+    "3": lambda logger, factory: PolicyBinPacking(logger, job_factory=factory),
+    "3a": lambda logger, factory: PolicyBinPacking(
+        logger,
+        job_factory=factory,
+        admission=AdmissionControl(default_memory_pressure(), num_cores=NUM_CORES),
+    ),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded runs against a policy")
+    parser.add_argument("-p", "--policy", choices=POLICIES.keys(), default="1")
+    parser.add_argument("--logs", required=True, help="Run directory, e.g. ../part4_3_logs")
+    parser.add_argument("--run", type=int, default=1)
+    parser.add_argument("--speedups", default=DEFAULT_SPEEDUP_CSV)
+    parser.add_argument("--scale-up-delay", type=float, default=0.1)
+    parser.add_argument("--scale-down-delay", type=float, default=2.0)
+    parser.add_argument("--tick", type=float, default=SAMPLE_PERIOD)
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Try a grid of scale-up/scale-down delays instead of a single one",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the policy log")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    job_times = read_job_times(
+        os.path.join(
+            args.logs,
+            f"job_times/job_exec_times/job_tot_exec_times_policy1_run{args.run}.csv",
+        )
+    )
+    trace = read_demand_trace(
+        os.path.join(
+            args.logs,
+            f"job_times/memcached_cpu_usage/memcached_cpu_usage_policy1_run{args.run}.csv",
+        )
+    )
+    speedups = SpeedupTable(args.speedups)
+    policy_factory = POLICIES[args.policy]
+    memory_pressure = default_memory_pressure()
+
+    if args.sweep:
+        for up, down in itertools.product([0.1, 0.5, 1, 2], [1, 2, 5, 10]):
+            result = simulate(policy_factory, job_times, trace, speedups, up, down, args.tick,
+                              memory_pressure=memory_pressure)
+            print(f"up {up:4.1f} s, down {down:4.1f} s: {result}")
+        return
+
+    result = simulate(
+        policy_factory,
+        job_times,
+        trace,
+        speedups,
+        args.scale_up_delay,
+        args.scale_down_delay,
+        args.tick,
+        memory_pressure=memory_pressure,
+    )
+    for name, duration in result.job_times.items():
+        print(f"{name:<12} {duration:7.1f} s")
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
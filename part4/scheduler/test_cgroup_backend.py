@@ -0,0 +1,185 @@
+# CgroupBackend against a temporary cgroup v2 like directory tree, with a fake
+# container and a DockerBackend that only records its calls.
+#   python -m pytest test_cgroup_backend.py   (or python -m unittest)
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import cgroup_backend
+from cgroup_backend import CgroupBackend, DockerBackend
+
+
+class FakeContainer:
+    def __init__(self, container_id: str, pid: int = 0):
+        self.id = container_id
+        self.name = f"parsec-{container_id}"
+        self.attrs = {"State": {"Pid": pid}}
+
+    def reload(self):
+        pass
+
+
+class RecordingDockerBackend(DockerBackend):
+    def __init__(self):
+        self.calls = []
+
+    def update_cpus(self, container, cores: str):
+        self.calls.append(("update_cpus", cores))
+
+    def pause(self, container):
+        self.calls.append(("pause",))
+
+    def unpause(self, container):
+        self.calls.append(("unpause",))
+
+    def set_quota(self, container, cpus):
+        self.calls.append(("set_quota", cpus))
+
+
+class Kernel:
+    """Copies cgroup.freeze to the frozen flag of cgroup.events, like the kernel does."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(0.001):
+            with open(os.path.join(self.path, "cgroup.freeze")) as f:
+                frozen = f.read().strip()
+            write(self.path, "cgroup.events", f"populated 1\nfrozen {frozen}\n")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def write(path: str, name: str, value: str):
+    # replace the file so a reader never sees it half written
+    tmp = os.path.join(path, f".{name}.tmp")
+    with open(tmp, "w") as f:
+        f.write(value)
+    os.replace(tmp, os.path.join(path, name))
+
+
+def read(path: str, name: str) -> str:
+    with open(os.path.join(path, name)) as f:
+        return f.read()
+
+
+class CgroupBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "cgroup")
+        self.proc = os.path.join(self.tmp, "proc")
+        os.makedirs(self.root)
+        os.makedirs(self.proc)
+        self.docker = RecordingDockerBackend()
+        self.backend = CgroupBackend(root=self.root, proc=self.proc, fallback=self.docker)
+        self.freeze_timeout = cgroup_backend.FREEZE_TIMEOUT
+
+    def tearDown(self):
+        cgroup_backend.FREEZE_TIMEOUT = self.freeze_timeout
+        shutil.rmtree(self.tmp)
+
+    def make_cgroup(self, *parts: str) -> str:
+        path = os.path.join(self.root, *parts)
+        os.makedirs(path)
+        for name, value in (
+            ("cgroup.freeze", "0\n"),
+            ("cgroup.events", "populated 1\nfrozen 0\n"),
+            ("cpuset.cpus", "\n"),
+            ("cpu.max", "max 100000\n"),
+        ):
+            write(path, name, value)
+        return path
+
+    def test_path_from_proc(self):
+        path = self.make_cgroup("kubepods", "abc")
+        os.makedirs(os.path.join(self.proc, "1234"))
+        write(os.path.join(self.proc, "1234"), "cgroup", "0::/kubepods/abc\n")
+
+        self.assertEqual(self.backend.path(FakeContainer("abc", pid=1234)), path)
+
+    def test_path_of_systemd_and_cgroupfs_drivers(self):
+        systemd = self.make_cgroup("system.slice", "docker-abc.scope")
+        cgroupfs = self.make_cgroup("docker", "def")
+
+        self.assertEqual(self.backend.path(FakeContainer("abc")), systemd)
+        self.assertEqual(self.backend.path(FakeContainer("def")), cgroupfs)
+
+    def test_no_cgroup_uses_docker(self):
+        container = FakeContainer("abc")
+        self.assertIsNone(self.backend.path(container))
+
+        self.backend.update_cpus(container, "2,3")
+        self.backend.pause(container)
+        self.backend.unpause(container)
+
+        self.assertEqual(self.docker.calls, [("update_cpus", "2,3"), ("pause",), ("unpause",)])
+
+    def test_cpuset_and_quota_writes(self):
+        path = self.make_cgroup("docker", "abc")
+        container = FakeContainer("abc")
+
+        self.backend.update_cpus(container, "2,3")
+        self.backend.set_quota(container, 0.5)
+        self.assertEqual(read(path, "cpuset.cpus"), "2,3")
+        self.assertEqual(read(path, "cpu.max"), "50000 100000")
+
+        self.backend.set_quota(container, None)
+        self.assertEqual(read(path, "cpu.max"), "max 100000")
+        self.assertEqual(self.docker.calls, [])
+
+    def test_freeze_is_confirmed_by_cgroup_events(self):
+        path = self.make_cgroup("docker", "abc")
+        container = FakeContainer("abc")
+        kernel = Kernel(path)
+        try:
+            self.backend.pause(container)
+            self.assertEqual(read(path, "cgroup.freeze"), "1")
+            self.assertIn("frozen 1", read(path, "cgroup.events"))
+
+            self.backend.unpause(container)
+            self.assertEqual(read(path, "cgroup.freeze"), "0")
+            self.assertIn("frozen 0", read(path, "cgroup.events"))
+        finally:
+            kernel.stop()
+        self.assertEqual(self.docker.calls, [])
+
+    def test_freeze_timeout_thaws_and_uses_docker(self):
+        # nothing updates cgroup.events, the freeze is never confirmed
+        cgroup_backend.FREEZE_TIMEOUT = 0.01
+        path = self.make_cgroup("docker", "abc")
+        container = FakeContainer("abc")
+
+        self.backend.pause(container)
+
+        self.assertEqual(read(path, "cgroup.freeze"), "0")
+        self.assertEqual(self.docker.calls, [("pause",)])
+        self.assertIsNone(self.backend.path(container))
+        # docker paused it, so docker unpauses it
+        self.backend.unpause(container)
+        self.assertEqual(self.docker.calls, [("pause",), ("unpause",)])
+
+    def test_forget_thaws_a_frozen_container(self):
+        path = self.make_cgroup("docker", "abc")
+        container = FakeContainer("abc")
+        kernel = Kernel(path)
+        try:
+            self.backend.pause(container)
+        finally:
+            kernel.stop()
+
+        self.backend.forget(container)
+
+        self.assertEqual(read(path, "cgroup.freeze"), "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
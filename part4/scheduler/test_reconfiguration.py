@@ -0,0 +1,75 @@
+# Rollback of a failed Reconfiguration, with the SimJobs of the simulator instead
+# of Docker containers.
+#   python -m pytest test_reconfiguration.py   (or python -m unittest)
+
+import unittest
+
+from job import JobStatus
+from parsec_jobs import jobs as parsec_jobs
+from policy_1_2_cores import Policy1And2Cores
+from reconfiguration import ReconfigurationError
+from simulator import NullSchedulerLogger, SimClock, SimJob, SpeedupTable
+
+
+class FailingSimJob(SimJob):
+    """A SimJob whose start fails while fail_start is set."""
+
+    fail_start = False
+
+    def start_job(self, cores: str):
+        if self.fail_start:
+            raise RuntimeError(f"cannot start {self._jobName}")
+        super().start_job(cores)
+
+
+class PolicyRollbackTest(unittest.TestCase):
+    def setUp(self):
+        clock = SimClock()
+        speedups = SpeedupTable()
+        self.jobs = {}
+
+        def job_factory(jobName, image, command, threads, schedulerLogger, job):
+            sim_job = FailingSimJob(jobName, image, command, threads, schedulerLogger, job,
+                                    work=100.0, speedups=speedups, clock=clock)
+            self.jobs[jobName] = sim_job
+            return sim_job
+
+        self.policy = Policy1And2Cores(NullSchedulerLogger(), job_factory=job_factory)
+        # one 1 core and one 2 core job, both start on the first tick with 3 cores
+        self.policy.add_job(parsec_jobs["blackscholes"])
+        self.policy.add_job(parsec_jobs["ferret"])
+
+    def test_failed_start_leaves_queues_unchanged(self):
+        one_core_queue = list(self.policy.one_core_queue)
+        two_core_queue = list(self.policy.two_core_queue)
+        self.jobs["blackscholes"].fail_start = True
+
+        with self.assertRaises(ReconfigurationError):
+            self.policy.schedule({1, 2, 3})
+
+        self.assertEqual(self.policy.one_core_queue, one_core_queue)
+        self.assertEqual(self.policy.two_core_queue, two_core_queue)
+        self.assertIsNone(self.policy.running_one_core)
+        self.assertIsNone(self.policy.running_two_core)
+        # ferret started in the same transaction and was stopped again
+        self.assertEqual(self.jobs["ferret"]._status, JobStatus.PENDING)
+        self.assertEqual(self.jobs["ferret"]._cores, [])
+
+    def test_next_tick_after_failure_starts_the_jobs(self):
+        self.jobs["blackscholes"].fail_start = True
+        with self.assertRaises(ReconfigurationError):
+            self.policy.schedule({1, 2, 3})
+
+        self.jobs["blackscholes"].fail_start = False
+        self.policy.schedule({1, 2, 3})
+
+        self.assertIs(self.policy.running_one_core, self.jobs["blackscholes"])
+        self.assertIs(self.policy.running_two_core, self.jobs["ferret"])
+        self.assertEqual(self.jobs["blackscholes"]._cores, [1])
+        self.assertEqual(self.jobs["ferret"]._cores, [2, 3])
+        self.assertEqual(self.policy.one_core_queue, [])
+        self.assertEqual(self.policy.two_core_queue, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+# Warm pool for the PARSEC containers.
+# Starting a job with containers.run() puts the image pull (if it is not cached),
+# the container creation and the process start on the critical path of the
+# scheduler. The pool pulls all images in parallel when the scheduler starts and
+# keeps the containers of the next queued jobs created (but not started), so
+# start_job only has to set the cpuset and call container.start().
+# The next jobs are the ones the policy starts next (Policy.queued_jobs), the
+# registration order is only used until a policy is set.
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import docker
+from docker.client import DockerClient
+from job import JobInstance, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Number of queued jobs that have their container created ahead of time
+PREPARED_JOBS = 2
+
+
+class WarmPool:
+    def __init__(self, docker_client: DockerClient, max_workers: int = 4):
+        self._docker_client = docker_client
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="warm-pool"
+        )
+        self._lock = threading.Lock()
+        self._pulls: Dict[str, Future] = {}
+        self._created: Dict[str, Future] = {}
+        # jobs in start_job, still PENDING without a container but not to be prepared
+        self._starting: Set[str] = set()
+        self._jobs: List[JobInstance] = []
+        self._queued_jobs: Optional[Callable[[], List[JobInstance]]] = None
+        # job name -> (seconds spent in start_job, container was pre-created)
+        self.startup_latencies: Dict[str, tuple[float, bool]] = {}
+
+    def _pull(self, image: str):
+        start = time.monotonic()
+        try:
+            self._docker_client.images.get(image)
+            logger.info(f"Image {image} already present")
+            return
+        except docker.errors.ImageNotFound:
+            pass
+        repository, _, tag = image.rpartition(":")
+        if not repository or "/" in tag:
+            repository, tag = image, "latest"
+        self._docker_client.images.pull(repository, tag=tag)
+        logger.info(f"Pulled image {image} in {time.monotonic() - start:.1f} s")
+
+    def pull_all(self, images: Iterable[str]):
+        """Pull all images in parallel in the background."""
+        with self._lock:
+            for image in images:
+                if image not in self._pulls:
+                    self._pulls[image] = self._executor.submit(self._pull, image)
+
+    def register(self, job: JobInstance):
+        """Only registered jobs get a container created ahead of time."""
+        with self._lock:
+            self._jobs.append(job)
+
+    def follow(self, queued_jobs: Callable[[], List[JobInstance]]):
+        """Prepare the jobs in the order returned by queued_jobs (Policy.queued_jobs)."""
+        self._queued_jobs = queued_jobs
+
+    def _create(self, job: JobInstance):
+        pull = self._pulls.get(job._image)
+        if pull is not None:
+            # a failed pull is retried implicitly by containers.create
+            try:
+                pull.result()
+            except Exception as e:
+                logger.warning(f"Pull of {job._image} failed: {e}")
+        start = time.monotonic()
+        container = job.create_container()
+        logger.info(
+            f"Pre-created container for {job._jobName} in "
+            f"{(time.monotonic() - start) * 1000:.0f} ms"
+        )
+        return container
+
+    def prepare_next(self, count: int = PREPARED_JOBS):
+        """Create the containers of the next pending jobs that do not have one yet."""
+        # a Reconfiguration starts several jobs at once, the ones that are still
+        # starting are queued and PENDING but must not get a second container
+        order = self._queued_jobs() if self._queued_jobs is not None else self._jobs
+        with self._lock:
+            pending = [
+                job
+                for job in order
+                if job in self._jobs
+                and job._jobName not in self._starting
+                and job._status == JobStatus.PENDING
+                and job._container is None
+            ]
+            for job in pending[:count]:
+                if job._jobName not in self._created:
+                    self._created[job._jobName] = self._executor.submit(
+                        self._create, job
+                    )
+
+    def claim(self, job_name: str):
+        """take for a job that is being started, prepare_next skips it until release."""
+        with self._lock:
+            self._starting.add(job_name)
+        return self.take(job_name)
+
+    def release(self, job_name: str):
+        """The job is started (or its start failed), see claim."""
+        with self._lock:
+            self._starting.discard(job_name)
+
+    def take(self, job_name: str):
+        """Return the pre-created container of a job or None if there is none.
+
+        Waits for a creation that is still in flight, that is still faster than
+        creating the container again.
+        """
+        with self._lock:
+            future = self._created.pop(job_name, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"Pre-creating the container for {job_name} failed: {e}")
+            return None
+
+    def discard(self, job_name: str):
+        """Remove a pre-created container that was never started."""
+        container = self.take(job_name)
+        if container is not None:
+            try:
+                container.remove(force=True)
+            except docker.errors.NotFound:
+                pass
+
+    def record_startup(self, job_name: str, seconds: float, warm: bool):
+        self.startup_latencies[job_name] = (seconds, warm)
+        logger.info(
+            f"Job {job_name} startup latency {seconds * 1000:.0f} ms "
+            f"({'warm' if warm else 'cold'})"
+        )
+
+    def log_summary(self):
+        for warm in (True, False):
+            latencies = [s for s, w in self.startup_latencies.values() if w == warm]
+            if latencies:
+                logger.info(
+                    f"{'Warm' if warm else 'Cold'} starts: {len(latencies)}, "
+                    f"mean startup latency {sum(latencies) / len(latencies) * 1000:.0f} ms"
+                )
+
+    def shutdown(self):
+        for job_name in list(self._created):
+            self.discard(job_name)
+        self._executor.shutdown(wait=False, cancel_futures=True)
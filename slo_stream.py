@@ -0,0 +1,221 @@
+"""Streaming SLO violation statistics over mcperf output.
+
+Reads mcperf rows one at a time (mcperf_log.iter_mcperf), so the memory use does
+not depend on the length of the log and the input can be a file that is still
+being written or stdin:
+
+    python slo_stream.py part3/logs/run_1/mcperf_1.txt --thresholds 0.5 1 2
+    ./mcperf ... | tee mcperf.txt | python slo_stream.py - --report 10
+    python slo_stream.py mcperf.txt --follow --start 1745066564597
+
+For every threshold (in ms, on the p95 column by default) it keeps:
+ - the violation ratio, violating measurements / measurements
+ - the longest streak of consecutive violating measurements, also in ms
+ - the time weighted violation ratio, ms spent in violating measurements / ms
+   measured (rows without timestamps count as zero ms)
+
+Only measurements that overlap [start, end] (ms since epoch) are counted, the
+same window test as part3/analyze_slo.py. Time weights are clipped to the window.
+"""
+
+import argparse
+import sys
+import time
+from typing import Iterable, Iterator, Optional, TextIO
+
+from mcperf_log import STAT_COLUMNS, McperfRow, iter_mcperf
+
+DEFAULT_THRESHOLDS_MS = (1.0,)
+
+
+class ThresholdStats:
+    """Running statistics for one latency threshold."""
+
+    def __init__(self, threshold_ms: float):
+        self.threshold_ms = threshold_ms
+        self.threshold_us = threshold_ms * 1000
+        self.violations = 0
+        self.violation_ms = 0
+        self.streak = 0
+        self.streak_start_ms = -1
+        self.longest_streak = 0
+        self.longest_streak_ms = 0
+
+    def update(self, latency_us: float, start_ms: int, end_ms: int, duration_ms: int):
+        if latency_us <= self.threshold_us:
+            self.streak = 0
+            return
+        self.violations += 1
+        self.violation_ms += duration_ms
+        if self.streak == 0:
+            self.streak_start_ms = start_ms
+        self.streak += 1
+        self.longest_streak = max(self.longest_streak, self.streak)
+        if start_ms >= 0:
+            self.longest_streak_ms = max(self.longest_streak_ms, end_ms - self.streak_start_ms)
+
+
+class SloEngine:
+    """Consumes mcperf rows and keeps the SLO statistics of several thresholds."""
+
+    def __init__(
+        self,
+        thresholds_ms: Iterable[float] = DEFAULT_THRESHOLDS_MS,
+        column: str = "p95",
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ):
+        self.column_index = STAT_COLUMNS.index(column)
+        self.column = column
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.stats = [ThresholdStats(t) for t in sorted(thresholds_ms)]
+        self.rows = 0  # rows read
+        self.measurements = 0  # rows in the window
+        self.measured_ms = 0
+
+    def in_window(self, row: McperfRow) -> bool:
+        if row.ts_start < 0:
+            # no timing information, only usable without a window
+            return self.start_ms is None and self.end_ms is None
+        if self.start_ms is not None and row.ts_end < self.start_ms:
+            return False
+        if self.end_ms is not None and row.ts_start > self.end_ms:
+            return False
+        return True
+
+    def update(self, row: McperfRow):
+        self.rows += 1
+        if not self.in_window(row):
+            return
+        self.measurements += 1
+        start_ms, end_ms = row.ts_start, row.ts_end
+        duration_ms = 0
+        if start_ms >= 0:
+            if self.start_ms is not None:
+                start_ms = max(start_ms, self.start_ms)
+            if self.end_ms is not None:
+                end_ms = min(end_ms, self.end_ms)
+            duration_ms = max(0, end_ms - start_ms)
+        self.measured_ms += duration_ms
+        latency_us = row.stats[self.column_index]
+        for stats in self.stats:
+            stats.update(latency_us, start_ms, end_ms, duration_ms)
+
+    def consume(self, rows: Iterable[McperfRow]) -> "SloEngine":
+        for row in rows:
+            self.update(row)
+        return self
+
+    def summary(self) -> list[dict]:
+        """One dict per threshold, ratios are None before the first measurement."""
+        result = []
+        for stats in self.stats:
+            result.append(
+                {
+                    "threshold_ms": stats.threshold_ms,
+                    "measurements": self.measurements,
+                    "violations": stats.violations,
+                    "violation_ratio": (
+                        stats.violations / self.measurements if self.measurements else None
+                    ),
+                    "longest_streak": stats.longest_streak,
+                    "longest_streak_ms": stats.longest_streak_ms,
+                    "time_weighted_ratio": (
+                        stats.violation_ms / self.measured_ms if self.measured_ms else None
+                    ),
+                }
+            )
+        return result
+
+    def format_summary(self) -> str:
+        lines = [
+            f"{self.measurements} {self.column} measurements in window "
+            f"({self.rows} read, {self.measured_ms / 1000:.1f}s)"
+        ]
+        for s in self.summary():
+            ratio = "-" if s["violation_ratio"] is None else f"{s['violation_ratio']:.4f}"
+            weighted = "-" if s["time_weighted_ratio"] is None else f"{s['time_weighted_ratio']:.4f}"
+            lines.append(
+                f"  > {s['threshold_ms']:g}ms: {s['violations']} violations, ratio {ratio}, "
+                f"time weighted {weighted}, longest streak {s['longest_streak']} "
+                f"({s['longest_streak_ms'] / 1000:.1f}s)"
+            )
+        return "\n".join(lines)
+
+
+def follow(f: TextIO, poll: float = 0.5, idle_timeout: Optional[float] = None) -> Iterator[str]:
+    """Yield the lines of a file that is still being written, like tail -f.
+
+    Stops after idle_timeout seconds without a new line (None: never).
+    """
+    partial = ""
+    last_data = time.monotonic()
+    while True:
+        chunk = f.readline()
+        if chunk:
+            last_data = time.monotonic()
+            partial += chunk
+            if partial.endswith("\n"):
+                yield partial
+                partial = ""
+            continue
+        if idle_timeout is not None and time.monotonic() - last_data > idle_timeout:
+            if partial:
+                yield partial
+            return
+        time.sleep(poll)
+
+
+def _reporting(rows: Iterable[McperfRow], engine: SloEngine, interval: float):
+    next_report = time.monotonic() + interval
+    for row in rows:
+        yield row
+        if time.monotonic() >= next_report:
+            print(engine.format_summary(), flush=True)
+            next_report = time.monotonic() + interval
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SLO violations of an mcperf log, streaming")
+    parser.add_argument("file", help="mcperf output, - for stdin")
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=list(DEFAULT_THRESHOLDS_MS),
+        help="Latency thresholds in ms (default: 1)",
+    )
+    parser.add_argument("--column", default="p95", choices=STAT_COLUMNS)
+    parser.add_argument("--start", type=int, help="Window start, ms since epoch")
+    parser.add_argument("--end", type=int, help="Window end, ms since epoch")
+    parser.add_argument("--follow", action="store_true", help="Keep reading while the file grows")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="With --follow, stop after this many seconds without new lines",
+    )
+    parser.add_argument(
+        "--report", type=float, default=None, help="Print the statistics every N seconds"
+    )
+    args = parser.parse_args()
+
+    engine = SloEngine(args.thresholds, args.column, args.start, args.end)
+    f = sys.stdin if args.file == "-" else open(args.file, "r")
+    try:
+        lines = follow(f, idle_timeout=args.idle_timeout) if args.follow else f
+        rows = iter_mcperf(lines)
+        if args.report:
+            rows = _reporting(rows, engine, args.report)
+        engine.consume(rows)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    print(engine.format_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Waits until a node has settled instead of sleeping a fixed time.
+
+The experiment scripts used to sleep a fixed time after starting or stopping an
+interference pod and between runs. wait_until_stable samples a value (node CPU
+utilisation by default) every few seconds and returns as soon as the last
+`window` samples are steady: their coefficient of variation (std / mean) is below
+`threshold`, or their standard deviation is below `min_std` (an idle node has a
+tiny mean, so its CV alone would never settle). The old fixed wait is kept as the
+upper bound, a wait never takes longer than before.
+
+CpuSampler reads /proc/stat of a node over a single long running command (one
+ssh connection for all samples), e.g.
+
+    sampler = CpuSampler(gcloud_ssh_command("memcache-server-xxxx"))
+    waited = wait_until_stable(sampler, "cpu interference", max_wait=120)
+
+Every wait is printed and, if log_file is given, appended to a CSV with the label,
+the time it took and whether the node settled before max_wait.
+
+Scripts in the part directories add the repository root to sys.path to import it.
+"""
+
+import csv
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+ZONE = "europe-west1-b"
+SSH_KEY_FILE = "~/.ssh/cloud-computing"
+
+SAMPLE_INTERVAL = 1  # seconds between two samples
+WINDOW = 5  # samples that have to be steady
+THRESHOLD = 0.05  # coefficient of variation of a steady window
+MIN_STD = 1.0  # a window with a smaller std is steady too (CPU percent)
+
+LOG_COLUMNS = ["timestamp", "label", "waited", "settled", "cv", "max_wait"]
+# run_matrix.py waits on several nodes at once
+_log_lock = threading.Lock()
+
+
+def gcloud_ssh_command(node, zone=ZONE):
+    """Command prefix that runs a shell command on a cluster node."""
+    return [
+        "gcloud",
+        "compute",
+        "ssh",
+        f"--ssh-key-file={SSH_KEY_FILE}",
+        f"ubuntu@{node}",
+        "--zone",
+        zone,
+        "--command",
+    ]
+
+
+def coefficient_of_variation(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    mean = samples.mean()
+    if mean == 0:
+        return 0.0 if samples.std() == 0 else float("inf")
+    return float(samples.std() / abs(mean))
+
+
+class CpuSampler:
+    """Node CPU utilisation in percent, from the /proc/stat lines a remote loop prints.
+
+    remote_command is the command prefix that runs a shell command on the node
+    (gcloud_ssh_command, or ["sh", "-c"] for the local machine). The loop is started
+    on the first sample and stopped by close(). A reader thread keeps the pipe
+    drained while nobody waits, so the connection stays open across benchmarks.
+    """
+
+    def __init__(self, remote_command, interval=SAMPLE_INTERVAL, start_timeout=60):
+        self.remote_command = list(remote_command)
+        self.interval = interval
+        self.start_timeout = start_timeout
+        self._process = None
+        self._counters = queue.Queue()
+        self._previous = None
+
+    def _start(self):
+        script = f"while true; do head -n 1 /proc/stat; sleep {self.interval}; done"
+        self._process = subprocess.Popen(
+            self.remote_command + [script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self._read_loop, name="cpu-sampler", daemon=True).start()
+
+    def _read_loop(self):
+        for line in self._process.stdout:
+            if line.startswith("cpu "):
+                values = [int(v) for v in line.split()[1:]]
+                # idle + iowait
+                self._counters.put((sum(values), values[3] + values[4]))
+        self._counters.put(None)
+
+    def _next_counters(self, timeout):
+        try:
+            counters = self._counters.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No CPU sample within {timeout:.0f}s") from None
+        if counters is None:
+            self._counters.put(None)
+            raise RuntimeError(f"CPU sampler stopped: {' '.join(self.remote_command)}")
+        return counters
+
+    def discard_pending(self):
+        """Drop the lines read since the last sample, the next one is a fresh reading."""
+        while True:
+            try:
+                counters = self._counters.get_nowait()
+            except queue.Empty:
+                return
+            if counters is None:
+                self._counters.put(None)
+                return
+            self._previous = counters
+
+    def sample(self, timeout=None):
+        """Blocks until the next line arrives and returns the utilisation since the last."""
+        if self._process is None:
+            self._start()
+        if self._previous is None:
+            # the first line only arrives once the connection is up
+            self._previous = self._next_counters(
+                self.start_timeout if timeout is None else min(timeout, self.start_timeout)
+            )
+        total, idle = self._next_counters(self.interval * 10 if timeout is None else timeout)
+        previous_total, previous_idle = self._previous
+        self._previous = (total, idle)
+        if total == previous_total:
+            return 0.0
+        return 100.0 * (1 - (idle - previous_idle) / (total - previous_total))
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _append_log(log_file, row):
+    os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    with _log_lock:
+        new_file = not os.path.exists(log_file)
+        with open(log_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=LOG_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def wait_until_stable(
+    sampler,
+    label,
+    max_wait,
+    min_wait=0,
+    window=WINDOW,
+    threshold=THRESHOLD,
+    min_std=MIN_STD,
+    log_file=None,
+):
+    """Wait until the sampled value is steady, at most max_wait seconds.
+
+    sampler is a CpuSampler (or any object with sample(timeout) and discard_pending()) or
+    None, in which case this is a plain sleep of max_wait. If the sampler fails, the rest of
+    max_wait is slept as before. Returns the seconds waited.
+    """
+    start = time.monotonic()
+    samples = deque(maxlen=window)
+    settled = False
+    cv = float("nan")
+
+    if sampler is None:
+        time.sleep(max_wait)
+    else:
+        try:
+            sampler.discard_pending()
+            while time.monotonic() - start < max_wait:
+                samples.append(sampler.sample(max_wait - (time.monotonic() - start)))
+                if len(samples) < window:
+                    continue
+                cv = coefficient_of_variation(samples)
+                steady = cv < threshold or np.std(samples) < min_std
+                if steady and time.monotonic() - start >= min_wait:
+                    settled = True
+                    break
+        except (RuntimeError, OSError) as e:
+            print(f"{e}, falling back to a fixed wait")
+            time.sleep(max(0, max_wait - (time.monotonic() - start)))
+
+    waited = time.monotonic() - start
+    if settled:
+        print(f"{label}: settled after {waited:.1f}s (cv {cv:.3f}, max {max_wait}s)")
+    elif sampler is None:
+        print(f"{label}: fixed wait of {waited:.1f}s")
+    else:
+        print(f"{label}: waited {waited:.1f}s, not settled")
+    if log_file is not None:
+        _append_log(
+            log_file,
+            {
+                "timestamp": datetime.now().isoformat(),
+                "label": label,
+                "waited": round(waited, 1),
+                "settled": settled,
+                "cv": round(cv, 4),
+                "max_wait": max_wait,
+            },
+        )
+    return waited